@@ -1,59 +1,112 @@
 # app.py
-import torch
-import gradio as gr
 import os
+import sys
+
+if __name__ == "__main__":
+    # Пулы процессов (транскрибация, чат) запускаются методом spawn и заново
+    # импортируют модуль __main__. app.py при импорте строит интерфейс Gradio,
+    # поэтому запуск передаётся лёгкому serve.py до тяжёлых импортов
+    serve_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "serve.py")
+    os.execv(sys.executable, [sys.executable, serve_path, "--workers", os.getenv("CHAT_WORKERS", "0"), *sys.argv[1:]])
+
+from utils.startup_profile import startup_profiler
+
+with startup_profiler.step("import gradio"):
+    import gradio as gr
 import json
+import threading
+import time
+from concurrent.futures import wait
 from datetime import datetime
-from src.document_processor import load_multiple_documents, split_documents
-from src.vector_store import create_vectorstore, save_vectorstore, load_vectorstore
-from src.chat_chain import create_rag_chain, format_sources
-from src.llm_handler import get_llm, get_available_models
-from src.export_handler import export_chat_to_pdf, export_chat_to_json
-from src.database import db_manager
-from config.settings import settings
 import logging
-import tempfile
-import whisper
-from moviepy.video.io.VideoFileClip import VideoFileClip
+with startup_profiler.step("import src.vector_store"):
+    from src.vector_store import commit_vectorstore, load_vectorstore, start_index_watcher, vectorstore_sources
+with startup_profiler.step("import src.ingestion_pipeline"):
+    from src.ingestion_pipeline import run_ingestion_pipeline
+with startup_profiler.step("import src.chat_chain"):
+    from src.chat_chain import create_rag_chain, format_sources
+    from src.request_coalescing import get_coalescing_stats
+    from src.message_retention import start_retention_scheduler
+    from src.metrics import create_metrics_app, STAGE_LATENCY, STAGE_ERRORS
+with startup_profiler.step("import src.llm_handler"):
+    from src.llm_handler import get_available_models, prewarm_llm_clients
+    from src.chat_workers import answer_question, create_chat_llm, run_chat_turn, start_chat_workers
+with startup_profiler.step("import src.export_handler"):
+    from src.export_handler import submit_pdf_export, export_chat_to_json, export_messages_stream, pair_chat_history
+with startup_profiler.step("import src.database"):
+    from src.database import db_manager
+with startup_profiler.step("import src.ingestion_jobs"):
+    from src.ingestion_jobs import IngestionJobManager, STAGES
+from src.media_processor import process_media_file, AUDIO_EXTENSIONS, VIDEO_EXTENSIONS
+from src.document_processor import create_documents_from_transcript
+from config.settings import settings
 
 DEFAULT_EXPORT_DIR = "/app/exports"
-
-# Проверка наличия FFmpeg
-try:
-    import subprocess
-    subprocess.run(['ffmpeg', '-version'], capture_output=True, check=True)
-    print("✅ FFmpeg найден в системе")
-except (subprocess.CalledProcessError, FileNotFoundError):
-    print("⚠️  FFmpeg не найден в системе")
-    print("Пожалуйста, установите FFmpeg вручную:")
-    print("   - Скачайте с https://www.gyan.dev/ffmpeg/builds/")
-    print("   - Выберите 'release essentials' сборку")
-    print("   - Распакуйте в C:\\ffmpeg")
-    print("   - Добавьте C:\\ffmpeg\\bin в переменные среды PATH")
-
+# Интервал обновления статуса, пока PDF собирается (секунды)
+PDF_EXPORT_POLL_SECONDS = 0.5
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Проверка доступности CUDA для PyTorch
-if torch.cuda.is_available():
-    logger.info(f"PyTorch: Используется устройство: {torch.cuda.get_device_name(0)}")
-    logger.info(f"PyTorch: Количество доступных GPU: {torch.cuda.device_count()}")
-else:
-    logger.info("PyTorch: CUDA не доступна, используется CPU")
+def check_ffmpeg():
+    """Проверка наличия FFmpeg"""
+    import subprocess
+    try:
+        subprocess.run([settings.FFMPEG_BINARY, '-version'], capture_output=True, check=True)
+        print("✅ FFmpeg найден в системе")
+        return True
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        print("⚠️  FFmpeg не найден в системе")
+        print("Пожалуйста, установите FFmpeg вручную:")
+        print("   - Скачайте с https://www.gyan.dev/ffmpeg/builds/")
+        print("   - Выберите 'release essentials' сборку")
+        print("   - Распакуйте в C:\\ffmpeg")
+        print("   - Добавьте C:\\ffmpeg\\bin в переменные среды PATH")
+        return False
+
+def log_torch_device():
+    """Проверка доступности CUDA для PyTorch"""
+    import torch
+    if torch.cuda.is_available():
+        logger.info(f"PyTorch: Используется устройство: {torch.cuda.get_device_name(0)}")
+        logger.info(f"PyTorch: Количество доступных GPU: {torch.cuda.device_count()}")
+    else:
+        logger.info("PyTorch: CUDA не доступна, используется CPU")
 
 # Глобальные переменные
 vectorstore = None
 qa_chain = None
 current_model = None
-chat_history = []  # Формат: [(role, content), ...]
-current_user_id = None
-current_session_id = None
+current_model_name = None  # полное имя модели для процессов-исполнителей (CHAT_WORKERS)
+
+def request_token(auth_token, request: gr.Request = None):
+    """Токен входа запроса: из gr.State сессии браузера или заголовка Authorization: Bearer (API)"""
+    if auth_token:
+        return auth_token
+    if request is not None:
+        header = request.headers.get("authorization", "")
+        if header.lower().startswith("bearer "):
+            return header[7:].strip()
+    return None
+
+def resolve_user_id(auth_token, request: gr.Request = None):
+    """ID пользователя, выполняющего запрос (None - не вошёл или токен истёк).
+
+    Пользователь определяется по токену в каждом запросе: у процесса нет
+    общего «текущего пользователя», поэтому одновременные сессии не смешиваются.
+    """
+    token = request_token(auth_token, request)
+    return db_manager.get_auth_session_user(token) if token else None
+
+def owned_session_id(session_id, user_id):
+    """session_id, если сессия принадлежит пользователю, иначе None"""
+    if not session_id or not user_id:
+        return None
+    return session_id if db_manager.get_session_user_id(int(session_id)) == user_id else None
 
 def register_user(username, password):
     """Регистрация нового пользователя"""
-    global current_user_id
     try:
         if not username or not password:
             return "", "", "❌ Введите имя пользователя и пароль"
@@ -76,108 +129,6 @@ def register_user(username, password):
         logger.error(error_msg)
         return "", "", error_msg
 
-def extract_audio_from_video(video_path):
-    """Извлекает аудио из видео файла"""
-    try:
-        audio_path = video_path.replace('.mp4', '.mp3').replace('.mov', '.mp3')
-        clip = VideoFileClip(video_path)
-        # Убираем устаревшие параметры
-        clip.audio.write_audiofile(audio_path, logger=None)
-        return audio_path
-    except Exception as e:
-        logger.error(f"Ошибка при извлечении аудио: {str(e)}")
-        return None
-
-def transcribe_audio(audio_path):
-    """Преобразует аудио в текст с помощью Whisper"""
-    try:
-        # Определение устройства (GPU или CPU)
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-        if device == "cuda":
-            print(f"Whisper: Используется устройство: {torch.cuda.get_device_name(0)}")
-        else:
-            print("Whisper: CUDA не доступна, используется CPU")
-
-        model = whisper.load_model("base").to(device) # Перемещаем модель на устройство
-        result = model.transcribe(audio_path)
-        return result["text"]
-    except Exception as e:
-        logger.error(f"Ошибка при преобразовании аудио: {str(e)}")
-        return None
-
-def process_media_file(file_obj):
-    """Обрабатывает медиа файл и возвращает текст"""
-    temp_path = None
-    audio_path = None
-    try:
-        logger.info(f"Начало обработки медиа файла: {getattr(file_obj, 'name', 'unknown')}")
-        
-        # Создаем временный файл
-        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file_obj.name)[1]) as tmp_file:
-            # Получаем содержимое файла
-            if hasattr(file_obj, 'read'):
-                logger.info("Чтение файла через read()")
-                file_obj.seek(0)
-                file_content = file_obj.read()
-            else:
-                # Для NamedString читаем файл напрямую
-                if hasattr(file_obj, 'name') and os.path.exists(file_obj.name):
-                    logger.info("Чтение файла напрямую по пути")
-                    with open(file_obj.name, 'rb') as f:
-                        file_content = f.read()
-                else:
-                    logger.info("Преобразование содержимого в строку")
-                    file_content = str(file_obj).encode('utf-8')
-            
-            tmp_file.write(file_content)
-            temp_path = tmp_file.name
-            logger.info(f"Временный файл создан: {temp_path}")
-
-        file_extension = os.path.splitext(file_obj.name)[1].lower()
-        logger.info(f"Расширение файла: {file_extension}")
-        
-        if file_extension in ['.mp3', '.wav']:
-            # Аудио файл
-            logger.info("Обработка аудио файла")
-            text = transcribe_audio(temp_path)
-            if text:
-                logger.info(f"Аудио успешно транскрибировано, длина текста: {len(text)}")
-            else:
-                logger.warning("Транскрибирование аудио не дало результата")
-        elif file_extension in ['.mp4', '.mov']:
-            # Видео файл
-            logger.info("Обработка видео файла")
-            audio_path = extract_audio_from_video(temp_path)
-            if audio_path and os.path.exists(audio_path):
-                logger.info(f"Аудио извлечено: {audio_path}")
-                text = transcribe_audio(audio_path)
-                if text:
-                    logger.info(f"Видео успешно транскрибировано, длина текста: {len(text)}")
-                else:
-                    logger.warning("Транскрибирование видео не дало результата")
-            else:
-                logger.error("Не удалось извлечь аудио из видео")
-                text = None
-        else:
-            logger.warning(f"Неподдерживаемый формат медиа файла: {file_extension}")
-            text = None
-            
-        return text
-    except Exception as e:
-        logger.error(f"Ошибка при обработке медиа файла {getattr(file_obj, 'name', 'unknown')}: {str(e)}", exc_info=True)
-        return None
-    finally:
-        # Очищаем временные файлы
-        try:
-            if temp_path and os.path.exists(temp_path):
-                os.unlink(temp_path)
-                logger.info(f"Удален временный файл: {temp_path}")
-            if audio_path and os.path.exists(audio_path):
-                os.unlink(audio_path)
-                logger.info(f"Удален временный аудио файл: {audio_path}")
-        except Exception as e:
-            logger.warning(f"Не удалось удалить временные файлы: {e}")
-    
 def try_load_vectorstore():
     """Пробует загрузить векторное хранилище с диска при старте"""
     global vectorstore
@@ -189,8 +140,41 @@ def try_load_vectorstore():
         logger.warning(f"Векторное хранилище не найдено или не удалось загрузить: {e}")
         return False
 
-# Вызов функции при старте приложения
-try_load_vectorstore()
+def swap_vectorstore(new_vectorstore):
+    """Горячая подмена индекса новой версией (после индексации и из start_index_watcher).
+
+    Цепочка пересобирается до подмены: ходы, уже идущие со старой цепочкой, не прерываются.
+    """
+    global vectorstore, qa_chain
+    new_chain = None
+    if qa_chain is not None and current_model_name:
+        new_chain = create_rag_chain(new_vectorstore, create_chat_llm(current_model_name))
+    vectorstore = new_vectorstore
+    if new_chain is not None:
+        qa_chain = new_chain
+
+def warm_up():
+    """Фоновая инициализация тяжёлых подсистем, чтобы интерфейс поднимался сразу"""
+    with startup_profiler.step("warmup: ffmpeg check"):
+        check_ffmpeg()
+    with startup_profiler.step("warmup: torch"):
+        try:
+            log_torch_device()
+        except ImportError as e:
+            logger.warning(f"PyTorch недоступен: {e}")
+    with startup_profiler.step("warmup: vector store"):
+        if vectorstore is None:
+            try_load_vectorstore()
+    if settings.LLM_PREWARM:
+        with startup_profiler.step("warmup: llm clients"):
+            prewarm_llm_clients()
+    startup_profiler.report("Профиль фоновой инициализации")
+
+def start_background_warmup():
+    """Запуск warm_up в фоновом потоке"""
+    thread = threading.Thread(target=warm_up, name="warmup", daemon=True)
+    thread.start()
+    return thread
 
 def initialize_database():
     """Инициализация базы данных"""
@@ -203,58 +187,70 @@ def initialize_database():
         return error_msg
 
 def login_user(username, password): # <-- Обновлены параметры
-    """Вход пользователя с проверкой пароля"""
-    global current_user_id
+    """Вход пользователя с проверкой пароля; возвращает токен входа.
+
+    Токен сохраняется в состоянии сессии браузера (gr.State) и дублируется в
+    скрытое поле, чтобы его получали API-клиенты.
+    """
     try:
         if not username or not password: # <-- Проверка обоих полей
             # Очищаем поля и показываем сообщение
-            return "", "", "❌ Введите имя пользователя и пароль" 
-
-        # Проверяем имя и пароль в БД (новая функция в database.py)
-        if db_manager.verify_user_password(username, password):
-            # Если верно, получаем ID пользователя (или обновляем last_active через create_user)
-            # Лучше использовать get_user_id и отдельно обновлять last_active, 
-            # но create_user с ON CONFLICT тоже работает
-            user_id = db_manager.create_user(username, password) # create_user теперь обновляет last_active и хэш (если передан)
-            current_user_id = user_id
+            return "", "", "❌ Введите имя пользователя и пароль", "", ""
+
+        # Одна проверка bcrypt; при успехе обновляется только last_active
+        user_id = db_manager.authenticate_user(username, password)
+        if user_id is not None:
+            token = db_manager.create_auth_session(user_id)
              # Очищаем поля и показываем сообщение
-            return "", "", f"✅ Добро пожаловать, {username}!" 
+            return "", "", f"✅ Добро пожаловать, {username}!", token, token
         else:
             # Очищаем поля и показываем сообщение об ошибке
-            return "", "", "❌ Неверное имя пользователя или пароль" 
+            return "", "", "❌ Неверное имя пользователя или пароль", "", ""
             
     except Exception as e:
         error_msg = f"❌ Ошибка входа: {str(e)}"
         logger.error(error_msg)
         # Очищаем поля и показываем сообщение об ошибке
-        return "", "", error_msg 
+        return "", "", error_msg, "", ""
 
-def create_new_session(session_name):
-    """Создание новой сессии"""
-    global current_session_id, chat_history
+def logout_user(auth_token, request: gr.Request = None):
+    """Выход: отзывается только токен этого клиента"""
     try:
-        if not current_user_id:
-            return "❌ Сначала войдите в систему"
+        token = request_token(auth_token, request)
+        if token:
+            db_manager.delete_auth_session(token)
+        return "✅ Вы вышли из системы", "", None
+    except Exception as e:
+        error_msg = f"❌ Ошибка выхода: {str(e)}"
+        logger.error(error_msg)
+        return error_msg, auth_token, None
+
+def create_new_session(session_name, auth_token="", request: gr.Request = None):
+    """Создание новой сессии; возвращает статус, ID сессии для состояния клиента и пустой диалог"""
+    try:
+        user_id = resolve_user_id(auth_token, request)
+        if not user_id:
+            return "❌ Сначала войдите в систему", None, gr.update()
         
         if not session_name:
             session_name = f"Сессия {datetime.now().strftime('%Y-%m-%d %H:%M')}"
         
-        session_id = db_manager.create_session(current_user_id, session_name)
-        current_session_id = session_id
-        chat_history = []  # Очищаем историю для новой сессии
-        return f"✅ Создана сессия: {session_name}"
+        session_id = db_manager.create_session(user_id, session_name)
+        # Диалог новой сессии начинается с пустого окна чата этого клиента
+        return f"✅ Создана сессия: {session_name}", session_id, []
     except Exception as e:
         error_msg = f"❌ Ошибка создания сессии: {str(e)}"
         logger.error(error_msg)
-        return error_msg
+        return error_msg, None, gr.update()
 
-def load_user_sessions():
+def load_user_sessions(auth_token="", request: gr.Request = None):
     """Загрузка сессий пользователя"""
     try:
-        if not current_user_id:
+        user_id = resolve_user_id(auth_token, request)
+        if not user_id:
             return []
         
-        sessions = db_manager.get_user_sessions(current_user_id)
+        sessions = db_manager.get_user_sessions(user_id)
         # Возвращаем список кортежей (label, value) для Gradio Dropdown
         choices = [
             (f"{s['session_name']} ({s['updated_at'].strftime('%Y-%m-%d %H:%M')})", s['id'])
@@ -265,130 +261,255 @@ def load_user_sessions():
         logger.error(f"Ошибка загрузки сессий: {e}")
         return []
 
-def load_session(session_id):
-    """Загрузка выбранной сессии"""
-    global current_session_id, chat_history
+def list_sessions_api(auth_token="", request: gr.Request = None):
+    """Сессии текущего пользователя для API: [{id, name, updated_at}]"""
+    user_id = resolve_user_id(auth_token, request)
+    if not user_id:
+        return []
+    return [
+        {"id": s["id"], "name": s["session_name"], "updated_at": s["updated_at"].isoformat()}
+        for s in db_manager.get_user_sessions(user_id)
+    ]
+
+SEARCH_PAGE_SIZE = 10
+
+def search_history(query, auth_token="", request: gr.Request = None, page=0):
+    """Полнотекстовый поиск по сообщениям текущего пользователя (страница page)"""
+    user_id = resolve_user_id(auth_token, request)
+    if not user_id:
+        return "❌ Сначала войдите в систему", 0
+    if not query or not query.strip():
+        return "", 0
+    page = max(int(page or 0), 0)
+    # Лишняя строка показывает, есть ли следующая страница
+    rows = db_manager.search_messages(user_id, query, SEARCH_PAGE_SIZE + 1, page * SEARCH_PAGE_SIZE)
+    has_more = len(rows) > SEARCH_PAGE_SIZE
+    rows = rows[:SEARCH_PAGE_SIZE]
+    if not rows:
+        return ("🔍 Ничего не найдено" if page == 0 else "🔍 Больше результатов нет"), page
+    role_names = {"user": "Вопрос", "assistant": "Ответ"}
+    lines = [f"🔍 Страница {page + 1}" + (" (есть ещё)" if has_more else "")]
+    for row in rows:
+        created = row["created_at"].strftime('%Y-%m-%d %H:%M') if row["created_at"] else ""
+        lines.append(
+            f"**{row['session_name']}** (сессия {row['session_id']}, {created}) - "
+            f"{role_names.get(row['role'], row['role'])}:\n> {row['snippet']}"
+        )
+    return "\n\n".join(lines), page
+
+def search_history_prev(query, page, auth_token="", request: gr.Request = None):
+    """Предыдущая страница результатов поиска"""
+    return search_history(query, auth_token, request, max(int(page or 0) - 1, 0))
+
+def search_history_next(query, page, auth_token="", request: gr.Request = None):
+    """Следующая страница результатов поиска"""
+    return search_history(query, auth_token, request, int(page or 0) + 1)
+
+def load_session(session_id, auth_token="", request: gr.Request = None):
+    """Загрузка выбранной сессии (только своей)"""
     try:
         if not session_id:
-            return [], "❌ Выберите сессию"
+            return [], "❌ Выберите сессию", None
+        user_id = resolve_user_id(auth_token, request)
+        if not user_id:
+            return [], "❌ Сначала войдите в систему", None
+        session_id = owned_session_id(session_id, user_id)
+        if session_id is None:
+            return [], "❌ Сессия не найдена", None
         
         # Получаем сообщения из базы данных
         messages = db_manager.get_session_messages(session_id)
-        chat_history = messages  # Сохраняем в формате [(role, content), ...]
-        current_session_id = session_id
 
         # Формируем пары (user, assistant) для gr.Chatbot
-        formatted_history = []
-        i = 0
-        while i < len(messages):
-            if messages[i][0] == "user":
-                user_msg = messages[i][1]
-                # Ищем следующий ответ ассистента
-                if i + 1 < len(messages) and messages[i+1][0] == "assistant":
-                    assistant_msg = messages[i+1][1]
-                    formatted_history.append((user_msg, assistant_msg))
-                    i += 2
-                else:
-                    # Если нет ответа ассистента, добавляем пустой
-                    formatted_history.append((user_msg, ""))
-                    i += 1
-            else:
-                # Если первый или неожиданный ассистент — пропускаем
-                i += 1
+        formatted_history = pair_chat_history(messages)
 
         logger.info(f"Загружена история диалога: {formatted_history}")
-        return formatted_history, f"✅ Загружена сессия {session_id}"
+        return formatted_history, f"✅ Загружена сессия {session_id}", session_id
     except Exception as e:
         error_msg = f"❌ Ошибка загрузки сессии: {str(e)}"
         logger.error(error_msg)
-        return [], error_msg
+        return [], error_msg, None
+
+TEXT_EXTENSIONS = ['.txt', '.pdf', '.docx', '.html', '.md']
+MEDIA_EXTENSIONS = AUDIO_EXTENSIONS + VIDEO_EXTENSIONS
+
+def iter_ingestion_sources(file_paths, processed_files, reporter=None):
+    """Генератор источников для конвейера индексации.
+
+    Текстовые документы отдаются путями, медиа файлы транскрибируются
+    по мере необходимости и отдаются документами с временными метками.
+    Имена успешно переданных файлов добавляются в processed_files.
+    """
+    transcribed = 0
+    for i, file_path in enumerate(file_paths):
+        if reporter:
+            reporter.check_cancelled()
+        try:
+            logger.info(f"Обработка файла {i+1}/{len(file_paths)}: {file_path}")
+            file_extension = os.path.splitext(file_path)[1].lower()
+            logger.info(f"Расширение файла: {file_extension}")
+            
+            # Обработка текстовых документов
+            if file_extension in TEXT_EXTENSIONS:
+                logger.info(f"Загрузка текстового документа: {file_path}")
+                processed_files.append(file_path)
+                yield file_path
+            
+            # Обработка медиа файлов
+            elif file_extension in MEDIA_EXTENSIONS:
+                logger.info(f"Обработка медиа файла: {file_path}")
+                if reporter:
+                    reporter.update("transcription", transcribed)
+                transcript = process_media_file(file_path)
+                transcribed += 1
+                if reporter:
+                    reporter.update("transcription", transcribed)
+                if transcript:
+                    logger.info(f"Извлечено {len(transcript['text'])} символов из {file_path}")
+                    processed_files.append(file_path)
+                    # Фрагменты транскрипта с временными диапазонами в метаданных
+                    yield from create_documents_from_transcript(transcript, file_path, settings.CHUNK_SIZE)
+                else:
+                    logger.warning(f"Не удалось извлечь текст из {file_path}")
+            else:
+                logger.warning(f"Неподдерживаемый формат файла: {file_extension}")
+        
+        except Exception as e:
+            logger.error(f"Ошибка при обработке файла {file_path}: {str(e)}")
+            continue
+
+# Задачи индексации меняют общее векторное хранилище: при INGEST_WORKERS > 1
+# коммиты выполняются по одному и не перезаписывают результаты друг друга
+index_update_lock = threading.Lock()
+
+def run_ingestion_job(file_paths, reporter):
+    """Обработка загруженных документов (выполняется в пуле задач индексации).
+
+    Чанки задачи собираются в отдельном хранилище и публикуются порциями
+    (INGEST_PUBLISH_SECONDS / INGEST_PUBLISH_BATCHES): каждая порция сохраняется
+    новой версией индекса и только потом подменяет действующую. При ошибке или
+    отмене уже опубликованные порции остаются в индексе, остальные отбрасываются.
+    """
+    logger.info(f"Получено файлов для обработки: {len(file_paths)}")
+
+    # Файлы, прежние чанки которых уже заменены порциями этой задачи
+    replaced_sources = set()
+
+    def on_publish(job_vectorstore):
+        # Порция сохраняется новой версией и только затем подменяет действующую
+        with index_update_lock:
+            reporter.check_cancelled()
+            new_sources = vectorstore_sources(job_vectorstore) - replaced_sources
+            merged_vectorstore, version = commit_vectorstore(job_vectorstore, replace_sources=new_sources)
+            swap_vectorstore(merged_vectorstore)
+            replaced_sources.update(new_sources)
+        logger.info(f"Векторное хранилище обновлено и сохранено, версия {version}")
+
+    processed_files = []
+    logger.info("Создание векторного хранилища...")
+    job_vectorstore, total_chunks = run_ingestion_pipeline(
+        iter_ingestion_sources(file_paths, processed_files, reporter),
+        on_publish=on_publish,
+        progress=reporter.update,
+        cancel_event=reporter.cancel_event
+    )
+    
+    if total_chunks == 0:
+        logger.error("Не удалось обработать ни один файл - нет текстов для векторизации")
+        raise ValueError("Не удалось обработать ни один файл!")
+    
+    if job_vectorstore is not None:
+        on_publish(job_vectorstore)
+    
+    return f"Обработано {len(processed_files)} файлов. Всего чанков: {total_chunks}"
 
-def process_documents(files):
-    """Обработка загруженных документов"""
-    global vectorstore
+# Фоновые задачи индексации: обработка не занимает обработчики Gradio
+ingestion_jobs = IngestionJobManager(run_ingestion_job)
+
+def process_documents(files, auth_token="", request: gr.Request = None):
+    """Постановка загруженных документов в очередь индексации"""
     try:
+        user_id = resolve_user_id(auth_token, request)
+        if not user_id:
+            return "❌ Сначала войдите в систему"
         if not files:
             return "❌ Не выбраны файлы для загрузки!"
         
-        logger.info(f"Получено файлов для обработки: {len(files)}")
-        
-        all_documents = []
-        media_texts = []  # Для хранения текстов из медиа файлов
-        
-        for i, file_obj in enumerate(files):
-            try:
-                logger.info(f"Обработка файла {i+1}/{len(files)}: {file_obj.name}")
-                file_extension = os.path.splitext(file_obj.name)[1].lower()
-                logger.info(f"Расширение файла: {file_extension}")
-                
-                # Обработка текстовых документов
-                if file_extension in ['.txt', '.pdf', '.docx', '.html', '.md']:
-                    logger.info(f"Загрузка текстового документа: {file_obj.name}")
-                    documents = load_multiple_documents([file_obj.name])
-                    if documents:
-                        logger.info(f"Загружено {len(documents)} документов из {file_obj.name}")
-                        all_documents.extend(documents)
-                    else:
-                        logger.warning(f"Не удалось загрузить документы из {file_obj.name}")
-                
-                # Обработка медиа файлов
-                elif file_extension in ['.mp3', '.wav', '.mp4', '.mov']:
-                    logger.info(f"Обработка медиа файла: {file_obj.name}")
-                    text = process_media_file(file_obj)
-                    if text:
-                        logger.info(f"Извлечено {len(text)} символов из {file_obj.name}")
-                        # Создаем кортеж (текст, имя_файла) для последующей обработки
-                        media_texts.append((text, file_obj.name))
-                    else:
-                        logger.warning(f"Не удалось извлечь текст из {file_obj.name}")
-                else:
-                    logger.warning(f"Неподдерживаемый формат файла: {file_extension}")
-            
-            except Exception as e:
-                logger.error(f"Ошибка при обработке файла {file_obj.name}: {str(e)}")
-                continue
-        
-        logger.info(f"Всего текстовых документов: {len(all_documents)}")
-        logger.info(f"Всего медиа текстов: {len(media_texts)}")
-        
-        # Загружаем текстовые документы
-        if all_documents:
-            texts = split_documents(all_documents)
-            logger.info(f"Разделено текстовые документы на {len(texts)} чанков")
-        else:
-            texts = []
-        
-        # Обрабатываем медиа тексты
-        for text, source_name in media_texts:
-            try:
-                from src.document_processor import create_document_from_text
-                doc = create_document_from_text(text, source_name)
-                doc_texts = split_documents([doc])
-                texts.extend(doc_texts)
-                logger.info(f"Обработан медиа текст из {source_name}, добавлено {len(doc_texts)} чанков")
-            except Exception as e:
-                logger.error(f"Ошибка при обработке медиа текста из {source_name}: {str(e)}")
-        
-        if not texts:
-            logger.error("Не удалось обработать ни один файл - нет текстов для векторизации")
-            return "❌ Не удалось обработать ни один файл!"
-        
-        # Создаем векторное хранилище
-        logger.info("Создание векторного хранилища...")
-        vectorstore = create_vectorstore(texts)
-        save_vectorstore(vectorstore)
-        logger.info("Векторное хранилище создано и сохранено")
-        
-        total_files = len([f for f in files if os.path.splitext(f.name)[1].lower() in ['.txt', '.pdf', '.docx', '.html', '.md']]) + len(media_texts)
-        return f"✅ Обработано {total_files} файлов. Всего чанков: {len(texts)}"
+        file_paths = [getattr(f, 'name', f) for f in files]
+        job_id = ingestion_jobs.submit(user_id, file_paths)
+        return f"✅ Задача #{job_id} поставлена в очередь ({len(file_paths)} файлов). Прогресс - на вкладке \"Задачи индексации\""
     except Exception as e:
         error_msg = f"❌ Ошибка: {str(e)}"
         logger.error(error_msg, exc_info=True)  # Добавляем трассировку стека
         return error_msg
 
+JOB_STATUS_LABELS = {
+    "queued": "⏳ В очереди",
+    "running": "⚙️ Выполняется",
+    "completed": "✅ Завершена",
+    "failed": "❌ Ошибка",
+    "cancelled": "🚫 Отменена",
+}
+
+def get_ingestion_jobs_table(auth_token="", request: gr.Request = None):
+    """Таблица последних задач индексации для вкладки статуса"""
+    user_id = resolve_user_id(auth_token, request)
+    if not user_id:
+        return []
+    rows = []
+    for job in db_manager.list_ingestion_jobs(user_id):
+        progress = job.get("progress") or {}
+        progress_text = ", ".join(f"{stage}: {progress.get(stage, 0)}" for stage in STAGES)
+        rows.append([
+            job["id"],
+            JOB_STATUS_LABELS.get(job["status"], job["status"]),
+            job.get("stage") or "",
+            progress_text,
+            len(job.get("files") or []),
+            job.get("message") or "",
+            job["created_at"].strftime('%Y-%m-%d %H:%M:%S') if job.get("created_at") else "",
+        ])
+    return rows
+
+def get_user_ingestion_job(job_id, user_id):
+    """Задача индексации, если она принадлежит пользователю, иначе None"""
+    if not job_id or not user_id:
+        return None
+    job = db_manager.get_ingestion_job(int(job_id))
+    return job if job and job["user_id"] == user_id else None
+
+def get_ingestion_job_status(job_id, auth_token="", request: gr.Request = None):
+    """Статус задачи индексации по ID (доступен и через API Gradio)"""
+    job = get_user_ingestion_job(job_id, resolve_user_id(auth_token, request))
+    if not job:
+        return {}
+    return {
+        "id": job["id"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "progress": job["progress"],
+        "message": job["message"],
+        "files": job["files"],
+    }
+
+def cancel_ingestion_job(job_id, auth_token="", request: gr.Request = None):
+    """Отмена задачи индексации (только своей)"""
+    try:
+        if not job_id:
+            return "❌ Укажите номер задачи"
+        if get_user_ingestion_job(job_id, resolve_user_id(auth_token, request)) is None:
+            return f"❌ Задача #{int(job_id)} не найдена"
+        if ingestion_jobs.cancel(int(job_id)):
+            return f"✅ Запрошена отмена задачи #{int(job_id)}"
+        return f"❌ Задача #{int(job_id)} не найдена или уже завершена"
+    except Exception as e:
+        error_msg = f"❌ Ошибка отмены: {str(e)}"
+        logger.error(error_msg)
+        return error_msg
+
 def initialize_chat(model_name_key):
     """Инициализация чат-бота с выбранной моделью"""
-    global vectorstore, qa_chain, current_model
+    global vectorstore, qa_chain, current_model, current_model_name
     try:
         # Проверяем, есть ли векторное хранилище
         if vectorstore is None:
@@ -404,9 +525,12 @@ def initialize_chat(model_name_key):
         available_models = get_available_models()
         model_name = available_models.get(model_name_key, settings.DEFAULT_MODEL)
         current_model = model_name_key
+        current_model_name = model_name
         
-        llm = get_llm(model_name)
-        qa_chain = create_rag_chain(vectorstore, llm)
+        # Хеджированные запросы и обход медленных/сбойных моделей (LLM_ROUTER_ENABLED);
+        # с пулом (CHAT_WORKERS > 0) цепочки строят процессы-исполнители, главному она не нужна
+        if settings.CHAT_WORKERS == 0:
+            qa_chain = create_rag_chain(vectorstore, create_chat_llm(model_name))
         message = f"✅ Чат-бот готов к работе! Используется {model_name_key}"
         return "", message, ""
     except Exception as e:
@@ -414,45 +538,35 @@ def initialize_chat(model_name_key):
         logger.error(error_msg)
         return "", error_msg, ""
 
-def chat(message, history):
+def chat(message, history, session_id=None, auth_token="", request: gr.Request = None):
     """Функция чата с отображением источников"""
-    global qa_chain, chat_history, current_session_id
-    if qa_chain is None:
+    global qa_chain
+    # С пулом ход выполняет процесс-исполнитель: достаточно выбранной модели
+    if (current_model_name if settings.CHAT_WORKERS > 0 else qa_chain) is None:
         return "", history, "Сначала инициализируйте чат-бота!"
     
+    chat_started = time.perf_counter()
     try:
-        # Сохраняем текущий диалог в глобальной истории
-        chat_history.append(("user", message))  # Добавляем вопрос пользователя
-        
-        # Формируем чат-историю для RAG цепочки
-        # Преобразуем в формат [(user_message, assistant_message), ...]
-        chat_history_pairs = []
-        temp_history = chat_history.copy()
-        i = 0
-        while i < len(temp_history):
-            if temp_history[i][0] == "user":
-                user_msg = temp_history[i][1]
-                if i + 1 < len(temp_history) and temp_history[i+1][0] == "assistant":
-                    assistant_msg = temp_history[i+1][1]
-                    chat_history_pairs.append((user_msg, assistant_msg))
-                    i += 2
-                else:
-                    chat_history_pairs.append((user_msg, ""))
-                    i += 1
-            else:
-                i += 1
+        # Чат-история для RAG цепочки - завершённые ходы из окна чата этого клиента
+        # в формате [(user_message, assistant_message), ...]; текущий вопрос
+        # передаётся отдельно и в историю не входит
+        chat_history_pairs = [(user_msg, assistant_msg) for user_msg, assistant_msg in history or []
+                              if user_msg and assistant_msg]
         
-        result = qa_chain({"question": message, "chat_history": chat_history_pairs})
+        if settings.CHAT_WORKERS > 0:
+            # Поиск и вызов LLM - в процессе-исполнителе, процесс Gradio только ждёт результат
+            result = run_chat_turn(current_model_name, message, chat_history_pairs)
+        else:
+            result = answer_question(qa_chain, message, chat_history_pairs)
         answer = result["answer"]
         
-        # Обновляем историю ответом бота
-        chat_history.append(("assistant", answer))
-        
-        # Сохраняем сообщения в базу данных
-        if current_session_id:
+        # Сохраняем сообщения в базу данных (только в сессию вошедшего пользователя)
+        if session_id:
             try:
-                db_manager.save_message(current_session_id, "user", message)
-                db_manager.save_message(current_session_id, "assistant", answer)
+                session_id = owned_session_id(session_id, resolve_user_id(auth_token, request))
+                if session_id:
+                    db_manager.save_message(session_id, "user", message)
+                    db_manager.save_message(session_id, "assistant", answer)
             except Exception as e:
                 logger.error(f"Ошибка сохранения сообщений в БД: {e}")
         
@@ -464,22 +578,31 @@ def chat(message, history):
             sources_text += f"{source['content']}\n"
             if source['metadata']:
                 sources_text += f"*Метаданные: {source['metadata']}*\n\n"
+        sources_text += result["usage_summary"]
+        logger.info(result["usage_summary"])
         
         return "", history + [(message, answer)], sources_text
     except Exception as e:
+        STAGE_ERRORS.labels("chat_total").inc()
         error_msg = f"❌ Ошибка: {str(e)}"
         return "", history, error_msg
+    finally:
+        STAGE_LATENCY.labels("chat_total").observe(time.perf_counter() - chat_started)
+
+def get_coalescing_status():
+    """Счётчик объединённых одинаковых запросов к LLM для вкладки чата"""
+    stats = get_coalescing_stats()
+    return (f"🔗 Объединено одинаковых запросов: **{stats['coalesced']}** "
+            f"(вызовов LLM: {stats['leaders']}, выполняется: {stats['in_flight']})")
 
 def clear_chat():
-    """Очистка истории чата"""
-    global chat_history
-    chat_history = []
+    """Очистка окна чата (история каждого клиента - в его gr.Chatbot)"""
     return []
 
 # Функции экспорта с выбором директории
-def export_chat_json_wrapper(export_dir=""):
-    """Обертка для экспорта чата в JSON с выбором директории"""
-    global chat_history, current_model
+def export_chat_json_wrapper(export_dir="", history=None):
+    """Обертка для экспорта чата в JSON с выбором директории (history - диалог из окна чата клиента)"""
+    global current_model
     try:
         # Создаем имя файла
         filename_base = f"chat_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json" # Добавлено .json
@@ -494,16 +617,19 @@ def export_chat_json_wrapper(export_dir=""):
         # Передаем только имя файла, логика путей внутри export_handler
         # (убедитесь, что export_handler.py не ожидает export_dir отдельно,
         # если да, то передайте его тоже)
-        result = export_chat_to_json(chat_history, current_model, filename)
+        # В файле - сообщения в формате [(role, content), ...], как в БД
+        messages = [(role, content) for user_msg, assistant_msg in history or []
+                    for role, content in (("user", user_msg), ("assistant", assistant_msg)) if content]
+        result = export_chat_to_json(messages, current_model, filename)
         return result
     except Exception as e:
         error_msg = f"❌ Ошибка экспорта: {str(e)}"
         logger.error(error_msg)
         return error_msg
 
-def export_chat_pdf_wrapper(export_dir=""):
-    """Обертка для экспорта чата в PDF с выбором директории"""
-    global chat_history, current_model
+def export_chat_pdf_wrapper(export_dir="", history=None):
+    """Обертка для экспорта чата в PDF: сборка в фоне, по готовности - файл для скачивания"""
+    global current_model
     try:
         # Создаем имя файла
         filename_base = f"chat_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf" # Добавлено .pdf
@@ -515,22 +641,77 @@ def export_chat_pdf_wrapper(export_dir=""):
 
         filename = os.path.join(target_dir, filename_base)
 
-        # Передаем только имя файла, логика путей внутри export_handler
-        result = export_chat_to_pdf(chat_history, current_model, filename)
-        return result
+        # Снимок диалога клиента в парах (вопрос, ответ): чат может продолжаться, пока PDF собирается
+        pairs = [(user_msg or "", assistant_msg or "") for user_msg, assistant_msg in history or []]
+        future = submit_pdf_export(pairs, current_model, filename)
+        # Ждём короткими шагами: между шагами генератора поток обработчика свободен
+        started = time.perf_counter()
+        while not future.done():
+            yield f"⏳ Формирование PDF... {time.perf_counter() - started:.0f} с", None
+            wait([future], timeout=PDF_EXPORT_POLL_SECONDS)
+        result_path = future.result()
+        yield f"✅ Чат экспортирован в {result_path}", result_path
     except Exception as e:
         error_msg = f"❌ Ошибка экспорта: {str(e)}"
         logger.error(error_msg)
+        yield error_msg, None
+
+EXPORT_FORMATS = ["json", "jsonl"]
+
+def _export_history_from_db(rows, name_prefix, export_dir, fmt, header):
+    """Потоковый экспорт истории из БД в файл в директории экспорта"""
+    fmt = fmt if fmt in EXPORT_FORMATS else "json"
+    target_dir = export_dir if export_dir else DEFAULT_EXPORT_DIR
+    os.makedirs(target_dir, exist_ok=True)
+    filename = os.path.join(target_dir, f"{name_prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}")
+    count = export_messages_stream(rows, filename, fmt, header)
+    return f"✅ Экспортировано сообщений: {count} в {filename}"
+
+def export_session_wrapper(export_dir="", fmt="json", session_id=None, auth_token="", request: gr.Request = None):
+    """Экспорт текущей сессии из БД (JSON/JSONL) без загрузки в память"""
+    try:
+        user_id = resolve_user_id(auth_token, request)
+        session_id = owned_session_id(session_id, user_id)
+        if not session_id:
+            return "❌ Сначала выберите или создайте сессию"
+        rows = db_manager.iter_session_messages(session_id, settings.EXPORT_FETCH_SIZE)
+        return _export_history_from_db(
+            rows, f"session_{session_id}", export_dir, fmt,
+            {"session_id": session_id, "user_id": user_id}
+        )
+    except Exception as e:
+        error_msg = f"❌ Ошибка экспорта сессии: {str(e)}"
+        logger.error(error_msg)
+        return error_msg
+
+def export_user_sessions_wrapper(export_dir="", fmt="json", auth_token="", request: gr.Request = None):
+    """Экспорт всех сессий текущего пользователя из БД (JSON/JSONL)"""
+    try:
+        user_id = resolve_user_id(auth_token, request)
+        if not user_id:
+            return "❌ Сначала войдите в систему"
+        rows = db_manager.iter_user_messages(user_id, settings.EXPORT_FETCH_SIZE)
+        return _export_history_from_db(
+            rows, f"user_{user_id}_sessions", export_dir, fmt,
+            {"user_id": user_id}
+        )
+    except Exception as e:
+        error_msg = f"❌ Ошибка экспорта сессий: {str(e)}"
+        logger.error(error_msg)
         return error_msg
 
 # Интерфейс Gradio
-with gr.Blocks(title="RAG Chatbot Advanced") as demo:
+with startup_profiler.step("build gradio ui"), gr.Blocks(title="RAG Chatbot Advanced") as demo:
     gr.Markdown("# 🤖 RAG Chatbot с расширенными возможностями")
     gr.Markdown("Профессиональный чат-бот с Retrieval-Augmented Generation")
     
     # Объявляем компоненты заранее
     chatbot = gr.Chatbot(label="Диалог", height=500)
     sources_output = gr.Markdown(label="Источники", height=500)
+    # Состояние клиента (у каждой вкладки браузера и каждого API-клиента своё):
+    # токен входа и выбранная сессия диалога
+    auth_token = gr.State("")
+    session_state = gr.State(None)
     
     # Обновленная вкладка Авторизации/Регистрации
     # Изменено: with gr.Tab("1. Авторизация"): -> with gr.Tab("1. Вход/Регистрация"):
@@ -540,7 +721,10 @@ with gr.Blocks(title="RAG Chatbot Advanced") as demo:
         login_username_input = gr.Textbox(label="Имя пользователя (вход)", placeholder="Введите ваше имя")
         login_password_input = gr.Textbox(label="Пароль (вход)", placeholder="Введите ваш пароль", type="password")
         login_btn = gr.Button("Войти")
+        logout_btn = gr.Button("Выйти")
         login_status = gr.Textbox(label="Статус входа", interactive=False)
+        # Токен для API-клиентов: новый клиент передаёт его заголовком Authorization: Bearer
+        api_token_output = gr.Textbox(visible=False)
         
         # Регистрация
         gr.Markdown("### Регистрация")
@@ -554,18 +738,21 @@ with gr.Blocks(title="RAG Chatbot Advanced") as demo:
         login_btn.click(
             login_user, 
             inputs=[login_username_input, login_password_input], # <-- Обновлены входы
-            outputs=[login_username_input, login_password_input, login_status] # <-- Обновлены выходы
+            outputs=[login_username_input, login_password_input, login_status, auth_token, api_token_output], # <-- Обновлены выходы
+            api_name="login"
         )
+        logout_btn.click(logout_user, inputs=auth_token, outputs=[login_status, auth_token, session_state], api_name="logout")
         
         # Новый: register_btn.click
         register_btn.click(
             register_user,
             inputs=[register_username_input, register_password_input],
-            outputs=[register_username_input, register_password_input, register_status]
+            outputs=[register_username_input, register_password_input, register_status],
+            api_name="register"
         )
 
     with gr.Tab("2. Сессии"):
-        sessions_dropdown = gr.Dropdown(label="Выберите сессию", choices=[], interactive=True)
+        sessions_dropdown = gr.Dropdown(label="Выберите сессию", choices=[], interactive=True, allow_custom_value=True)
         refresh_sessions_btn = gr.Button("Обновить список")
         load_session_btn = gr.Button("Загрузить сессию")
         session_load_status = gr.Textbox(label="Статус загрузки", interactive=False)
@@ -574,13 +761,33 @@ with gr.Blocks(title="RAG Chatbot Advanced") as demo:
         session_status = gr.Textbox(label="Статус сессии", interactive=False)
 
         # Исправленный обработчик обновления списка сессий
-        def refresh_sessions_wrapper():
-            choices = load_user_sessions()
+        def refresh_sessions_wrapper(auth_token, request: gr.Request):
+            choices = load_user_sessions(auth_token, request)
             return gr.update(choices=choices, value=None)
         
-        refresh_sessions_btn.click(refresh_sessions_wrapper, outputs=sessions_dropdown)
-        create_session_btn.click(create_new_session, inputs=session_name_input, outputs=session_status)
-        load_session_btn.click(load_session, inputs=sessions_dropdown, outputs=[chatbot, session_load_status])
+        refresh_sessions_btn.click(refresh_sessions_wrapper, inputs=auth_token, outputs=sessions_dropdown)
+        create_session_btn.click(create_new_session, inputs=[session_name_input, auth_token], outputs=[session_status, session_state, chatbot], api_name="create_session")
+        load_session_btn.click(load_session, inputs=[sessions_dropdown, auth_token], outputs=[chatbot, session_load_status, session_state], api_name="load_session")
+
+        gr.Markdown("### 🔍 Поиск по истории диалогов")
+        search_input = gr.Textbox(label="Поиск по сообщениям", placeholder='Слова, "точная фраза", -исключение')
+        with gr.Row():
+            search_btn = gr.Button("Найти")
+            search_prev_btn = gr.Button("← Назад")
+            search_next_btn = gr.Button("Дальше →")
+        search_page = gr.State(0)
+        search_results = gr.Markdown()
+        gr.Markdown("Чтобы открыть найденную сессию, введите её номер в поле выбора сессии и нажмите «Загрузить сессию».")
+
+        search_btn.click(search_history, inputs=[search_input, auth_token], outputs=[search_results, search_page], api_name="search_messages")
+        search_input.submit(search_history, inputs=[search_input, auth_token], outputs=[search_results, search_page])
+        search_prev_btn.click(search_history_prev, inputs=[search_input, search_page, auth_token], outputs=[search_results, search_page])
+        search_next_btn.click(search_history_next, inputs=[search_input, search_page, auth_token], outputs=[search_results, search_page])
+
+        # Только для API (нагрузочные тесты, интеграции): список сессий в виде JSON
+        sessions_json = gr.JSON(visible=False)
+        list_sessions_btn = gr.Button(visible=False)
+        list_sessions_btn.click(list_sessions_api, inputs=auth_token, outputs=sessions_json, api_name="list_sessions")
 
     with gr.Tab("3. Загрузка документов"):
         file_input = gr.File(
@@ -590,7 +797,7 @@ with gr.Blocks(title="RAG Chatbot Advanced") as demo:
         )
         process_btn = gr.Button("Обработать документы")
         status1 = gr.Textbox(label="Статус", interactive=False)
-        process_btn.click(process_documents, inputs=file_input, outputs=status1)
+        process_btn.click(process_documents, inputs=[file_input, auth_token], outputs=status1, api_name="submit_ingestion")
 
     with gr.Tab("4. Инициализация модели"):
         model_dropdown = gr.Dropdown(
@@ -600,13 +807,16 @@ with gr.Blocks(title="RAG Chatbot Advanced") as demo:
         )
         init_btn = gr.Button("Инициализировать чат-бота")
         status2 = gr.Textbox(label="Статус", interactive=False)
-        init_btn.click(initialize_chat, inputs=model_dropdown, outputs=[model_dropdown, status2, status1])
+        init_btn.click(initialize_chat, inputs=model_dropdown, outputs=[model_dropdown, status2, status1], api_name="initialize_chat")
 
     with gr.Tab("5. Чат"):
         # chatbot и sources_output уже объявлены выше
         msg = gr.Textbox(label="Введите ваш вопрос", placeholder="Задайте вопрос по документам...")
         clear_btn = gr.Button("Очистить")
-        msg.submit(chat, [msg, chatbot], [msg, chatbot, sources_output])
+        coalesce_status = gr.Markdown(get_coalescing_status, every=5)
+        # С процессами-исполнителями Gradio пропускает столько ходов одновременно, сколько процессов
+        msg.submit(chat, [msg, chatbot, session_state, auth_token], [msg, chatbot, sources_output], api_name="chat",
+                   concurrency_limit=max(1, settings.CHAT_WORKERS))
         clear_btn.click(clear_chat, None, chatbot)
 
     with gr.Tab("6. Экспорт"):
@@ -614,8 +824,59 @@ with gr.Blocks(title="RAG Chatbot Advanced") as demo:
         export_json_btn = gr.Button("Экспорт в JSON")
         export_pdf_btn = gr.Button("Экспорт в PDF")
         export_status = gr.Textbox(label="Статус экспорта", interactive=False)
-        export_json_btn.click(export_chat_json_wrapper, inputs=export_dir, outputs=export_status)
-        export_pdf_btn.click(export_chat_pdf_wrapper, inputs=export_dir, outputs=export_status)
+        export_pdf_file = gr.File(label="PDF для скачивания", interactive=False)
+        export_json_btn.click(export_chat_json_wrapper, inputs=[export_dir, chatbot], outputs=export_status)
+        export_pdf_btn.click(export_chat_pdf_wrapper, inputs=[export_dir, chatbot], outputs=[export_status, export_pdf_file],
+                             concurrency_limit=max(1, settings.PDF_EXPORT_WORKERS))
+
+        gr.Markdown("### Экспорт истории из базы данных")
+        export_format = gr.Radio(EXPORT_FORMATS, value="json", label="Формат")
+        export_session_btn = gr.Button("Экспорт текущей сессии")
+        export_user_btn = gr.Button("Экспорт всех моих сессий")
+        export_session_btn.click(export_session_wrapper, inputs=[export_dir, export_format, session_state, auth_token], outputs=export_status, api_name="export_session")
+        export_user_btn.click(export_user_sessions_wrapper, inputs=[export_dir, export_format, auth_token], outputs=export_status, api_name="export_user_sessions")
+
+    with gr.Tab("7. Задачи индексации"):
+        jobs_table = gr.Dataframe(
+            headers=["ID", "Статус", "Стадия", "Прогресс", "Файлов", "Сообщение", "Создана"],
+            interactive=False
+        )
+        refresh_jobs_btn = gr.Button("Обновить")
+        job_id_input = gr.Number(label="Номер задачи", precision=0)
+        job_status_btn = gr.Button("Статус задачи")
+        cancel_job_btn = gr.Button("Отменить задачу")
+        job_status_output = gr.JSON(label="Статус задачи")
+        job_action_status = gr.Textbox(label="Статус", interactive=False)
+        refresh_jobs_btn.click(get_ingestion_jobs_table, inputs=auth_token, outputs=jobs_table, api_name="list_ingestion_jobs")
+        job_status_btn.click(get_ingestion_job_status, inputs=[job_id_input, auth_token], outputs=job_status_output, api_name="ingestion_status")
+        cancel_job_btn.click(cancel_ingestion_job, inputs=[job_id_input, auth_token], outputs=job_action_status, api_name="cancel_ingestion")
+
+def main():
+    startup_profiler.report()
+    if "--profile-startup" in sys.argv:
+        # Режим профилирования: только отчёт о времени запуска, без сервера
+        warm_up()
+        sys.exit(0)
+    start_background_warmup()
+    try:
+        ingestion_jobs.resume_unfinished()
+    except Exception as e:
+        logger.warning(f"Не удалось возобновить задачи индексации: {e}")
+    # Секции chat_messages на месяцы вперёд и архивация старых (MESSAGE_RETENTION_MONTHS)
+    start_retention_scheduler()
+    # Новые версии индекса (после индексации или отката) подхватываются без перезапуска;
+    # процессы-исполнители проверяют версию сами перед каждым ходом
+    start_index_watcher(swap_vectorstore)
+    if settings.CHAT_WORKERS > 0:
+        start_chat_workers()
+    if settings.METRICS_ENABLED:
+        # Gradio и /metrics (Prometheus) на одном сервере
+        import uvicorn
+        from fastapi import FastAPI
+        server = FastAPI()
+        server.mount("/metrics", create_metrics_app())
+        server = gr.mount_gradio_app(server, demo, path="/")
+        uvicorn.run(server, host="0.0.0.0", port=settings.SERVER_PORT)
+    else:
+        demo.launch(server_name="0.0.0.0")
 
-if __name__ == "__main__":
-    demo.launch(server_name="0.0.0.0")
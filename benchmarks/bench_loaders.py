@@ -0,0 +1,106 @@
+# benchmarks/bench_loaders.py
+"""Сравнение пропускной способности лоадеров HTML/Markdown.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_loaders --dir path/to/docs
+Без --dir генерируется синтетический набор файлов.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from src.fast_loaders import FastHTMLLoader, FastMarkdownLoader
+
+WORDS = (
+    "документ поиск вектор модель ответ вопрос контекст данные индекс текст "
+    "retrieval augmented generation chunk embedding query answer source"
+).split()
+
+
+def _sentence(rng):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 20))).capitalize() + '.'
+
+
+def generate_corpus(directory, files_per_type, paragraphs, seed=42):
+    """Генерация набора HTML и Markdown файлов"""
+    rng = random.Random(seed)
+    for i in range(files_per_type):
+        body = []
+        md = [f"# Документ {i}\n"]
+        for p in range(paragraphs):
+            text = ' '.join(_sentence(rng) for _ in range(4))
+            body.append(f"<h2>Раздел {p}</h2><p>{text} <a href='#'>ссылка</a></p>"
+                        f"<ul><li>{_sentence(rng)}</li><li>{_sentence(rng)}</li></ul>")
+            md.append(f"## Раздел {p}\n\n{text} [ссылка](http://example.com) **важно**\n\n"
+                      f"- {_sentence(rng)}\n- {_sentence(rng)}\n")
+        html = ("<html><head><title>Документ</title><style>p{color:red}</style></head>"
+                f"<body>{''.join(body)}<script>var x = 1;</script></body></html>")
+        with open(os.path.join(directory, f"doc_{i}.html"), 'w', encoding='utf-8') as f:
+            f.write(html)
+        with open(os.path.join(directory, f"doc_{i}.md"), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(md))
+
+
+def _unstructured_loaders():
+    try:
+        from langchain_community.document_loaders import UnstructuredHTMLLoader, UnstructuredMarkdownLoader
+        import unstructured  # noqa: F401
+    except ImportError:
+        return None
+    return {".html": UnstructuredHTMLLoader, ".md": UnstructuredMarkdownLoader}
+
+
+def bench(files, loaders, repeat):
+    """Возвращает (файлов/с, МБ/с, символов извлечено) для набора лоадеров"""
+    total_bytes = sum(os.path.getsize(path) for path in files) * repeat
+    chars = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for path in files:
+            loader_cls = loaders[os.path.splitext(path)[1]]
+            for doc in loader_cls(path).load():
+                chars += len(doc.page_content)
+    elapsed = time.perf_counter() - start
+    return len(files) * repeat / elapsed, total_bytes / elapsed / (1024 * 1024), chars // repeat, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dir", help="Папка с .html/.md файлами")
+    parser.add_argument("--files", type=int, default=200, help="Файлов каждого типа при генерации")
+    parser.add_argument("--paragraphs", type=int, default=30, help="Разделов в сгенерированном файле")
+    parser.add_argument("--repeat", type=int, default=3, help="Число проходов по набору")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        directory = args.dir
+        if not directory:
+            directory = tmp_dir
+            generate_corpus(directory, args.files, args.paragraphs)
+
+        files = sorted(
+            os.path.join(directory, name) for name in os.listdir(directory)
+            if os.path.splitext(name)[1] in (".html", ".md")
+        )
+        if not files:
+            print("Нет файлов .html/.md для теста")
+            return
+
+        print(f"Файлов: {len(files)}, объём: {sum(os.path.getsize(p) for p in files) / 1024:.0f} КБ, проходов: {args.repeat}")
+        results = {"fast": {".html": FastHTMLLoader, ".md": FastMarkdownLoader}}
+        unstructured = _unstructured_loaders()
+        if unstructured:
+            results["unstructured"] = unstructured
+        else:
+            print("unstructured не установлен - сравнение только для быстрых лоадеров")
+
+        for name, loaders in results.items():
+            files_per_sec, mb_per_sec, chars, elapsed = bench(files, loaders, args.repeat)
+            print(f"{name:>12}: {files_per_sec:10.1f} файлов/с  {mb_per_sec:8.2f} МБ/с  "
+                  f"символов: {chars}  время: {elapsed:.2f} с")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+# benchmarks/bench_suite.py
+"""Офлайн-бенчмарк конвейера: загрузка, разбиение, индексация, поиск, ход чата.
+
+Внешние сервисы заменены детерминированными заглушками (benchmarks/fakes.py),
+корпус PDF/TXT/MD генерируется (benchmarks/corpus.py), так что результаты
+сравнимы между коммитами. Итог пишется в JSON.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_suite                        # полный прогон
+    python -m benchmarks.bench_suite --quick                # быстрый прогон
+    python -m benchmarks.bench_suite --sizes 10000,100000 --output results.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+from benchmarks.corpus import generate_corpus
+from benchmarks.fakes import FakeEmbeddings, FakeStreamingChatModel
+from config.settings import settings
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def percentiles(samples):
+    """p50/p95/p99 и среднее в миллисекундах"""
+    values = np.asarray(samples) * 1000
+    return {
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "mean_ms": float(values.mean()),
+        "n": len(samples),
+    }
+
+
+def use_fake_embeddings(embeddings):
+    """Подмена синглтона embeddings на заглушку (get_embeddings вернёт её)"""
+    from src import embeddings_handler
+    embeddings_handler._embeddings = embeddings
+
+
+def bench_ingestion(corpus_dir, files, paragraphs, chunk_size, chunk_overlap):
+    """Документов/с через load_multiple_documents и split_documents, чанков/с через create_vectorstore"""
+    from src.document_processor import load_multiple_documents, split_documents
+    from src.vector_store import create_vectorstore
+
+    paths = generate_corpus(corpus_dir, files, paragraphs)
+    # Замеряем разбор, а не кэш распарсенных документов
+    settings.DOCUMENT_CACHE_ENABLED = False
+
+    start = time.perf_counter()
+    documents = load_multiple_documents(paths)
+    load_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    chunks = split_documents(documents, chunk_size, chunk_overlap)
+    split_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vectorstore = create_vectorstore(chunks)
+    index_seconds = time.perf_counter() - start
+
+    by_type = {}
+    for path in paths:
+        ext = os.path.splitext(path)[1]
+        by_type[ext] = by_type.get(ext, 0) + 1
+    return {
+        "files": len(paths),
+        "files_by_type": by_type,
+        "documents": len(documents),
+        "chunks": len(chunks),
+        "load_docs_per_sec": len(paths) / load_seconds,
+        "split_docs_per_sec": len(documents) / split_seconds,
+        "index_chunks_per_sec": len(chunks) / index_seconds,
+        "load_seconds": load_seconds,
+        "split_seconds": split_seconds,
+        "index_seconds": index_seconds,
+    }, vectorstore
+
+
+class _LazyDocuments(dict):
+    """Docstore без хранения миллиона объектов Document: создаёт их при обращении"""
+
+    def __init__(self, size):
+        super().__init__()
+        self.size = size
+
+    def __contains__(self, key):
+        return isinstance(key, str) and key.isdigit() and int(key) < self.size
+
+    def __getitem__(self, key):
+        from langchain_core.documents import Document
+        return Document(page_content=f"Синтетический чанк {key}", metadata={"source": "bench", "chunk": int(key)})
+
+    def __len__(self):
+        return self.size
+
+
+class _LazyIds:
+    def __init__(self, size):
+        self.size = size
+
+    def __getitem__(self, index):
+        return str(index)
+
+    def get(self, index, default=None):
+        return str(index) if 0 <= index < self.size else default
+
+    def __len__(self):
+        return self.size
+
+
+def build_synthetic_index(size, dim, embeddings, batch=100_000, seed=0):
+    """FAISS-хранилище из size случайных нормированных векторов"""
+    import faiss
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    from langchain_community.vectorstores import FAISS
+
+    rng = np.random.default_rng(seed)
+    index = faiss.IndexFlatL2(dim)
+    for start in range(0, size, batch):
+        vectors = rng.standard_normal((min(batch, size - start), dim)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        index.add(vectors)
+    return FAISS(embeddings, index, InMemoryDocstore(_LazyDocuments(size)), _LazyIds(size))
+
+
+def bench_search(sizes, dim, queries, k):
+    """Перцентили задержки поиска (векторизация запроса + FAISS) на индексах разного размера"""
+    embeddings = FakeEmbeddings(dim=dim)
+    query_texts = [f"вопрос номер {i} о документах" for i in range(queries)]
+    results = {}
+    for size in sizes:
+        start = time.perf_counter()
+        vectorstore = build_synthetic_index(size, dim, embeddings)
+        build_seconds = time.perf_counter() - start
+
+        vectorstore.similarity_search(query_texts[0], k=k)  # прогрев
+        search_only, end_to_end = [], []
+        for text in query_texts:
+            t0 = time.perf_counter()
+            vector = embeddings.embed_query(text)
+            t1 = time.perf_counter()
+            vectorstore.similarity_search_by_vector(vector, k=k)
+            t2 = time.perf_counter()
+            search_only.append(t2 - t1)
+            end_to_end.append(t2 - t0)
+        results[str(size)] = {
+            "build_seconds": build_seconds,
+            "search": percentiles(search_only),
+            "embed_and_search": percentiles(end_to_end),
+        }
+        print(f"  {size:>9} чанков: p50 {results[str(size)]['search']['p50_ms']:.2f} мс, "
+              f"p95 {results[str(size)]['search']['p95_ms']:.2f} мс")
+        del vectorstore
+    return results
+
+
+def bench_chat(vectorstore, turns, token_delay):
+    """Задержка хода app.chat() с заглушкой LLM (без БД)"""
+    from src.chat_chain import create_rag_chain
+
+    llm = FakeStreamingChatModel(token_delay=token_delay)
+    qa_chain = create_rag_chain(vectorstore, llm)
+    try:
+        import app
+    except ImportError as e:
+        # Без gradio app.py не импортируется - меряем тот же вызов цепочки, что делает chat()
+        print(f"  app.py недоступен ({e}), замер вызова RAG-цепочки")
+        app = None
+
+    samples = []
+    history = []
+    if app is not None:
+        app.qa_chain = qa_chain
+        app.current_session_id = None
+        app.chat_history = []
+    for turn in range(turns):
+        question = f"Что говорится в документах о теме {turn % 7}?"
+        start = time.perf_counter()
+        if app is not None:
+            _, history, _ = app.chat(question, history)
+        else:
+            result = qa_chain({"question": question, "chat_history": history})
+            history = history + [(question, result["answer"])]
+        samples.append(time.perf_counter() - start)
+    return {"mode": "app.chat" if app is not None else "rag_chain", **percentiles(samples)}
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _parse_sizes(value):
+    return [int(float(item)) for item in value.split(',') if item.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=60, help="Файлов в корпусе (поровну PDF/TXT/MD)")
+    parser.add_argument("--paragraphs", type=int, default=40, help="Абзацев в файле")
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="Размеры индексов для поиска")
+    parser.add_argument("--dim", type=int, default=384, help="Размерность векторов")
+    parser.add_argument("--queries", type=int, default=200, help="Запросов на размер индекса")
+    parser.add_argument("--k", type=int, default=4, help="Число результатов поиска")
+    parser.add_argument("--turns", type=int, default=20, help="Ходов чата")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Задержка заглушки LLM на токен, с")
+    parser.add_argument("--quick", action="store_true", help="Маленький прогон (12 файлов, индексы до 10k)")
+    parser.add_argument("--output", help="Путь к JSON (по умолчанию benchmarks/results/<дата>_<коммит>.json)")
+    args = parser.parse_args()
+
+    if args.quick:
+        args.files, args.paragraphs, args.sizes, args.queries, args.turns = 12, 20, "1000,10000", 50, 5
+
+    import logging
+    logging.disable(logging.INFO)
+
+    embeddings = FakeEmbeddings(dim=args.dim)
+    use_fake_embeddings(embeddings)
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "params": vars(args),
+    }
+
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        print("Загрузка, разбиение и индексация...")
+        report["ingestion"], vectorstore = bench_ingestion(
+            corpus_dir, args.files, args.paragraphs, settings.CHUNK_SIZE, settings.CHUNK_OVERLAP
+        )
+        ingestion = report["ingestion"]
+        print(f"  загрузка: {ingestion['load_docs_per_sec']:.1f} файлов/с, "
+              f"разбиение: {ingestion['split_docs_per_sec']:.1f} документов/с, "
+              f"индексация: {ingestion['index_chunks_per_sec']:.1f} чанков/с")
+
+        print("Ход чата...")
+        report["chat"] = bench_chat(vectorstore, args.turns, args.token_delay)
+        print(f"  p50 {report['chat']['p50_ms']:.1f} мс, p95 {report['chat']['p95_ms']:.1f} мс ({report['chat']['mode']})")
+
+    print("Поиск...")
+    report["search"] = bench_search(_parse_sizes(args.sizes), args.dim, args.queries, args.k)
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{report['commit'] or 'nogit'}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Результаты: {output}")
+
+
+if __name__ == "__main__":
+    main()
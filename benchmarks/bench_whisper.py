@@ -0,0 +1,114 @@
+# benchmarks/bench_whisper.py
+"""Скорость и точность Whisper на CPU: fp32 против динамической int8-квантизации.
+
+Для каждой конфигурации (размер модели, квантизация, число потоков)
+выводится real-time factor (время распознавания / длительность записи,
+меньше - быстрее) и word error rate относительно эталонного текста.
+
+Запуск из корня проекта (запись с речью и её эталонная расшифровка обязательны):
+    python -m benchmarks.bench_whisper --audio clip.wav --reference clip.txt
+    python -m benchmarks.bench_whisper --audio clip.wav --reference clip.txt --models tiny,base,small --threads 2,4
+"""
+import argparse
+import os
+import re
+import time
+
+from config.settings import settings
+from src.media_processor import SAMPLE_RATE, load_audio_pcm
+
+def normalize_words(text):
+    """Нижний регистр, без пунктуации, ё -> е"""
+    text = text.lower().replace('ё', 'е')
+    return re.findall(r"\w+", text)
+
+
+def word_error_rate(reference, hypothesis):
+    """WER = расстояние Левенштейна по словам / число слов эталона"""
+    ref, hyp = normalize_words(reference), normalize_words(hypothesis)
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i] + [0] * len(hyp)
+        for j, hyp_word in enumerate(hyp, 1):
+            current[j] = min(
+                previous[j] + 1,                             # удаление
+                current[j - 1] + 1,                          # вставка
+                previous[j - 1] + (ref_word != hyp_word),    # замена
+            )
+        previous = current
+    return previous[-1] / len(ref)
+
+
+def load_model(model_size, quantize, threads):
+    """Загрузка модели на CPU в нужной конфигурации (без кэша media_processor)"""
+    import torch
+    import whisper
+    from src.media_processor import quantize_whisper_model
+
+    torch.set_num_threads(threads)
+    model = whisper.load_model(model_size, device="cpu")
+    if quantize:
+        model = quantize_whisper_model(model)
+    return model
+
+
+def bench(model, audio, repeat):
+    """Возвращает (лучшее время распознавания, текст)"""
+    options = {"fp16": False}
+    if settings.WHISPER_LANGUAGE:
+        options["language"] = settings.WHISPER_LANGUAGE
+    best, text = None, ""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = model.transcribe(audio, **options)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+        text = result["text"]
+    return best, text
+
+
+def _parse_list(value, cast=str):
+    return [cast(item.strip()) for item in value.split(',') if item.strip()]
+
+
+def main():
+    import torch
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--audio", required=True, help="Аудио или видео файл с речью")
+    parser.add_argument("--reference", required=True, help="Эталонная расшифровка (текстовый файл UTF-8)")
+    parser.add_argument("--models", default=settings.WHISPER_MODEL_SIZE, help="Размеры моделей через запятую")
+    parser.add_argument("--threads", default=str(settings.WHISPER_NUM_THREADS or torch.get_num_threads()),
+                        help="Числа потоков torch через запятую")
+    parser.add_argument("--repeat", type=int, default=1, help="Повторов на конфигурацию (берётся лучшее время)")
+    args = parser.parse_args()
+
+    for path in (args.audio, args.reference):
+        if not os.path.exists(path):
+            parser.error(f"файл не найден: {path}")
+
+    with open(args.reference, 'r', encoding='utf-8') as f:
+        reference = f.read()
+    audio = load_audio_pcm(args.audio)
+    duration = len(audio) / SAMPLE_RATE
+    print(f"Запись: {args.audio}, длительность: {duration:.1f} с, язык: {settings.WHISPER_LANGUAGE or 'auto'}")
+    print(f"{'модель':>8} {'режим':>6} {'потоки':>7} {'загрузка, с':>12} {'время, с':>9} {'RTF':>6} {'WER':>7}")
+
+    for model_size in _parse_list(args.models):
+        for quantize in (False, True):
+            for threads in _parse_list(args.threads, int):
+                start = time.perf_counter()
+                model = load_model(model_size, quantize, threads)
+                load_time = time.perf_counter() - start
+                elapsed, text = bench(model, audio, args.repeat)
+                wer = word_error_rate(reference, text)
+                print(f"{model_size:>8} {'int8' if quantize else 'fp32':>6} {threads:>7} {load_time:12.1f} "
+                      f"{elapsed:9.1f} {elapsed / duration:6.2f} {wer:7.1%}")
+                del model
+
+
+if __name__ == "__main__":
+    main()
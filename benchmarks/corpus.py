@@ -0,0 +1,53 @@
+# benchmarks/corpus.py
+"""Генерация синтетического набора документов (PDF, TXT, Markdown)"""
+import os
+import random
+
+WORDS = (
+    "документ поиск вектор модель ответ вопрос контекст данные индекс текст "
+    "retrieval augmented generation chunk embedding query answer source"
+).split()
+
+
+def _sentence(rng):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 20))).capitalize() + '.'
+
+
+def _paragraphs(rng, count):
+    return [' '.join(_sentence(rng) for _ in range(rng.randint(3, 6))) for _ in range(count)]
+
+
+def _write_pdf(path, title, paragraphs):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.platypus import SimpleDocTemplate, Paragraph
+    from src.export_handler import get_pdf_fonts
+
+    font_name, font_bold_name = get_pdf_fonts()
+    title_style = ParagraphStyle('BenchTitle', fontName=font_bold_name, fontSize=16, spaceAfter=12)
+    text_style = ParagraphStyle('BenchText', fontName=font_name, fontSize=11, spaceAfter=8)
+    story = [Paragraph(title, title_style)] + [Paragraph(p, text_style) for p in paragraphs]
+    SimpleDocTemplate(path, pagesize=A4).build(story)
+
+
+def generate_corpus(directory, files, paragraphs=20, seed=42):
+    """Создаёт files файлов (поровну PDF, TXT, MD) и возвращает их пути"""
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i in range(files):
+        kind = ("pdf", "txt", "md")[i % 3]
+        title = f"Документ {i}"
+        body = _paragraphs(rng, paragraphs)
+        path = os.path.join(directory, f"doc_{i:05d}.{kind}")
+        if kind == "pdf":
+            _write_pdf(path, title, body)
+        elif kind == "md":
+            sections = [f"## Раздел {n}\n\n{text}\n" for n, text in enumerate(body)]
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(f"# {title}\n\n" + '\n'.join(sections))
+        else:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(title + '\n\n' + '\n\n'.join(body))
+        paths.append(path)
+    return paths
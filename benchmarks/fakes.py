@@ -0,0 +1,83 @@
+# benchmarks/fakes.py
+"""Детерминированные заменители внешних сервисов для бенчмарков"""
+import hashlib
+import time
+from typing import Any, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+def _text_seed(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class FakeEmbeddings(Embeddings):
+    """Нормированные псевдослучайные векторы: одинаковый текст - одинаковый вектор.
+
+    delay_per_text имитирует задержку сетевого API (секунд на текст).
+    """
+
+    def __init__(self, dim: int = 384, delay_per_text: float = 0.0):
+        self.dim = dim
+        self.delay_per_text = delay_per_text
+
+    def _vector(self, text: str) -> List[float]:
+        vector = np.random.default_rng(_text_seed(text)).standard_normal(self.dim).astype(np.float32)
+        vector /= np.linalg.norm(vector)
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.delay_per_text:
+            time.sleep(self.delay_per_text * len(texts))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.delay_per_text:
+            time.sleep(self.delay_per_text)
+        return self._vector(text)
+
+
+VOCABULARY = "ответ документ контекст источник модель данные вопрос поиск фрагмент текст".split()
+
+
+class FakeStreamingChatModel(BaseChatModel):
+    """Чат-модель с детерминированным ответом и управляемой скоростью выдачи токенов"""
+
+    response_words: int = 60
+    first_token_delay: float = 0.0
+    token_delay: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-streaming"
+
+    def _words(self, messages: List[BaseMessage]) -> List[str]:
+        last = messages[-1].content if messages else ""
+        rng = np.random.default_rng(_text_seed(str(last)))
+        return [VOCABULARY[i] for i in rng.integers(0, len(VOCABULARY), self.response_words)]
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        if self.first_token_delay:
+            time.sleep(self.first_token_delay)
+        for word in self._words(messages):
+            if self.token_delay:
+                time.sleep(self.token_delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        text = ''.join(chunk.text for chunk in self._stream(messages, stop, run_manager, **kwargs))
+        prompt_tokens = sum(len(str(m.content)) for m in messages) // 4
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content=text))],
+            llm_output={"model_name": self._llm_type,
+                        "token_usage": {"prompt_tokens": prompt_tokens, "completion_tokens": self.response_words}},
+        )
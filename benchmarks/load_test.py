@@ -0,0 +1,262 @@
+# benchmarks/load_test.py
+"""Нагрузочный тест Gradio-приложения: N виртуальных пользователей через реальные API-эндпоинты.
+
+Сценарий пользователя: вход -> создание сессии -> список сессий -> несколько
+вопросов в чат -> загрузка сессии. Перед стартом один раз выполняется
+регистрация пользователей, индексация тестового документа и инициализация модели.
+Отчёт: пропускная способность, p50/p95/p99 и доля ошибок по каждому эндпоинту.
+
+Против уже запущенного приложения (LLM/embeddings - любой OpenAI-совместимый сервер):
+    python -m benchmarks.load_test --url http://127.0.0.1:7860 --users 20
+С автоматическим запуском заглушки LLM и app.py (БД - из DB_* в .env или DB_BACKEND=sqlite):
+    DB_BACKEND=sqlite python -m benchmarks.load_test --spawn-app --users 20 --turns 3 --stub-latency 0.5
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from collections import defaultdict
+from datetime import datetime
+
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class EndpointStats:
+    """Задержки и ошибки по эндпоинтам (потокобезопасно)"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.error_samples = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, latency, error=None):
+        with self._lock:
+            self.latencies[endpoint].append(latency)
+            if error is not None:
+                self.errors[endpoint] += 1
+                if len(self.error_samples[endpoint]) < 3:
+                    self.error_samples[endpoint].append(str(error)[:200])
+
+    def report(self, wall_seconds):
+        result = {}
+        for endpoint, samples in sorted(self.latencies.items()):
+            values = np.asarray(samples) * 1000
+            calls = len(samples)
+            errors = self.errors[endpoint]
+            result[endpoint] = {
+                "calls": calls,
+                "errors": errors,
+                "error_rate": errors / calls if calls else 0.0,
+                "throughput_rps": (calls - errors) / wall_seconds if wall_seconds else 0.0,
+                "p50_ms": float(np.percentile(values, 50)),
+                "p95_ms": float(np.percentile(values, 95)),
+                "p99_ms": float(np.percentile(values, 99)),
+                "max_ms": float(values.max()),
+                "error_samples": self.error_samples[endpoint],
+            }
+        return result
+
+
+def _status_error(text):
+    """Эндпоинты приложения сообщают об ошибках строкой, начинающейся с ❌"""
+    if isinstance(text, str) and text.startswith("❌"):
+        return text
+    return None
+
+
+# Проверка результата по эндпоинту: возвращает текст ошибки или None
+CHECKS = {
+    "/register": lambda r: None,  # повторная регистрация существующего пользователя - не ошибка
+    "/login": lambda r: _status_error(r[2]),
+    "/create_session": lambda r: _status_error(r[0]),
+    "/list_sessions": lambda r: None if r else "пустой список сессий",
+    "/chat": lambda r: _status_error(r[2]),
+    "/load_session": lambda r: _status_error(r[1]),
+    "/initialize_chat": lambda r: _status_error(r[1]),
+}
+
+
+def call(client, stats, endpoint, *args):
+    """Вызов эндпоинта с замером; исключения и ❌-статусы считаются ошибками"""
+    start = time.perf_counter()
+    try:
+        result = client.predict(*args, api_name=endpoint)
+    except Exception as e:
+        stats.record(endpoint, time.perf_counter() - start, error=e)
+        return None
+    error = CHECKS.get(endpoint, lambda r: None)(result)
+    stats.record(endpoint, time.perf_counter() - start, error=error)
+    return result if error is None else None
+
+
+def _upload(path):
+    try:
+        from gradio_client import handle_file
+        return handle_file(path)
+    except ImportError:
+        return path
+
+
+def setup(url, stats, users, password, model, docs):
+    """Регистрация пользователей, индексация документов и инициализация модели"""
+    from gradio_client import Client
+
+    client = Client(url, verbose=False)
+    for i in range(users):
+        call(client, stats, "/register", f"loadtest_user_{i}", password)
+    call(client, stats, "/login", "loadtest_user_0", password)
+    if docs:
+        status = call(client, stats, "/submit_ingestion", [_upload(path) for path in docs])
+        print(f"Индексация: {status}")
+        match = re.search(r"#(\d+)", status or "")
+        job_id = int(match.group(1)) if match else None
+        deadline = time.time() + 600
+        while job_id is not None and time.time() < deadline:
+            job = client.predict(job_id, api_name="/ingestion_status")
+            if isinstance(job, dict) and job.get("status") in ("completed", "failed", "cancelled"):
+                print(f"Задача индексации {job_id}: {job.get('status')} {job.get('message') or ''}")
+                break
+            time.sleep(1)
+    result = call(client, stats, "/initialize_chat", model)
+    if result is None:
+        raise RuntimeError("Не удалось инициализировать чат-бота (нет проиндексированных документов?)")
+
+
+def virtual_user(url, stats, index, password, turns, iterations, stop_event):
+    from gradio_client import Client
+
+    client = Client(url, verbose=False)
+    # Пароль проверяется один раз: токен остаётся в состоянии сессии клиента
+    if call(client, stats, "/login", f"loadtest_user_{index}", password) is None:
+        return
+    for iteration in range(iterations):
+        if stop_event.is_set():
+            return
+        call(client, stats, "/create_session", f"Нагрузка {index}.{iteration}")
+        sessions = call(client, stats, "/list_sessions") or []
+        history = []
+        for turn in range(turns):
+            result = call(client, stats, "/chat", f"Вопрос {turn} пользователя {index}: что в документах?", history)
+            if result is not None:
+                history = result[1]
+        if sessions:
+            call(client, stats, "/load_session", sessions[0]["id"])
+
+
+def _wait_http(url, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=2):
+                return True
+        except OSError:
+            time.sleep(1)
+    return False
+
+
+def spawn_app(port, stub_latency):
+    """Запуск заглушки OpenAI API (в процессе) и app.py (подпроцесс), направленного на неё"""
+    from benchmarks.stub_openai_server import StubConfig, start_stub_server
+
+    server, stub_url = start_stub_server(StubConfig(default_latency=stub_latency))
+    env = dict(os.environ, OPENROUTER_BASE_URL=stub_url, OPENROUTER_API_KEY="stub-key",
+               GRADIO_SERVER_PORT=str(port), LLM_PREWARM="false")
+    process = subprocess.Popen([sys.executable, "app.py"], cwd=ROOT_DIR, env=env)
+    url = f"http://127.0.0.1:{port}"
+    if not _wait_http(url, timeout=180):
+        process.terminate()
+        raise RuntimeError("app.py не запустился за 180 с")
+    print(f"Заглушка LLM: {stub_url}, приложение: {url}")
+    return url, process, server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:7860", help="Адрес запущенного приложения")
+    parser.add_argument("--spawn-app", action="store_true", help="Запустить заглушку LLM и app.py")
+    parser.add_argument("--port", type=int, default=7861, help="Порт app.py при --spawn-app")
+    parser.add_argument("--stub-latency", type=float, default=0.2, help="Задержка заглушки LLM, с")
+    parser.add_argument("--users", type=int, default=10, help="Виртуальных пользователей")
+    parser.add_argument("--turns", type=int, default=3, help="Вопросов в одной сессии")
+    parser.add_argument("--iterations", type=int, default=2, help="Повторов сценария на пользователя")
+    parser.add_argument("--ramp-up", type=float, default=5.0, help="Время, за которое стартуют все пользователи, с")
+    parser.add_argument("--model", default="Claude Sonnet 4", help="Модель (ключ AVAILABLE_MODELS)")
+    parser.add_argument("--docs", nargs="*", help="Документы для индексации (по умолчанию - сгенерированные)")
+    parser.add_argument("--no-ingest", action="store_true", help="Не индексировать документы (индекс уже есть)")
+    parser.add_argument("--password", default="loadtest-password")
+    parser.add_argument("--output", help="JSON с результатами")
+    args = parser.parse_args()
+
+    process = server = None
+    url = args.url
+    tmp_dir = tempfile.TemporaryDirectory()
+    try:
+        if args.spawn_app:
+            url, process, server = spawn_app(args.port, args.stub_latency)
+
+        docs = [] if args.no_ingest else args.docs
+        if docs is None:
+            from benchmarks.corpus import generate_corpus
+            docs = [p for p in generate_corpus(tmp_dir.name, 6, paragraphs=20) if not p.endswith(".pdf")]
+
+        setup_stats = EndpointStats()
+        setup(url, setup_stats, args.users, args.password, args.model, docs)
+
+        stats = EndpointStats()
+        stop_event = threading.Event()
+        threads = []
+        started = time.perf_counter()
+        for i in range(args.users):
+            thread = threading.Thread(
+                target=virtual_user, name=f"vu-{i}",
+                args=(url, stats, i, args.password, args.turns, args.iterations, stop_event),
+            )
+            thread.start()
+            threads.append(thread)
+            if args.users > 1:
+                time.sleep(args.ramp_up / args.users)
+        try:
+            for thread in threads:
+                thread.join()
+        except KeyboardInterrupt:
+            stop_event.set()
+            for thread in threads:
+                thread.join()
+        wall_seconds = time.perf_counter() - started
+
+        report = {
+            "timestamp": datetime.now().isoformat(),
+            "url": url,
+            "params": vars(args),
+            "wall_seconds": wall_seconds,
+            "endpoints": stats.report(wall_seconds),
+        }
+        print(f"\nПользователей: {args.users}, время: {wall_seconds:.1f} с")
+        print(f"{'эндпоинт':<16} {'вызовов':>8} {'ошибок':>7} {'RPS':>7} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9}")
+        for endpoint, row in report["endpoints"].items():
+            print(f"{endpoint:<16} {row['calls']:>8} {row['error_rate']:>7.1%} {row['throughput_rps']:>7.2f} "
+                  f"{row['p50_ms']:>9.0f} {row['p95_ms']:>9.0f} {row['p99_ms']:>9.0f}")
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            print(f"Результаты: {args.output}")
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+        if server is not None:
+            server.shutdown()
+        tmp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+# benchmarks/stub_openai_server.py
+"""Локальный OpenAI-совместимый сервер-заглушка для тестов и нагрузочных прогонов.
+
+Отвечает на POST /v1/chat/completions (обычный и stream=true режимы),
+POST /v1/embeddings и GET /v1/models. Задержка и доля ошибок задаются
+для каждой модели, так что можно воспроизводить «хвосты» задержек и сбои.
+
+Запуск из корня проекта:
+    python -m benchmarks.stub_openai_server --port 8911 \\
+        --latency openai/gpt-4.1=0.5 --latency anthropic/claude-sonnet-4=0.2:0.1:20 \\
+        --fail qwen/qwen3-30b-a3b=0.5 --dump-dir /tmp/stub_requests
+Приложение направляется на заглушку переменной окружения:
+    OPENROUTER_BASE_URL=http://127.0.0.1:8911/v1
+Формат --latency: модель=базовая_задержка[:доля_медленных:медленная_задержка] (секунды).
+
+Кэш префикса имитируется по маркерам cache_control: префикс до маркера
+запоминается, и в последующих запросах совпавшая часть возвращается в
+usage.prompt_tokens_details.cached_tokens (как у OpenRouter).
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EMBEDDING_DIM = 1536
+
+
+class StubConfig:
+    """Параметры поведения заглушки"""
+
+    def __init__(self, latency=None, fail=None, default_latency=0.05, dump_dir=None,
+                 reply_words=40, chunk_words=4, seed=None):
+        self.latency = latency or {}  # {модель: (базовая, доля_медленных, медленная)}
+        self.fail = fail or {}  # {модель: доля ошибок}
+        self.default_latency = default_latency
+        self.dump_dir = dump_dir
+        self.reply_words = reply_words
+        self.chunk_words = chunk_words
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.prefix_cache = set()  # (модель, хэш префикса) - записанные префиксы
+        self._lock = threading.Lock()
+
+    def delay_for(self, model):
+        base, slow_share, slow_delay = self.latency.get(model, (self.default_latency, 0.0, 0.0))
+        with self._lock:
+            slow = self.rng.random() < slow_share
+        return slow_delay if slow else base
+
+    def should_fail(self, model):
+        with self._lock:
+            return self.rng.random() < self.fail.get(model, 0.0)
+
+    def cached_prefix_tokens(self, model, messages):
+        """Имитация кэша префикса: число токенов совпавшего префикса.
+
+        Проверяются все границы блоков до последнего маркера cache_control
+        (как у Anthropic); префиксы до маркеров записываются в кэш.
+        """
+        boundaries = []  # (хэш префикса, токенов, есть маркер)
+        digest = hashlib.sha256()
+        size = 0
+        for message in messages:
+            content = message.get("content", "")
+            parts = content if isinstance(content, list) else [{"type": "text", "text": content}]
+            for part in parts:
+                text = json.dumps([message.get("role"), part.get("text", "") if isinstance(part, dict) else part],
+                                  ensure_ascii=False)
+                digest.update(text.encode('utf-8'))
+                size += len(text)
+                marked = isinstance(part, dict) and "cache_control" in part
+                boundaries.append((digest.hexdigest(), size // 4, marked))
+        marked_positions = [i for i, (_, _, marked) in enumerate(boundaries) if marked]
+        if not marked_positions:
+            return 0
+        cached = 0
+        with self._lock:
+            for prefix_hash, tokens, _ in boundaries[:marked_positions[-1] + 1]:
+                if (model, prefix_hash) in self.prefix_cache:
+                    cached = tokens
+            for i in marked_positions:
+                self.prefix_cache.add((model, boundaries[i][0]))
+        return cached
+
+    def dump(self, path, payload):
+        """Сохранение тела запроса (например, для проверки промптов)"""
+        with self._lock:
+            self.requests += 1
+            number = self.requests
+        if not self.dump_dir:
+            return
+        os.makedirs(self.dump_dir, exist_ok=True)
+        name = f"{number:06d}_{path.strip('/').replace('/', '_')}.json"
+        with open(os.path.join(self.dump_dir, name), 'w', encoding='utf-8') as f:
+            json.dump(payload, f, ensure_ascii=False, indent=2)
+
+
+def _reply_text(model, messages, words):
+    """Детерминированный ответ, зависящий от последнего сообщения"""
+    last = messages[-1].get("content", "") if messages else ""
+    if isinstance(last, list):
+        last = ' '.join(part.get("text", "") for part in last if isinstance(part, dict))
+    seed = int(hashlib.sha256(f"{model}|{last}".encode('utf-8')).hexdigest()[:8], 16)
+    rng = random.Random(seed)
+    vocabulary = "ответ документ контекст источник модель данные вопрос поиск фрагмент текст".split()
+    return f"[{model}] " + ' '.join(rng.choice(vocabulary) for _ in range(words))
+
+
+def _usage(messages, text, cached_tokens=0):
+    prompt_tokens = sum(len(json.dumps(m, ensure_ascii=False)) for m in messages) // 4
+    completion_tokens = len(text) // 4
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": min(cached_tokens, prompt_tokens)}}
+
+
+def _embedding(text):
+    """Псевдослучайный нормированный вектор, одинаковый для одинакового текста"""
+    rng = random.Random(hashlib.sha256(text.encode('utf-8')).digest())
+    vector = [rng.gauss(0, 1) for _ in range(EMBEDDING_DIM)]
+    norm = sum(v * v for v in vector) ** 0.5
+    return [v / norm for v in vector]
+
+
+def make_handler(config):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.rstrip('/').endswith("/models"):
+                models = sorted(set(config.latency) | set(config.fail)) or ["stub-model"]
+                self._send_json(200, {"object": "list", "data": [{"id": m, "object": "model"} for m in models]})
+            else:
+                self._send_json(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            config.dump(self.path, payload)
+            if self.path.endswith("/chat/completions"):
+                self._chat(payload)
+            elif self.path.endswith("/embeddings"):
+                inputs = payload.get("input", [])
+                if isinstance(inputs, str):
+                    inputs = [inputs]
+                data = [{"object": "embedding", "index": i, "embedding": _embedding(str(text))}
+                        for i, text in enumerate(inputs)]
+                self._send_json(200, {"object": "list", "data": data, "model": payload.get("model"),
+                                      "usage": {"prompt_tokens": 0, "total_tokens": 0}})
+            else:
+                self._send_json(404, {"error": {"message": "not found"}})
+
+        def _chat(self, payload):
+            model = payload.get("model", "stub-model")
+            messages = payload.get("messages", [])
+            time.sleep(config.delay_for(model))
+            if config.should_fail(model):
+                self._send_json(503, {"error": {"message": f"stub failure for {model}", "type": "server_error"}})
+                return
+            text = _reply_text(model, messages, config.reply_words)
+            cached_tokens = config.cached_prefix_tokens(model, messages)
+            completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+            created = int(time.time())
+            if not payload.get("stream"):
+                self._send_json(200, {
+                    "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                    "usage": _usage(messages, text, cached_tokens),
+                })
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            words = text.split(' ')
+            pieces = [' '.join(words[i:i + config.chunk_words]) + ' ' for i in range(0, len(words), config.chunk_words)]
+            for piece in pieces:
+                self._send_event({"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                                  "model": model, "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]})
+            final = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+            if (payload.get("stream_options") or {}).get("include_usage"):
+                final["usage"] = _usage(messages, text, cached_tokens)
+            self._send_event(final)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+            self.close_connection = True
+
+        def _send_event(self, payload):
+            self.wfile.write(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+
+    return StubHandler
+
+
+def start_stub_server(config, host="127.0.0.1", port=0):
+    """Запуск заглушки в фоновом потоке; возвращает (сервер, базовый URL)"""
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="stub-openai", daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def _parse_latency(values):
+    latency = {}
+    for value in values:
+        model, spec = value.rsplit('=', 1)
+        parts = [float(p) for p in spec.split(':')]
+        base = parts[0]
+        slow_share = parts[1] if len(parts) > 1 else 0.0
+        slow_delay = parts[2] if len(parts) > 2 else base
+        latency[model] = (base, slow_share, slow_delay)
+    return latency
+
+
+def _parse_fail(values):
+    return {model: float(rate) for model, rate in (value.rsplit('=', 1) for value in values)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8911)
+    parser.add_argument("--latency", action="append", default=[], help="модель=задержка[:доля_медленных:медленная]")
+    parser.add_argument("--fail", action="append", default=[], help="модель=доля_ошибок")
+    parser.add_argument("--default-latency", type=float, default=0.05, help="Задержка для остальных моделей, с")
+    parser.add_argument("--reply-words", type=int, default=40, help="Слов в ответе")
+    parser.add_argument("--dump-dir", help="Папка для сохранения тел запросов")
+    parser.add_argument("--seed", type=int, help="Seed генератора задержек/ошибок")
+    args = parser.parse_args()
+
+    config = StubConfig(
+        latency=_parse_latency(args.latency), fail=_parse_fail(args.fail),
+        default_latency=args.default_latency, dump_dir=args.dump_dir,
+        reply_words=args.reply_words, seed=args.seed,
+    )
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(config))
+    print(f"Заглушка OpenAI API: http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
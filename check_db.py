@@ -3,11 +3,14 @@ import os
 import sys
 import logging
 from src.database import db_manager
+from src.message_retention import list_partitions
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+RECENT_MESSAGES_LIMIT = 20
+
 def check_database():
     """Проверка содержимого базы данных"""
     try:
@@ -56,7 +59,7 @@ def check_database():
                 else:
                     print("   Нет сессий")
         
-        print("\n3. Сообщения:")
+        print(f"\n3. Последние {RECENT_MESSAGES_LIMIT} сообщений:")
         with db_manager.get_connection() as conn:
             with conn.cursor() as cursor:
                 conn.set_client_encoding('UTF8')
@@ -65,8 +68,9 @@ def check_database():
                     SELECT cm.id, cm.role, LENGTH(cm.content) as content_length, cm.created_at, cs.session_name
                     FROM chat_messages cm
                     JOIN chat_sessions cs ON cm.session_id = cs.id
-                    ORDER BY cm.created_at
-                """)
+                    ORDER BY cm.created_at DESC
+                    LIMIT %s
+                """, (RECENT_MESSAGES_LIMIT,))
                 messages = cursor.fetchall()
                 if messages:
                     for msg in messages:
@@ -91,12 +95,23 @@ def check_database():
                 cursor.execute("SELECT COUNT(*) FROM chat_sessions")
                 sessions_count = cursor.fetchone()[0]
                 
-                cursor.execute("SELECT COUNT(*) FROM chat_messages")
-                messages_count = cursor.fetchone()[0]
-                
                 print(f"Пользователей: {users_count}")
                 print(f"Сессий: {sessions_count}")
-                print(f"Сообщений: {messages_count}")
+
+        # Сообщений много: в PostgreSQL - оценка по статистике секций вместо COUNT(*) по всей таблице
+        partitions = list_partitions()
+        if partitions:
+            attached = [p for p in partitions if p["attached"]]
+            print(f"Сообщений (оценка): ~{sum(p['estimated_rows'] for p in attached)} в {len(attached)} секциях")
+            for partition in partitions:
+                state = "" if partition["attached"] else ", отсоединена"
+                print(f"   {partition['name']}: ~{partition['estimated_rows']} строк, "
+                      f"{partition['size_bytes'] / 1024 / 1024:.1f} МБ{state}")
+        else:
+            with db_manager.get_connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT COUNT(*) FROM chat_messages")
+                    print(f"Сообщений: {cursor.fetchone()[0]}")
                 
     except Exception as e:
         print(f"❌ Ошибка проверки базы данных: {e}")
@@ -8,6 +8,7 @@ load_dotenv()
 class Settings:
     # API ключ OpenRouter (обязательный параметр)
     OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
+    OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
     
     # Доступные модели LLM
     AVAILABLE_MODELS = {
@@ -25,8 +26,128 @@ class Settings:
     CHUNK_SIZE = 1000
     CHUNK_OVERLAP = 200
     VECTOR_STORE_PATH = "data/vectorstore/faiss_index"
+    # index.faiss открывается через mmap только для чтения: процессы делят одну копию векторов
+    VECTOR_STORE_MMAP = os.getenv("VECTOR_STORE_MMAP", "true").lower() == "true"
+    # Каждое сохранение индекса - новая версия; хранятся VECTOR_STORE_KEEP_VERSIONS последних,
+    # работающие процессы проверяют смену версии раз в VECTOR_STORE_POLL_SECONDS секунд
+    VECTOR_STORE_KEEP_VERSIONS = int(os.getenv("VECTOR_STORE_KEEP_VERSIONS", "3"))
+    VECTOR_STORE_POLL_SECONDS = float(os.getenv("VECTOR_STORE_POLL_SECONDS", "5"))
     LLM_TEMPERATURE = 0.7
     LLM_MAX_TOKENS = 2000
+
+    # Поиск контекста: число фрагментов и MMR-диверсификация (отбор из RETRIEVAL_FETCH_K кандидатов)
+    RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "4"))
+    RETRIEVAL_MMR = os.getenv("RETRIEVAL_MMR", "false").lower() == "true"
+    RETRIEVAL_FETCH_K = int(os.getenv("RETRIEVAL_FETCH_K", "20"))
+    RETRIEVAL_MMR_LAMBDA = float(os.getenv("RETRIEVAL_MMR_LAMBDA", "0.5"))
+
+    # Сжатие контекста: склейка соседних чанков, удаление почти-дубликатов и
+    # ограничение контекста CONTEXT_MAX_TOKENS токенами (кодировка tiktoken)
+    CONTEXT_COMPRESSION_ENABLED = os.getenv("CONTEXT_COMPRESSION_ENABLED", "true").lower() == "true"
+    CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "1500"))
+    CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8"))
+    CONTEXT_TOKEN_ENCODING = os.getenv("CONTEXT_TOKEN_ENCODING", "cl100k_base")
+
+    # Кэширование префикса промпта у провайдера: маркеры cache_control ставятся
+    # для моделей с этими префиксами (остальные кэшируют префикс автоматически)
+    PROMPT_CACHE_ENABLED = os.getenv("PROMPT_CACHE_ENABLED", "true").lower() == "true"
+    PROMPT_CACHE_MODEL_PREFIXES = [p.strip() for p in os.getenv(
+        "PROMPT_CACHE_MODEL_PREFIXES", "anthropic/,google/gemini").split(",") if p.strip()]
+
+    # Общий пул HTTP-соединений клиентов LLM (keep-alive, таймауты в секундах)
+    LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "50"))
+    LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "120"))
+    LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))
+    LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "120"))
+    # Создание клиентов всех моделей и установка соединения при запуске
+    LLM_PREWARM = os.getenv("LLM_PREWARM", "true").lower() == "true"
+
+    # Маршрутизация между моделями: хеджированный запрос к резервной модели, если
+    # ответа нет LLM_HEDGE_DELAY секунд; модели с ошибками или p95 выше
+    # LLM_ROUTER_SLOW_P95 выводятся из ротации на LLM_ROUTER_COOLDOWN секунд
+    LLM_ROUTER_ENABLED = os.getenv("LLM_ROUTER_ENABLED", "false").lower() == "true"
+    LLM_FALLBACK_MODELS = [m.strip() for m in os.getenv("LLM_FALLBACK_MODELS", "").split(",") if m.strip()]
+    LLM_HEDGE_DELAY = float(os.getenv("LLM_HEDGE_DELAY", "5"))
+    LLM_MAX_HEDGES = int(os.getenv("LLM_MAX_HEDGES", "1"))
+    LLM_ROUTER_WINDOW = int(os.getenv("LLM_ROUTER_WINDOW", "50"))
+    LLM_ROUTER_MAX_FAILURES = int(os.getenv("LLM_ROUTER_MAX_FAILURES", "3"))
+    LLM_ROUTER_COOLDOWN = float(os.getenv("LLM_ROUTER_COOLDOWN", "60"))
+    LLM_ROUTER_SLOW_P95 = float(os.getenv("LLM_ROUTER_SLOW_P95", "30"))
+    LLM_ROUTER_MAX_WORKERS = int(os.getenv("LLM_ROUTER_MAX_WORKERS", "16"))
+
+    # Объединение одинаковых одновременных запросов к LLM в один вызов
+    LLM_COALESCE_ENABLED = os.getenv("LLM_COALESCE_ENABLED", "true").lower() == "true"
+
+    # Потоковая индексация: размер пакета чанков и глубина очередей между стадиями
+    INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))
+    INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "4"))
+    # Число одновременно выполняемых фоновых задач индексации
+    INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "1"))
+    # Копии загруженных файлов на время задачи (временные файлы Gradio не переживают перезапуск)
+    INGEST_UPLOAD_DIR = os.getenv("INGEST_UPLOAD_DIR", "data/uploads")
+    # Промежуточные версии индекса во время задачи: новые чанки публикуются каждые
+    # INGEST_PUBLISH_SECONDS секунд и/или INGEST_PUBLISH_BATCHES пакетов (0 - условие выключено)
+    INGEST_PUBLISH_SECONDS = float(os.getenv("INGEST_PUBLISH_SECONDS", "30"))
+    INGEST_PUBLISH_BATCHES = int(os.getenv("INGEST_PUBLISH_BATCHES", "0"))
+
+    # Кэш распарсенных документов и чанков (ключ - хэш содержимого файла)
+    DOCUMENT_CACHE_ENABLED = os.getenv("DOCUMENT_CACHE_ENABLED", "true").lower() == "true"
+    DOCUMENT_CACHE_DIR = os.getenv("DOCUMENT_CACHE_DIR", "data/cache/documents")
+    DOCUMENT_CACHE_MAX_MB = int(os.getenv("DOCUMENT_CACHE_MAX_MB", "1024"))
+
+    # Исполняемый файл ffmpeg (декодирование аудио/видео для Whisper)
+    FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "ffmpeg")
+
+    # Whisper: размер модели (tiny, base, small, medium, large) и язык (пусто - автоопределение)
+    WHISPER_MODEL_SIZE = os.getenv("WHISPER_MODEL_SIZE", "base")
+    WHISPER_LANGUAGE = os.getenv("WHISPER_LANGUAGE") or None
+    # CPU-режим: динамическая int8-квантизация и число потоков torch (0 - по умолчанию)
+    WHISPER_CPU_QUANTIZE = os.getenv("WHISPER_CPU_QUANTIZE", "false").lower() == "true"
+    WHISPER_NUM_THREADS = int(os.getenv("WHISPER_NUM_THREADS", "0"))
+
+    # Длинные записи (от LONG_MEDIA_MIN_SECONDS) режутся по паузам на сегменты до
+    # LONG_MEDIA_SEGMENT_SECONDS и транскрибируются параллельно в TRANSCRIBE_WORKERS
+    # процессах (0 - половина ядер CPU)
+    LONG_MEDIA_MIN_SECONDS = int(os.getenv("LONG_MEDIA_MIN_SECONDS", "600"))
+    LONG_MEDIA_SEGMENT_SECONDS = int(os.getenv("LONG_MEDIA_SEGMENT_SECONDS", "120"))
+    LONG_MEDIA_MIN_SILENCE_MS = int(os.getenv("LONG_MEDIA_MIN_SILENCE_MS", "300"))
+    TRANSCRIBE_WORKERS = int(os.getenv("TRANSCRIBE_WORKERS", "0"))
+
+    # Кэш транскриптов (ключ - хэш медиа файла, модель Whisper и язык)
+    TRANSCRIPT_CACHE_ENABLED = os.getenv("TRANSCRIPT_CACHE_ENABLED", "true").lower() == "true"
+    TRANSCRIPT_CACHE_DIR = os.getenv("TRANSCRIPT_CACHE_DIR", "data/cache/transcripts")
+    TRANSCRIPT_CACHE_MAX_MB = int(os.getenv("TRANSCRIPT_CACHE_MAX_MB", "256"))
+
+    # Экспорт истории из БД: строк за один запрос к серверному курсору
+    EXPORT_FETCH_SIZE = int(os.getenv("EXPORT_FETCH_SIZE", "500"))
+
+    # Экспорт чата в PDF: сколько документов собирается одновременно
+    PDF_EXPORT_WORKERS = int(os.getenv("PDF_EXPORT_WORKERS", "4"))
+
+    # Хранение сообщений: секции chat_messages старше MESSAGE_RETENTION_MONTHS месяцев
+    # (0 - хранить всё) отсоединяются, архивируются в gzip JSONL и удаляются;
+    # секции создаются на MESSAGE_PARTITIONS_AHEAD месяцев вперёд
+    MESSAGE_RETENTION_MONTHS = int(os.getenv("MESSAGE_RETENTION_MONTHS", "0"))
+    MESSAGE_ARCHIVE_DIR = os.getenv("MESSAGE_ARCHIVE_DIR", "data/archive/chat_messages")
+    MESSAGE_PARTITIONS_AHEAD = int(os.getenv("MESSAGE_PARTITIONS_AHEAD", "3"))
+    MESSAGE_RETENTION_INTERVAL_HOURS = float(os.getenv("MESSAGE_RETENTION_INTERVAL_HOURS", "24"))
+
+    # Процессы-исполнители ходов чата (0 - в процессе Gradio); запуск - python serve.py.
+    # Процессы в основном ждут LLM, поэтому их может быть больше, чем ядер
+    CHAT_WORKERS = int(os.getenv("CHAT_WORKERS", "0"))
+
+    # Пароли: стоимость bcrypt (хэши с другой стоимостью пересчитываются при входе);
+    # после входа пользователь работает по токену, действующему AUTH_SESSION_TTL_HOURS часов
+    BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+    AUTH_SESSION_TTL_HOURS = float(os.getenv("AUTH_SESSION_TTL_HOURS", "168"))
+
+    # Метрики Prometheus на /metrics рядом с Gradio (порт сервера - GRADIO_SERVER_PORT)
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    SERVER_PORT = int(os.getenv("GRADIO_SERVER_PORT", "7860"))
+
+    # HTML/Markdown через Unstructured (медленнее, но точнее); по умолчанию - встроенные лоадеры
+    HIGH_FIDELITY_LOADERS = os.getenv("HIGH_FIDELITY_LOADERS", "false").lower() == "true"
     
     def validate(self):
         """Проверка обязательных настроек"""
@@ -0,0 +1,76 @@
+# manage_index.py
+"""Версии векторного хранилища (VECTOR_STORE_PATH).
+
+    python manage_index.py list                       # версии, отмечена действующая
+    python manage_index.py rollback                   # вернуться на предыдущую версию
+    python manage_index.py rollback --version 20250101-120000-000000
+    python manage_index.py prune --keep 2             # удалить старые версии
+
+Переключение атомарно (файл CURRENT); запущенное приложение подхватывает
+версию само в течение VECTOR_STORE_POLL_SECONDS секунд.
+"""
+import argparse
+import logging
+import os
+
+from src.vector_store import (VERSIONS_DIR, current_version, list_versions, prune_versions,
+                              set_current_version)
+from config.settings import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def _dir_size(path):
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+
+def print_versions(path):
+    versions = list_versions(path)
+    if not versions:
+        legacy = os.path.exists(os.path.join(path, "index.faiss"))
+        print("Версий нет" + (" (индекс в прежнем формате, версия появится при следующей индексации)" if legacy else ""))
+        return
+    current = current_version(path)
+    for version in versions:
+        size = _dir_size(os.path.join(path, VERSIONS_DIR, version)) / 1024 / 1024
+        print(f"{'*' if version == current else ' '} {version}  {size:.1f} МБ")
+
+
+def previous_version(path):
+    """Версия, предшествующая действующей"""
+    versions = list_versions(path)
+    current = current_version(path)
+    if current not in versions or versions.index(current) == 0:
+        raise RuntimeError("Нет версии старше действующей")
+    return versions[versions.index(current) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", default=settings.VECTOR_STORE_PATH, help="Каталог хранилища")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="Список версий")
+    rollback_parser = subparsers.add_parser("rollback", help="Сделать действующей другую версию")
+    rollback_parser.add_argument("--version", help="Имя версии (по умолчанию - предыдущая)")
+    prune_parser = subparsers.add_parser("prune", help="Удалить старые версии")
+    prune_parser.add_argument("--keep", type=int, default=settings.VECTOR_STORE_KEEP_VERSIONS)
+    args = parser.parse_args()
+
+    try:
+        if args.command == "list":
+            print_versions(args.path)
+        elif args.command == "rollback":
+            version = args.version or previous_version(args.path)
+            set_current_version(version, args.path)
+            print(f"✅ Действующая версия: {version}")
+        elif args.command == "prune":
+            removed = prune_versions(args.path, args.keep)
+            print(f"✅ Удалено версий: {len(removed)}")
+    except Exception as e:
+        print(f"❌ Ошибка: {e}")
+        logger.error(f"Ошибка управления версиями индекса: {e}", exc_info=True)
+
+
+if __name__ == "__main__":
+    main()
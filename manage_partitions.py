@@ -0,0 +1,115 @@
+# manage_partitions.py
+"""Обслуживание секционированной таблицы chat_messages (PostgreSQL).
+
+    python manage_partitions.py list                  # секции и оценка числа строк
+    python manage_partitions.py ensure --ahead 3      # создать секции на 3 месяца вперёд
+    python manage_partitions.py migrate               # перевести существующую таблицу на секции
+    python manage_partitions.py retention --keep-months 12 --archive-dir data/archive/chat_messages
+
+migrate выполняется одной транзакцией при остановленном приложении: старая
+таблица переименовывается, создаётся секционированная (migrations/init.sql),
+строки переносятся в месячные секции, последовательность id продолжается.
+"""
+import argparse
+import logging
+import os
+
+from src.database import db_manager
+from src.db_backends import MIGRATIONS_DIR
+from src.message_retention import ensure_partitions, is_partitioned, list_partitions, run_retention
+from config.settings import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+LEGACY_TABLE = "chat_messages_legacy"
+
+
+def migrate_to_partitioned(keep_legacy=False, months_ahead=None):
+    """Перенос несекционированной chat_messages в секционированную; возвращает число строк"""
+    if db_manager.backend.name != "postgres":
+        raise RuntimeError("Секционирование поддерживается только для PostgreSQL")
+    if is_partitioned():
+        raise RuntimeError("chat_messages уже секционирована")
+    months_ahead = settings.MESSAGE_PARTITIONS_AHEAD if months_ahead is None else months_ahead
+
+    with open(os.path.join(MIGRATIONS_DIR, db_manager.backend.schema_file), 'r', encoding='utf-8') as f:
+        schema_script = f.read()
+
+    with db_manager.get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("LOCK TABLE chat_messages IN ACCESS EXCLUSIVE MODE")
+            cursor.execute(f"ALTER TABLE chat_messages RENAME TO {LEGACY_TABLE}")
+            # Имена индексов уникальны в схеме: освобождаем их для новой таблицы
+            cursor.execute("SELECT indexname FROM pg_indexes WHERE tablename = %s AND schemaname = current_schema()",
+                           (LEGACY_TABLE,))
+            for (index_name,) in cursor.fetchall():
+                cursor.execute(f'ALTER INDEX "{index_name}" RENAME TO "{index_name[:55]}_legacy"')
+
+            db_manager.backend.execute_script(conn, schema_script)
+            cursor.execute(
+                f"SELECT ensure_chat_messages_partitions(COALESCE(MIN(created_at)::date, CURRENT_DATE), %s) "
+                f"FROM {LEGACY_TABLE}",
+                (months_ahead,)
+            )
+            logger.info(f"Создано секций: {cursor.fetchone()[0]}")
+            cursor.execute(
+                "INSERT INTO chat_messages (id, session_id, role, content, created_at) "
+                f"SELECT id, session_id, role, content, COALESCE(created_at, CURRENT_TIMESTAMP) FROM {LEGACY_TABLE}"
+            )
+            moved = cursor.rowcount
+            cursor.execute(
+                "SELECT setval(pg_get_serial_sequence('chat_messages', 'id'), "
+                "COALESCE(MAX(id), 1), MAX(id) IS NOT NULL) FROM chat_messages"
+            )
+            if not keep_legacy:
+                cursor.execute(f"DROP TABLE {LEGACY_TABLE}")
+        conn.commit()
+    return moved
+
+
+def print_partitions():
+    partitions = list_partitions()
+    if not partitions:
+        print("Секций нет (таблица не секционирована или бэкенд не PostgreSQL)")
+        return
+    for partition in partitions:
+        state = "" if partition["attached"] else " (отсоединена, ожидает архивации)"
+        print(f"   {partition['name']}: ~{partition['estimated_rows']} строк, "
+              f"{partition['size_bytes'] / 1024 / 1024:.1f} МБ{state}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="Список секций")
+    ensure_parser = subparsers.add_parser("ensure", help="Создать недостающие секции")
+    ensure_parser.add_argument("--ahead", type=int, default=settings.MESSAGE_PARTITIONS_AHEAD)
+    migrate_parser = subparsers.add_parser("migrate", help="Перевести chat_messages на секции")
+    migrate_parser.add_argument("--keep-legacy", action="store_true",
+                                help=f"Не удалять старую таблицу ({LEGACY_TABLE})")
+    retention_parser = subparsers.add_parser("retention", help="Архивировать старые секции")
+    retention_parser.add_argument("--keep-months", type=int, default=settings.MESSAGE_RETENTION_MONTHS)
+    retention_parser.add_argument("--archive-dir", default=settings.MESSAGE_ARCHIVE_DIR)
+    args = parser.parse_args()
+
+    try:
+        if args.command == "list":
+            print_partitions()
+        elif args.command == "ensure":
+            print(f"✅ Создано секций: {ensure_partitions(args.ahead)}")
+        elif args.command == "migrate":
+            print(f"✅ Перенесено сообщений: {migrate_to_partitioned(args.keep_legacy)}")
+            print_partitions()
+        elif args.command == "retention":
+            if args.keep_months <= 0:
+                parser.error("Укажите --keep-months (или MESSAGE_RETENTION_MONTHS)")
+            summary = run_retention(args.keep_months, args.archive_dir)
+            print(f"✅ Заархивировано: {summary['archived'] or 'нечего архивировать'}")
+    except Exception as e:
+        print(f"❌ Ошибка: {e}")
+        logger.error(f"Ошибка обслуживания секций: {e}", exc_info=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# migrate_db.py
+"""Перенос данных между бэкендами БД (PostgreSQL <-> SQLite) с сохранением id.
+
+    python migrate_db.py --source postgres --target sqlite --sqlite-path data/rag_chatbot.db
+    python migrate_db.py --source sqlite --target postgres --replace
+
+Параметры PostgreSQL берутся из DB_* в .env. Схема в целевой базе создаётся
+автоматически; без --replace целевая база должна быть пустой.
+"""
+import argparse
+import logging
+
+from psycopg2.extras import Json, RealDictCursor
+
+from src.database import DatabaseManager
+from src.db_backends import create_backend
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Порядок важен из-за внешних ключей
+TABLES = ("users", "chat_sessions", "chat_messages", "ingestion_jobs")
+JSON_COLUMNS = {"files", "progress"}
+# Вычисляемые колонки целевая база заполняет сама
+GENERATED_COLUMNS = {"content_tsv"}
+
+
+def make_manager(name, sqlite_path=None):
+    kwargs = {"path": sqlite_path} if name == "sqlite" and sqlite_path else {}
+    return DatabaseManager(create_backend(name, **kwargs))
+
+
+def count_rows(manager, table):
+    with manager.get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM {table}")
+            return cursor.fetchone()[0]
+
+
+def copy_table(source, target, table, batch_size):
+    """Пакетное копирование таблицы; возвращает число строк"""
+    copied = 0
+    with source.get_connection() as src_conn, target.get_connection() as dst_conn:
+        with src_conn.cursor(name=f"migrate_{table}", cursor_factory=RealDictCursor) as src_cursor, \
+                dst_conn.cursor() as dst_cursor:
+            src_cursor.itersize = batch_size
+            src_cursor.execute(f"SELECT * FROM {table} ORDER BY id")
+            insert_sql = None
+            while True:
+                rows = src_cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                columns = [c for c in rows[0].keys() if c not in GENERATED_COLUMNS]
+                if insert_sql is None:
+                    insert_sql = (
+                        f"INSERT INTO {table} ({', '.join(columns)}) "
+                        f"VALUES ({', '.join(['%s'] * len(columns))})"
+                    )
+                dst_cursor.executemany(insert_sql, [
+                    tuple(Json(row[c]) if c in JSON_COLUMNS else row[c] for c in columns)
+                    for row in rows
+                ])
+                copied += len(rows)
+            target.backend.reset_sequence(dst_conn, table)
+            dst_conn.commit()
+    return copied
+
+
+def migrate(source, target, replace=False, batch_size=1000):
+    target.initialize_database()
+    non_empty = [table for table in TABLES if count_rows(target, table)]
+    if non_empty:
+        if not replace:
+            raise RuntimeError(f"Целевая база не пуста ({', '.join(non_empty)}); используйте --replace")
+        with target.get_connection() as conn:
+            with conn.cursor() as cursor:
+                for table in reversed(TABLES):
+                    cursor.execute(f"DELETE FROM {table}")
+            conn.commit()
+
+    totals = {}
+    for table in TABLES:
+        totals[table] = copy_table(source, target, table, batch_size)
+        logger.info(f"{table}: перенесено {totals[table]} строк")
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", required=True, choices=("postgres", "sqlite"))
+    parser.add_argument("--target", required=True, choices=("postgres", "sqlite"))
+    parser.add_argument("--sqlite-path", help="Файл SQLite (по умолчанию SQLITE_PATH)")
+    parser.add_argument("--replace", action="store_true", help="Очистить целевые таблицы перед переносом")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.source == args.target:
+        parser.error("Источник и цель совпадают")
+    try:
+        source = make_manager(args.source, args.sqlite_path)
+        target = make_manager(args.target, args.sqlite_path)
+        totals = migrate(source, target, args.replace, args.batch_size)
+        print(f"✅ Перенос завершён: {totals}")
+    except Exception as e:
+        print(f"❌ Ошибка переноса: {e}")
+        logger.error(f"Ошибка переноса: {e}", exc_info=True)
+
+
+if __name__ == "__main__":
+    main()
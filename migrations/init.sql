@@ -9,6 +9,14 @@ CREATE TABLE IF NOT EXISTS users (
     last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Токены входа: хранится только SHA-256 токена, сам токен знает лишь клиент
+CREATE TABLE IF NOT EXISTS auth_sessions (
+    token_hash CHAR(64) PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL
+);
+
 -- Таблица сессий диалога
 CREATE TABLE IF NOT EXISTS chat_sessions (
     id SERIAL PRIMARY KEY,
@@ -18,19 +26,96 @@ CREATE TABLE IF NOT EXISTS chat_sessions (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
--- Таблица сообщений чата
+-- Таблица сообщений чата, секционированная по месяцам created_at (секции chat_messages_ГГГГ_ММ
+-- создаёт ensure_chat_messages_partitions ниже; старые секции архивирует src/message_retention.py).
+-- Существующую несекционированную таблицу переводит python manage_partitions.py migrate
 CREATE TABLE IF NOT EXISTS chat_messages (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     session_id INTEGER REFERENCES chat_sessions(id) ON DELETE CASCADE,
     role VARCHAR(50) NOT NULL, -- 'user' или 'assistant'
     content TEXT NOT NULL,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+-- Таблица фоновых задач индексации документов
+CREATE TABLE IF NOT EXISTS ingestion_jobs (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER REFERENCES users(id) ON DELETE SET NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued', -- 'queued', 'running', 'completed', 'failed', 'cancelled'
+    stage VARCHAR(50), -- текущая стадия: 'parsing', 'transcription', 'embedding', 'indexing'
+    files JSONB NOT NULL, -- пути к загруженным файлам
+    progress JSONB NOT NULL DEFAULT '{}'::jsonb, -- счётчики по стадиям
+    message TEXT,
+    cancel_requested BOOLEAN NOT NULL DEFAULT FALSE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
 -- Индексы для улучшения производительности
 CREATE INDEX IF NOT EXISTS idx_chat_sessions_user_id ON chat_sessions(user_id);
+CREATE INDEX IF NOT EXISTS idx_auth_sessions_user_id ON auth_sessions(user_id);
+CREATE INDEX IF NOT EXISTS idx_auth_sessions_expires_at ON auth_sessions(expires_at);
 CREATE INDEX IF NOT EXISTS idx_chat_messages_session_id ON chat_messages(session_id);
 CREATE INDEX IF NOT EXISTS idx_chat_messages_created_at ON chat_messages(created_at);
+CREATE INDEX IF NOT EXISTS idx_chat_messages_session_created ON chat_messages(session_id, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_status ON ingestion_jobs(status);
+CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_user_id ON ingestion_jobs(user_id, created_at DESC);
+
+-- Полнотекстовый поиск по сообщениям: tsvector по русской и английской конфигурациям и GIN-индекс
+-- (на существующей таблице ADD COLUMN пересчитывает все строки - один раз при обновлении)
+ALTER TABLE chat_messages ADD COLUMN IF NOT EXISTS content_tsv tsvector
+    GENERATED ALWAYS AS (to_tsvector('russian', content) || to_tsvector('english', content)) STORED;
+CREATE INDEX IF NOT EXISTS idx_chat_messages_content_tsv ON chat_messages USING GIN (content_tsv);
+
+-- Месячные секции chat_messages от from_month до текущего месяца + months_ahead;
+-- строки вне существующих секций попадают в chat_messages_default и переносятся
+-- в месячную секцию при её создании
+CREATE OR REPLACE FUNCTION ensure_chat_messages_partitions(from_month DATE, months_ahead INTEGER)
+RETURNS INTEGER AS $$
+DECLARE
+    month_start DATE := date_trunc('month', from_month)::date;
+    last_month DATE := (date_trunc('month', CURRENT_DATE) + make_interval(months => months_ahead))::date;
+    month_end DATE;
+    partition_name TEXT;
+    created INTEGER := 0;
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid
+        WHERE c.relname = 'chat_messages' AND c.relnamespace = current_schema()::regnamespace
+    ) THEN
+        RETURN 0; -- таблица ещё не секционирована
+    END IF;
+    IF to_regclass('chat_messages_default') IS NULL THEN
+        CREATE TABLE chat_messages_default PARTITION OF chat_messages DEFAULT;
+    END IF;
+    WHILE month_start <= last_month LOOP
+        partition_name := 'chat_messages_' || to_char(month_start, 'YYYY_MM');
+        month_end := (month_start + INTERVAL '1 month')::date;
+        IF to_regclass(partition_name) IS NULL THEN
+            -- CREATE TABLE ... PARTITION OF не выполняется, если в секции по умолчанию есть
+            -- строки этого месяца: секция создаётся отдельной таблицей, строки переносятся
+            -- в неё из chat_messages_default, затем она присоединяется
+            EXECUTE format('CREATE TABLE %I (LIKE chat_messages INCLUDING DEFAULTS INCLUDING GENERATED)',
+                           partition_name);
+            EXECUTE format('WITH moved AS (DELETE FROM chat_messages_default '
+                           'WHERE created_at >= %L AND created_at < %L '
+                           'RETURNING id, session_id, role, content, created_at) '
+                           'INSERT INTO %I (id, session_id, role, content, created_at) SELECT * FROM moved',
+                           month_start, month_end, partition_name);
+            EXECUTE format('ALTER TABLE chat_messages ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                           partition_name, month_start, month_end);
+            created := created + 1;
+        END IF;
+        month_start := month_end;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT ensure_chat_messages_partitions(CURRENT_DATE, 3);
 
 -- Функция для обновления времени последнего изменения сессии
 CREATE OR REPLACE FUNCTION update_chat_session_timestamp()
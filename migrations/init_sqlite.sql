@@ -0,0 +1,94 @@
+-- migrations/init_sqlite.sql
+-- Схема для встроенного бэкенда SQLite (DB_BACKEND=sqlite), повторяет init.sql.
+-- Типы TIMESTAMP, JSON и BOOLEAN распознаются конвертерами src/db_backends.py.
+
+-- Таблица пользователей
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT UNIQUE NOT NULL,
+    password_hash TEXT,
+    created_at TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime')),
+    last_active TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime'))
+);
+
+-- Токены входа: хранится только SHA-256 токена, сам токен знает лишь клиент
+CREATE TABLE IF NOT EXISTS auth_sessions (
+    token_hash TEXT PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    created_at TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime')),
+    expires_at TIMESTAMP NOT NULL
+);
+
+-- Таблица сессий диалога
+CREATE TABLE IF NOT EXISTS chat_sessions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+    session_name TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime')),
+    updated_at TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime'))
+);
+
+-- Таблица сообщений чата
+CREATE TABLE IF NOT EXISTS chat_messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id INTEGER REFERENCES chat_sessions(id) ON DELETE CASCADE,
+    role TEXT NOT NULL, -- 'user' или 'assistant'
+    content TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime'))
+);
+
+-- Таблица фоновых задач индексации документов
+CREATE TABLE IF NOT EXISTS ingestion_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER REFERENCES users(id) ON DELETE SET NULL,
+    status TEXT NOT NULL DEFAULT 'queued', -- 'queued', 'running', 'completed', 'failed', 'cancelled'
+    stage TEXT, -- текущая стадия: 'parsing', 'transcription', 'embedding', 'indexing'
+    files JSON NOT NULL, -- пути к загруженным файлам
+    progress JSON NOT NULL DEFAULT '{}', -- счётчики по стадиям
+    message TEXT,
+    cancel_requested BOOLEAN NOT NULL DEFAULT FALSE,
+    created_at TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime')),
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime'))
+);
+
+-- Индексы для улучшения производительности
+CREATE INDEX IF NOT EXISTS idx_chat_sessions_user_id ON chat_sessions(user_id);
+CREATE INDEX IF NOT EXISTS idx_auth_sessions_user_id ON auth_sessions(user_id);
+CREATE INDEX IF NOT EXISTS idx_auth_sessions_expires_at ON auth_sessions(expires_at);
+CREATE INDEX IF NOT EXISTS idx_chat_messages_session_id ON chat_messages(session_id);
+CREATE INDEX IF NOT EXISTS idx_chat_messages_created_at ON chat_messages(created_at);
+CREATE INDEX IF NOT EXISTS idx_chat_messages_session_created ON chat_messages(session_id, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_status ON ingestion_jobs(status);
+CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_user_id ON ingestion_jobs(user_id, created_at DESC);
+
+-- Триггер для автоматического обновления времени сессии (если UPDATE не задал его сам)
+CREATE TRIGGER IF NOT EXISTS update_chat_sessions_updated_at
+AFTER UPDATE ON chat_sessions
+FOR EACH ROW WHEN NEW.updated_at = OLD.updated_at
+BEGIN
+    UPDATE chat_sessions SET updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime') WHERE id = NEW.id;
+END;
+
+-- Полнотекстовый поиск по сообщениям (FTS5, содержимое берётся из chat_messages)
+CREATE VIRTUAL TABLE IF NOT EXISTS chat_messages_fts USING fts5(
+    content, content='chat_messages', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+
+CREATE TRIGGER IF NOT EXISTS chat_messages_fts_insert AFTER INSERT ON chat_messages BEGIN
+    INSERT INTO chat_messages_fts(rowid, content) VALUES (NEW.id, NEW.content);
+END;
+
+CREATE TRIGGER IF NOT EXISTS chat_messages_fts_delete AFTER DELETE ON chat_messages BEGIN
+    INSERT INTO chat_messages_fts(chat_messages_fts, rowid, content) VALUES ('delete', OLD.id, OLD.content);
+END;
+
+CREATE TRIGGER IF NOT EXISTS chat_messages_fts_update AFTER UPDATE OF content ON chat_messages BEGIN
+    INSERT INTO chat_messages_fts(chat_messages_fts, rowid, content) VALUES ('delete', OLD.id, OLD.content);
+    INSERT INTO chat_messages_fts(rowid, content) VALUES (NEW.id, NEW.content);
+END;
+
+-- Индексация сообщений, сохранённых до появления FTS-таблицы
+INSERT INTO chat_messages_fts(chat_messages_fts)
+SELECT 'rebuild' WHERE (SELECT COUNT(*) FROM chat_messages_fts_docsize) <> (SELECT COUNT(*) FROM chat_messages);
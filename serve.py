@@ -0,0 +1,43 @@
+# serve.py
+"""Запуск приложения с пулом процессов-исполнителей для чата.
+
+    python serve.py --workers 8
+    python serve.py --workers 0        # чат в процессе Gradio (так запускает python app.py)
+
+Процесс Gradio принимает запросы, хранит историю и пишет в БД; поиск FAISS и
+вызовы LLM выполняются в --workers процессах. Индекс открывается в каждом
+процессе через mmap (VECTOR_STORE_MMAP), поэтому векторы лежат в памяти
+один раз. Метрики всех процессов собираются в /metrics.
+
+Процессы-исполнители (чат и транскрибация) запускаются методом spawn и
+импортируют этот модуль, а не app.py, поэтому не строят интерфейс Gradio.
+Остальные аргументы (например, --profile-startup) передаются приложению.
+"""
+import argparse
+import os
+import shutil
+import tempfile
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("CHAT_WORKERS", "0")),
+                        help="Число процессов-исполнителей чата, 0 - без пула (по умолчанию CHAT_WORKERS, иначе 0)")
+    args, _ = parser.parse_known_args()
+
+    # Настройки читаются при импорте app, поэтому окружение задаётся до него
+    os.environ["CHAT_WORKERS"] = str(max(0, args.workers))
+    # Каталог файлов метрик prometheus_client: общий для всех процессов, создаётся заново при каждом запуске
+    own_metrics_dir = not os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if own_metrics_dir:
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="rag-metrics-")
+    try:
+        import app
+        app.main()
+    finally:
+        if own_metrics_dir:
+            shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,38 +1,88 @@
 from langchain.chains import ConversationalRetrievalChain
-from langchain.chains.conversational_retrieval.prompts import CONDENSE_QUESTION_PROMPT
-from langchain.prompts import PromptTemplate
+from langchain.retrievers import ContextualCompressionRetriever
+from langchain_core.prompts import MessagesPlaceholder
 from src.llm_handler import get_llm
+from src.request_coalescing import CoalescingChatModel
+from src.context_compression import ContextCompressor
+from src.prompt_cache import CachedPrefixChatPromptTemplate, history_to_messages, supports_cache_control
+from src.vector_store import TimedRetriever
+from config.settings import settings
 import logging
 
 logger = logging.getLogger(__name__)
 
-def create_rag_chain(vectorstore, llm=None):
-    """Создание RAG цепочки с кастомным промптом"""
-    
-    # Кастомный промпт для Claude
-    custom_prompt = PromptTemplate.from_template("""
-Вы - полезный ассистент, отвечающий на вопросы по предоставленным документам.
-Используйте следующие фрагменты контекста, чтобы ответить на вопрос в конце.
-Если вы не знаете ответа, просто скажите, что не знаете. Не пытайтесь придумать ответ.
+RAG_SYSTEM_PROMPT = """Вы - полезный ассистент, отвечающий на вопросы по предоставленным документам.
+Используйте фрагменты контекста из последнего сообщения, чтобы ответить на вопрос.
+Если вы не знаете ответа, просто скажите, что не знаете. Не пытайтесь придумать ответ."""
 
-Контекст:
-{context}
+CONDENSE_QUESTION_TEMPLATE = """Учитывая разговор выше, переформулируйте следующий вопрос так, \
+чтобы он был понятен без истории. Верните только переформулированный вопрос.
 
-История разговора:
-{chat_history}
+Вопрос: {question}"""
 
-Человек: {question}
-Ассистент:""")
+def _llm_model_name(llm):
+    """Идентификатор модели (у маршрутизатора - основная модель)"""
+    return getattr(llm, "model_name", None) or getattr(llm, "primary_model", None)
+
+def create_rag_chain(vectorstore, llm=None):
+    """Создание RAG цепочки с кастомным промптом"""
     
     if llm is None:
         llm = get_llm()
     
+    # Стабильный префикс (инструкции, затем прежние ходы сообщениями) общий для
+    # перефразирования и ответа: провайдер кэширует его, меняется только хвост
+    cache_control = supports_cache_control(_llm_model_name(llm))
+    answer_prompt = CachedPrefixChatPromptTemplate(
+        messages=[
+            ("system", RAG_SYSTEM_PROMPT),
+            MessagesPlaceholder("chat_history"),
+            ("human", "Контекст:\n{context}\n\nВопрос: {question}"),
+        ],
+        cache_control=cache_control,
+    )
+    condense_prompt = CachedPrefixChatPromptTemplate(
+        messages=[
+            ("system", RAG_SYSTEM_PROMPT),
+            MessagesPlaceholder("chat_history"),
+            ("human", CONDENSE_QUESTION_TEMPLATE),
+        ],
+        cache_control=cache_control,
+    )
+    
+    # Одинаковые одновременные запросы (тот же контекст и перефразированный вопрос,
+    # та же модель; история диалога не учитывается) выполняются одним вызовом LLM;
+    # перефразирование вопроса остаётся у исходной модели
+    combine_llm = llm
+    if settings.LLM_COALESCE_ENABLED:
+        combine_llm = CoalescingChatModel(llm=llm, streaming=getattr(llm, "streaming", False))
+
+    retriever = TimedRetriever(
+        vectorstore=vectorstore,
+        k=settings.RETRIEVAL_K,
+        use_mmr=settings.RETRIEVAL_MMR,
+        fetch_k=settings.RETRIEVAL_FETCH_K,
+        lambda_mult=settings.RETRIEVAL_MMR_LAMBDA,
+    )
+    # Перекрывающиеся чанки склеиваются, дубликаты отбрасываются, контекст
+    # ограничивается бюджетом токенов
+    if settings.CONTEXT_COMPRESSION_ENABLED:
+        retriever = ContextualCompressionRetriever(
+            base_compressor=ContextCompressor(
+                max_tokens=settings.CONTEXT_MAX_TOKENS,
+                dedup_threshold=settings.CONTEXT_DEDUP_THRESHOLD,
+            ),
+            base_retriever=retriever,
+        )
+
     qa_chain = ConversationalRetrievalChain.from_llm(
-        llm=llm,
-        retriever=vectorstore.as_retriever(search_kwargs={"k": 4}),
+        llm=combine_llm,
+        condense_question_llm=llm,
+        retriever=retriever,
         return_source_documents=True,
-        combine_docs_chain_kwargs={"prompt": custom_prompt},
-        condense_question_prompt=CONDENSE_QUESTION_PROMPT
+        combine_docs_chain_kwargs={"prompt": answer_prompt},
+        condense_question_prompt=condense_prompt,
+        get_chat_history=history_to_messages,
     )
     logger.info("RAG цепочка создана")
     return qa_chain
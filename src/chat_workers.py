@@ -0,0 +1,156 @@
+# src/chat_workers.py
+import os
+import sys
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+
+from src.chat_chain import create_rag_chain
+from src.llm_handler import get_llm
+from src.llm_router import get_routed_llm
+from src.metrics import metrics_callback, TurnUsageCallback
+from src.vector_store import index_signature, load_vectorstore
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+def create_chat_llm(model_name: str):
+    """LLM для ответов: через маршрутизатор (хеджирование, обход медленных моделей) или напрямую"""
+    if settings.LLM_ROUTER_ENABLED:
+        return get_routed_llm(model_name)
+    return get_llm(model_name)
+
+
+def answer_question(qa_chain, question: str, chat_history_pairs: List[Tuple[str, str]]) -> Dict:
+    """Один ход диалога: ответ, источники и сводка по токенам хода"""
+    # Метрики стадий (condense, embed_query, vector_search, generation) собирает metrics_callback
+    # Токены хода (в т.ч. прочитанные из кэша префикса провайдера) - turn_usage
+    turn_usage = TurnUsageCallback()
+    result = qa_chain({"question": question, "chat_history": chat_history_pairs},
+                      callbacks=[metrics_callback, turn_usage])
+    return {
+        "answer": result["answer"],
+        "source_documents": result["source_documents"],
+        "usage_summary": turn_usage.summary(),
+    }
+
+
+# Состояние процесса-исполнителя: индекс (mmap) и цепочки по моделям
+_worker_vectorstore = None
+_worker_signature = None
+_worker_chains: Dict[str, object] = {}
+
+
+def _init_chat_worker(faiss_threads: int):
+    """Инициализация процесса-исполнителя: потоки FAISS делятся между процессами"""
+    logging.basicConfig(level=logging.INFO)
+    try:
+        import faiss
+        faiss.omp_set_num_threads(faiss_threads)
+    except ImportError:
+        pass
+
+
+def _get_worker_chain(model_name: str):
+    """Цепочка для модели; после нового сохранения индекса он перечитывается"""
+    global _worker_vectorstore, _worker_signature
+    signature = index_signature()
+    if signature is None:
+        raise RuntimeError("Векторное хранилище не найдено - сначала обработайте документы")
+    if signature != _worker_signature:
+        _worker_vectorstore = load_vectorstore(mmap=settings.VECTOR_STORE_MMAP)
+        _worker_signature = signature
+        _worker_chains.clear()
+        logger.info(f"Процесс {os.getpid()}: индекс загружен")
+    if model_name not in _worker_chains:
+        _worker_chains[model_name] = create_rag_chain(_worker_vectorstore, create_chat_llm(model_name))
+    return _worker_chains[model_name]
+
+
+def _warm_up_worker():
+    """Импорты, embeddings и индекс загружаются до первого хода"""
+    from src.embeddings_handler import get_embeddings
+    get_embeddings()
+    if index_signature() is not None:
+        _get_worker_chain(settings.DEFAULT_MODEL)
+    return os.getpid()
+
+
+def _chat_turn(model_name: str, question: str, chat_history_pairs: List[Tuple[str, str]]) -> Dict:
+    return answer_question(_get_worker_chain(model_name), question, chat_history_pairs)
+
+
+_chat_pool: Optional[ProcessPoolExecutor] = None
+_chat_pool_lock = threading.Lock()
+
+
+def get_chat_pool() -> ProcessPoolExecutor:
+    """Пул процессов для ходов чата (создаётся один раз, размер - CHAT_WORKERS)"""
+    global _chat_pool
+    with _chat_pool_lock:
+        if _chat_pool is None:
+            workers = max(1, settings.CHAT_WORKERS)
+            faiss_threads = max(1, (os.cpu_count() or 1) // workers)
+            _chat_pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_chat_worker,
+                initargs=(faiss_threads,)
+            )
+            logger.info(f"Пул чата: {workers} процессов, FAISS по {faiss_threads} потоков")
+        return _chat_pool
+
+
+def check_worker_entry():
+    """Пул чата работает только при запуске через serve.py (или python app.py, передающий запуск ему).
+
+    Процессы spawn импортируют модуль __main__: если это app.py, каждый строит
+    интерфейс Gradio. Без PROMETHEUS_MULTIPROC_DIR метрики процессов-исполнителей
+    не попадают в /metrics.
+    """
+    main_file = os.path.basename(getattr(sys.modules.get("__main__"), "__file__", "") or "")
+    if main_file == "app.py":
+        raise RuntimeError("CHAT_WORKERS > 0: запускайте приложение через serve.py, а не импортом app.py")
+    if settings.METRICS_ENABLED and not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        raise RuntimeError("CHAT_WORKERS > 0: не задан PROMETHEUS_MULTIPROC_DIR - запускайте приложение через serve.py")
+
+
+def start_chat_workers():
+    """Запуск всех процессов пула заранее (spawn и импорты занимают секунды)"""
+    check_worker_entry()
+    pool = get_chat_pool()
+    for _ in range(max(1, settings.CHAT_WORKERS)):
+        pool.submit(_warm_up_worker).add_done_callback(_log_warm_up_error)
+    return pool
+
+
+def _log_warm_up_error(future):
+    if future.exception() is not None:
+        logger.warning(f"Не удалось прогреть процесс чата: {future.exception()}")
+
+
+def run_chat_turn(model_name: str, question: str, chat_history_pairs: List[Tuple[str, str]]) -> Dict:
+    """Ход диалога в процессе-исполнителе (результат - как у answer_question)"""
+    global _chat_pool
+    pool = get_chat_pool()
+    try:
+        return pool.submit(_chat_turn, model_name, question, chat_history_pairs).result()
+    except BrokenProcessPool:
+        # Упавший процесс ломает весь пул: следующий ход создаст новый
+        with _chat_pool_lock:
+            if _chat_pool is pool:
+                _chat_pool = None
+        pool.shutdown(wait=False)
+        raise
+
+
+def shutdown_chat_pool():
+    global _chat_pool
+    with _chat_pool_lock:
+        pool, _chat_pool = _chat_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
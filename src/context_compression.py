@@ -0,0 +1,158 @@
+# src/context_compression.py
+import re
+import logging
+from functools import lru_cache
+from typing import List, Optional, Sequence
+
+from langchain_core.callbacks import Callbacks
+from langchain_core.documents import BaseDocumentCompressor, Document
+
+from src.metrics import track_stage
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Если словарь tiktoken недоступен (нет сети при первом запуске), токены оцениваются по символам
+APPROX_CHARS_PER_TOKEN = 3
+# Хвост документа короче этого числа токенов не добавляется в контекст
+MIN_TAIL_TOKENS = 50
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+@lru_cache(maxsize=None)
+def get_token_encoder(encoding_name: Optional[str] = None):
+    """Кодировщик tiktoken или None, если словарь не удалось загрузить"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(encoding_name or settings.CONTEXT_TOKEN_ENCODING)
+    except Exception as e:
+        logger.warning(f"tiktoken недоступен ({e}), токены оцениваются по длине текста")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoder = get_token_encoder()
+    if encoder is None:
+        return (len(text) + APPROX_CHARS_PER_TOKEN - 1) // APPROX_CHARS_PER_TOKEN
+    return len(encoder.encode(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    encoder = get_token_encoder()
+    if encoder is None:
+        return text[:max_tokens * APPROX_CHARS_PER_TOKEN]
+    return encoder.decode(encoder.encode(text)[:max_tokens])
+
+
+def _chunk_group(doc: Document):
+    """Чанки с общим источником (и страницей) и известным смещением можно склеивать"""
+    metadata = doc.metadata
+    if metadata.get("start_index") is None:
+        return None
+    return metadata.get("source") or metadata.get("source_file"), metadata.get("page")
+
+
+def merge_adjacent_chunks(documents: Sequence[Document]) -> List[Document]:
+    """Склейка соседних и перекрывающихся чанков одного источника по start_index.
+
+    Порядок результатов - по лучшей позиции входящих в группу чанков.
+    Чанки без start_index (старый индекс, транскрипты) остаются как есть.
+    """
+    # (ранг, группа, start, end, text, metadata, число чанков)
+    spans = []
+    for rank, doc in enumerate(documents):
+        group = _chunk_group(doc)
+        start = doc.metadata.get("start_index")
+        spans.append([rank, group, start, None if start is None else start + len(doc.page_content),
+                      doc.page_content, doc.metadata, 1])
+
+    merged = []
+    ordered = sorted((s for s in spans if s[1] is not None), key=lambda s: (repr(s[1]), s[2]))
+    for span in ordered:
+        last = merged[-1] if merged else None
+        if last is not None and last[1] == span[1] and span[2] <= last[3]:
+            # Перекрытие (или стык): дописываем только новую часть текста
+            if span[3] > last[3]:
+                last[4] += span[4][last[3] - span[2]:]
+                last[3] = span[3]
+            last[0] = min(last[0], span[0])
+            last[6] += span[6]
+            continue
+        merged.append(list(span))
+    merged.extend(s for s in spans if s[1] is None)
+    merged.sort(key=lambda s: s[0])
+
+    result = []
+    for rank, group, start, end, text, metadata, count in merged:
+        metadata = dict(metadata)
+        if count > 1:
+            metadata["merged_chunks"] = count
+        result.append(Document(page_content=text, metadata=metadata))
+    return result
+
+
+def _shingles(text: str, size: int = 3) -> set:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < size:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def drop_near_duplicates(documents: Sequence[Document], threshold: float = 0.8) -> List[Document]:
+    """Удаление почти одинаковых фрагментов (из разных файлов или страниц).
+
+    Фрагмент отбрасывается, если доля его словесных 3-грамм, уже встречающихся
+    в более релевантном фрагменте, не меньше threshold (для меньшего из двух).
+    """
+    kept, kept_shingles = [], []
+    for doc in documents:
+        shingles = _shingles(doc.page_content)
+        duplicate = False
+        for other in kept_shingles:
+            smaller = min(len(shingles), len(other))
+            if smaller and len(shingles & other) / smaller >= threshold:
+                duplicate = True
+                break
+        if not duplicate:
+            kept.append(doc)
+            kept_shingles.append(shingles)
+    return kept
+
+
+def trim_to_token_budget(documents: Sequence[Document], max_tokens: int) -> List[Document]:
+    """Фрагменты в порядке релевантности, пока суммарно помещаются в max_tokens.
+
+    Не поместившийся фрагмент обрезается, если от бюджета осталось хотя бы MIN_TAIL_TOKENS.
+    """
+    result, used = [], 0
+    for doc in documents:
+        tokens = count_tokens(doc.page_content)
+        if used + tokens <= max_tokens:
+            result.append(doc)
+            used += tokens
+            continue
+        remaining = max_tokens - used
+        if remaining >= MIN_TAIL_TOKENS:
+            result.append(Document(page_content=truncate_to_tokens(doc.page_content, remaining),
+                                   metadata={**doc.metadata, "truncated": True}))
+        break
+    return result
+
+
+class ContextCompressor(BaseDocumentCompressor):
+    """Сжатие найденного контекста перед подстановкой в промпт:
+    склейка соседних чанков, удаление дубликатов, ограничение по токенам.
+    """
+
+    max_tokens: int = 1500
+    dedup_threshold: float = 0.8
+
+    def compress_documents(self, documents: Sequence[Document], query: str,
+                           callbacks: Optional[Callbacks] = None) -> Sequence[Document]:
+        with track_stage("context_compression"):
+            merged = merge_adjacent_chunks(documents)
+            unique = drop_near_duplicates(merged, self.dedup_threshold)
+            result = trim_to_token_budget(unique, self.max_tokens)
+        logger.debug(f"Контекст сжат: {len(documents)} -> {len(result)} фрагментов")
+        return result
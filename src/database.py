@@ -1,35 +1,53 @@
 # src/database.py
 import os
+import hashlib
+import secrets
 import bcrypt # <-- Убедитесь, что bcrypt импортирован
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, Json
 from contextlib import contextmanager
-from typing import List, Dict, Optional, Tuple
+from typing import Iterator, List, Dict, Optional, Tuple
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
+from config.settings import settings
+from src.db_backends import MIGRATIONS_DIR, create_backend
+from src.metrics import track_stage
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+
+def hash_password(password: str) -> str:
+    """bcrypt-хэш пароля со стоимостью BCRYPT_ROUNDS"""
+    password_bytes = password.encode('utf-8') if isinstance(password, str) else password
+    return bcrypt.hashpw(password_bytes, bcrypt.gensalt(rounds=settings.BCRYPT_ROUNDS)).decode('utf-8')
+
+
+def bcrypt_rounds(password_hash: str) -> Optional[int]:
+    """Стоимость, с которой получен хэш ($2b$12$... -> 12)"""
+    try:
+        return int(password_hash.split('$')[2])
+    except (IndexError, ValueError):
+        return None
+
+
+def token_digest(token: str) -> str:
+    """В БД хранится только SHA-256 токена: утечка таблицы не даёт войти"""
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
 class DatabaseManager:
-    def __init__(self):
-        self.connection_params = {
-            'host': os.getenv('DB_HOST', 'localhost'),
-            'database': os.getenv('DB_NAME', 'rag_chatbot'),
-            'user': os.getenv('DB_USER', 'postgres'),
-            'password': os.getenv('DB_PASSWORD', 'postgres'),
-            'port': os.getenv('DB_PORT', '5432'),
-        }
-        print("Параметры подключения к БД:", self.connection_params)
+    def __init__(self, backend=None):
+        # Бэкенд выбирается переменной DB_BACKEND: postgres (по умолчанию) или sqlite
+        self.backend = backend or create_backend()
+        print("Параметры подключения к БД:", self.backend.describe())
     
     @contextmanager
     def get_connection(self):
         """Контекстный менеджер для получения соединения с БД"""
         conn = None
         try:
-            conn = psycopg2.connect(**self.connection_params)
+            conn = self.backend.connect()
             conn.set_client_encoding('UTF8')
             yield conn
         except Exception as e:
@@ -39,24 +57,20 @@ class DatabaseManager:
             raise
         finally:
             if conn:
-                conn.close()
+                self.backend.release(conn)
     
     def initialize_database(self):
         """Инициализация базы данных (создание таблиц)"""
         try:
             # Читаем SQL файл для инициализации
-            sql_file_path = os.path.join(os.path.dirname(__file__), '..', 'migrations', 'init.sql')
+            sql_file_path = os.path.join(MIGRATIONS_DIR, self.backend.schema_file)
             if os.path.exists(sql_file_path):
                 with open(sql_file_path, 'r', encoding='utf-8') as f:
                     sql_script = f.read()
                 
                 with self.get_connection() as conn:
-                    with conn.cursor() as cursor:
-                        # Устанавливаем кодировку перед выполнением
-                        conn.set_client_encoding('UTF8')
-                        cursor.execute("SET client_encoding = 'UTF8'")
-                        cursor.execute(sql_script)
-                        conn.commit()
+                    self.backend.execute_script(conn, sql_script)
+                    conn.commit()
                 logger.info("База данных инициализирована успешно")
             else:
                 logger.warning("Файл инициализации базы данных не найден")
@@ -81,8 +95,7 @@ class DatabaseManager:
                 return False # Или выбросить исключение
 
             # Хэшируем пароль
-            password_bytes = password.encode('utf-8')
-            hashed = bcrypt.hashpw(password_bytes, bcrypt.gensalt()).decode('utf-8')
+            hashed = hash_password(password)
 
             with self.get_connection() as conn:
                 with conn.cursor() as cursor:
@@ -102,55 +115,80 @@ class DatabaseManager:
             # Но для согласованности лучше возвращать False или True
             return False # Или raise e, если хотите, чтобы исключение поднималось
 
-    def create_user(self, username: str, password: str) -> int:
-        """Создание нового пользователя с паролем"""
+    def authenticate_user(self, username: str, password: str) -> Optional[int]:
+        """Проверка пароля; возвращает ID пользователя или None.
+
+        bcrypt выполняется один раз; хэш пересчитывается только если он получен
+        с другой стоимостью, чем BCRYPT_ROUNDS. Иначе обновляется лишь last_active.
+        """
         try:
             cleaned_username = username.encode('utf-8', errors='ignore').decode('utf-8')
-            
-            # Хэшируем пароль
             password_bytes = password.encode('utf-8') if isinstance(password, str) else password
-            hashed = bcrypt.hashpw(password_bytes, bcrypt.gensalt()).decode('utf-8')
 
             with self.get_connection() as conn:
                 with conn.cursor() as cursor:
-                    conn.set_client_encoding('UTF8')
-                    cursor.execute("SET client_encoding = 'UTF8'")
-                    # Обновляем или вставляем пользователя, сохраняя хэш пароля
-                    cursor.execute(
-                        "INSERT INTO users (username, password_hash) VALUES (%s, %s) ON CONFLICT (username) DO UPDATE SET password_hash = EXCLUDED.password_hash, last_active = CURRENT_TIMESTAMP RETURNING id",
-                        (cleaned_username, hashed) # <-- Передаем хэш
-                    )
-                    user_id = cursor.fetchone()[0]
+                    cursor.execute("SELECT id, password_hash FROM users WHERE username = %s", (cleaned_username,))
+                    result = cursor.fetchone()
+                    if not result or not result[1]:
+                        return None
+                    user_id, stored_hash = result
+                    if not bcrypt.checkpw(password_bytes, stored_hash.encode('utf-8')):
+                        return None
+
+                    if bcrypt_rounds(stored_hash) != settings.BCRYPT_ROUNDS:
+                        cursor.execute(
+                            "UPDATE users SET password_hash = %s, last_active = CURRENT_TIMESTAMP WHERE id = %s",
+                            (hash_password(password_bytes), user_id)
+                        )
+                        logger.info(f"Хэш пароля пользователя {cleaned_username} пересчитан "
+                                    f"(стоимость {bcrypt_rounds(stored_hash)} -> {settings.BCRYPT_ROUNDS})")
+                    else:
+                        cursor.execute("UPDATE users SET last_active = CURRENT_TIMESTAMP WHERE id = %s", (user_id,))
                     conn.commit()
-                    logger.info(f"Пользователь {cleaned_username} создан/обновлен с ID {user_id}")
                     return user_id
         except Exception as e:
-            logger.error(f"Ошибка создания пользователя {username}: {e}")
-            raise
+            logger.error(f"Ошибка проверки пароля для пользователя {username}: {e}")
+            return None
 
-    def verify_user_password(self, username: str, password: str) -> bool:
-        """Проверка имени пользователя и пароля"""
-        try:
-            cleaned_username = username.encode('utf-8', errors='ignore').decode('utf-8')
-            password_bytes = password.encode('utf-8') if isinstance(password, str) else password
+    def create_auth_session(self, user_id: int, ttl_hours: Optional[float] = None) -> str:
+        """Выдача токена входа; истёкшие токены при этом удаляются"""
+        token = secrets.token_urlsafe(32)
+        now = datetime.now()
+        expires_at = now + timedelta(hours=settings.AUTH_SESSION_TTL_HOURS if ttl_hours is None else ttl_hours)
+        with self.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("DELETE FROM auth_sessions WHERE expires_at <= %s", (now,))
+                cursor.execute(
+                    "INSERT INTO auth_sessions (token_hash, user_id, expires_at) VALUES (%s, %s, %s)",
+                    (token_digest(token), user_id, expires_at)
+                )
+                conn.commit()
+        return token
 
+    def get_auth_session_user(self, token: str) -> Optional[int]:
+        """ID пользователя по действующему токену (без bcrypt)"""
+        if not token:
+            return None
+        try:
             with self.get_connection() as conn:
                 with conn.cursor() as cursor:
-                    conn.set_client_encoding('UTF8')
-                    cursor.execute("SET client_encoding = 'UTF8'")
-                    cursor.execute("SELECT password_hash FROM users WHERE username = %s", (cleaned_username,))
+                    cursor.execute(
+                        "SELECT user_id FROM auth_sessions WHERE token_hash = %s AND expires_at > %s",
+                        (token_digest(token), datetime.now())
+                    )
                     result = cursor.fetchone()
-                    
-                    if result and result[0]: # Проверяем, что хэш существует
-                        stored_hash = result[0].encode('utf-8') # bcrypt требует bytes
-                        return bcrypt.checkpw(password_bytes, stored_hash)
-                    else:
-                        # Пользователь не найден или пароль не установлен
-                        return False
+                    return result[0] if result else None
         except Exception as e:
-            logger.error(f"Ошибка проверки пароля для пользователя {username}: {e}")
-            return False
-    
+            logger.error(f"Ошибка проверки токена: {e}")
+            return None
+
+    def delete_auth_session(self, token: str):
+        """Выход: токен больше не действует"""
+        with self.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("DELETE FROM auth_sessions WHERE token_hash = %s", (token_digest(token),))
+                conn.commit()
+
     def get_user_id(self, username: str) -> Optional[int]:
         """Получение ID пользователя по имени"""
         try:
@@ -221,7 +259,7 @@ class DatabaseManager:
             cleaned_content = content.encode('utf-8', errors='ignore').decode('utf-8')
             cleaned_role = role.encode('utf-8', errors='ignore').decode('utf-8')
             
-            with self.get_connection() as conn:
+            with track_stage("save_message"), self.get_connection() as conn:
                 with conn.cursor() as cursor:
                     conn.set_client_encoding('UTF8')
                     cursor.execute("SET client_encoding = 'UTF8'")
@@ -241,6 +279,14 @@ class DatabaseManager:
             logger.error(f"Ошибка сохранения сообщения в сессии {session_id}: {e}")
             raise
     
+    def get_session_user_id(self, session_id: int) -> Optional[int]:
+        """Владелец сессии диалога (None - сессии нет)"""
+        with self.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT user_id FROM chat_sessions WHERE id = %s", (session_id,))
+                result = cursor.fetchone()
+                return result[0] if result else None
+
     def get_session_messages(self, session_id: int) -> List[Tuple[str, str]]:
         """Получение всех сообщений сессии"""
         try:
@@ -268,6 +314,61 @@ class DatabaseManager:
             logger.error(f"Ошибка получения сообщений сессии {session_id}: {e}")
             return []
     
+    def search_messages(self, user_id: int, query: str, limit: int = 20, offset: int = 0) -> List[Dict]:
+        """Полнотекстовый поиск по сообщениям пользователя.
+
+        Результаты упорядочены по релевантности; snippet - фрагмент текста,
+        найденные слова выделены **...**.
+        """
+        try:
+            params = self.backend.search_params(query.strip(), user_id, limit, offset) if query.strip() else None
+            if params is None:
+                return []
+            with self.get_connection() as conn:
+                with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                    conn.set_client_encoding('UTF8')
+                    cursor.execute("SET client_encoding = 'UTF8'")
+                    cursor.execute(self.backend.SEARCH_MESSAGES_SQL, params)
+                    return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"Ошибка поиска по сообщениям пользователя {user_id}: {e}")
+            return []
+
+    # Колонки строк, которые отдают потоковые выборки сообщений для экспорта
+    EXPORT_MESSAGE_QUERY = (
+        "SELECT m.id, m.session_id, s.session_name, s.user_id, m.role, m.content, m.created_at "
+        "FROM chat_messages m JOIN chat_sessions s ON s.id = m.session_id "
+    )
+
+    def _iter_export_rows(self, cursor_name: str, query: str, params: tuple, fetch_size: int) -> Iterator[Dict]:
+        """Построчная выдача результата через именованный (серверный) курсор.
+
+        Клиент держит в памяти не больше fetch_size строк, поэтому объём
+        выборки не ограничен памятью процесса.
+        """
+        with self.get_connection() as conn:
+            with conn.cursor(name=cursor_name, cursor_factory=RealDictCursor) as cursor:
+                cursor.itersize = fetch_size
+                cursor.execute(query, params)
+                for row in cursor:
+                    yield row
+
+    def iter_session_messages(self, session_id: int, fetch_size: int = 500) -> Iterator[Dict]:
+        """Потоковое чтение сообщений сессии (для экспорта)"""
+        return self._iter_export_rows(
+            f"export_session_{session_id}",
+            self.EXPORT_MESSAGE_QUERY + "WHERE m.session_id = %s ORDER BY m.created_at, m.id",
+            (session_id,), fetch_size
+        )
+
+    def iter_user_messages(self, user_id: int, fetch_size: int = 500) -> Iterator[Dict]:
+        """Потоковое чтение сообщений всех сессий пользователя, сгруппированных по сессиям"""
+        return self._iter_export_rows(
+            f"export_user_{user_id}",
+            self.EXPORT_MESSAGE_QUERY + "WHERE s.user_id = %s ORDER BY m.session_id, m.created_at, m.id",
+            (user_id,), fetch_size
+        )
+
     def delete_session(self, session_id: int):
         """Удаление сессии и всех сообщений"""
         try:
@@ -282,5 +383,113 @@ class DatabaseManager:
             logger.error(f"Ошибка удаления сессии {session_id}: {e}")
             raise
 
+    def create_ingestion_job(self, user_id: Optional[int], files: List[str]) -> int:
+        """Создание задачи индексации в статусе 'queued'"""
+        try:
+            with self.get_connection() as conn:
+                with conn.cursor() as cursor:
+                    conn.set_client_encoding('UTF8')
+                    cursor.execute("SET client_encoding = 'UTF8'")
+                    cursor.execute(
+                        "INSERT INTO ingestion_jobs (user_id, files) VALUES (%s, %s) RETURNING id",
+                        (user_id, Json(files))
+                    )
+                    job_id = cursor.fetchone()[0]
+                    conn.commit()
+                    logger.info(f"Задача индексации {job_id} создана ({len(files)} файлов)")
+                    return job_id
+        except Exception as e:
+            logger.error(f"Ошибка создания задачи индексации: {e}")
+            raise
+
+    # Поля задачи, которые разрешено обновлять через update_ingestion_job
+    INGESTION_JOB_FIELDS = ('status', 'stage', 'progress', 'message', 'started_at', 'finished_at')
+
+    def update_ingestion_job(self, job_id: int, **fields):
+        """Обновление статуса/стадии/прогресса задачи индексации"""
+        try:
+            unknown = set(fields) - set(self.INGESTION_JOB_FIELDS)
+            if unknown:
+                raise ValueError(f"Недопустимые поля задачи: {unknown}")
+            assignments = [f"{name} = %s" for name in fields]
+            values = [Json(value) if name == 'progress' else value for name, value in fields.items()]
+
+            with self.get_connection() as conn:
+                with conn.cursor() as cursor:
+                    conn.set_client_encoding('UTF8')
+                    cursor.execute("SET client_encoding = 'UTF8'")
+                    cursor.execute(
+                        f"UPDATE ingestion_jobs SET {', '.join(assignments + ['updated_at = CURRENT_TIMESTAMP'])} WHERE id = %s",
+                        (*values, job_id)
+                    )
+                    conn.commit()
+        except Exception as e:
+            logger.error(f"Ошибка обновления задачи индексации {job_id}: {e}")
+            raise
+
+    def get_ingestion_job(self, job_id: int) -> Optional[Dict]:
+        """Получение задачи индексации по ID"""
+        try:
+            with self.get_connection() as conn:
+                with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                    conn.set_client_encoding('UTF8')
+                    cursor.execute("SET client_encoding = 'UTF8'")
+                    cursor.execute("SELECT * FROM ingestion_jobs WHERE id = %s", (job_id,))
+                    result = cursor.fetchone()
+                    return dict(result) if result else None
+        except Exception as e:
+            logger.error(f"Ошибка получения задачи индексации {job_id}: {e}")
+            return None
+
+    def list_ingestion_jobs(self, user_id: int, limit: int = 20) -> List[Dict]:
+        """Последние задачи индексации пользователя"""
+        try:
+            with self.get_connection() as conn:
+                with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                    conn.set_client_encoding('UTF8')
+                    cursor.execute("SET client_encoding = 'UTF8'")
+                    cursor.execute(
+                        "SELECT * FROM ingestion_jobs WHERE user_id = %s ORDER BY created_at DESC LIMIT %s",
+                        (user_id, limit)
+                    )
+                    return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"Ошибка получения списка задач индексации: {e}")
+            return []
+
+    def get_unfinished_ingestion_jobs(self) -> List[Dict]:
+        """Задачи, не завершённые к моменту остановки приложения"""
+        try:
+            with self.get_connection() as conn:
+                with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                    conn.set_client_encoding('UTF8')
+                    cursor.execute("SET client_encoding = 'UTF8'")
+                    cursor.execute(
+                        "SELECT * FROM ingestion_jobs WHERE status IN ('queued', 'running') ORDER BY created_at ASC"
+                    )
+                    return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"Ошибка получения незавершённых задач индексации: {e}")
+            return []
+
+    def request_ingestion_job_cancel(self, job_id: int) -> bool:
+        """Пометка задачи на отмену; False, если задача уже завершена или не найдена"""
+        try:
+            with self.get_connection() as conn:
+                with conn.cursor() as cursor:
+                    conn.set_client_encoding('UTF8')
+                    cursor.execute("SET client_encoding = 'UTF8'")
+                    cursor.execute(
+                        "UPDATE ingestion_jobs SET cancel_requested = TRUE, updated_at = CURRENT_TIMESTAMP "
+                        "WHERE id = %s AND status IN ('queued', 'running') RETURNING id",
+                        (job_id,)
+                    )
+                    updated = cursor.fetchone() is not None
+                    conn.commit()
+                    return updated
+        except Exception as e:
+            logger.error(f"Ошибка отмены задачи индексации {job_id}: {e}")
+            raise
+
 # Глобальный экземпляр менеджера базы данных
 db_manager = DatabaseManager()
\ No newline at end of file
@@ -0,0 +1,330 @@
+# src/db_backends.py
+import os
+import re
+import json
+import sqlite3
+import threading
+import logging
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional
+
+from src.metrics import DB_CONNECTIONS_OPENED, DB_CONNECTIONS_ACTIVE, DB_CONNECT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), '..', 'migrations')
+
+# Параметры фрагментов результатов полнотекстового поиска (ts_headline)
+HEADLINE_OPTIONS = "'StartSel=**, StopSel=**, MaxWords=35, MinWords=15, MaxFragments=2, FragmentDelimiter=\" … \"'"
+
+
+class PostgresBackend:
+    """PostgreSQL через psycopg2: новое соединение на каждое обращение"""
+
+    name = "postgres"
+    schema_file = "init.sql"
+
+    def __init__(self, connection_params: Optional[Dict] = None):
+        self.connection_params = connection_params or {
+            'host': os.getenv('DB_HOST', 'localhost'),
+            'database': os.getenv('DB_NAME', 'rag_chatbot'),
+            'user': os.getenv('DB_USER', 'postgres'),
+            'password': os.getenv('DB_PASSWORD', 'postgres'),
+            'port': os.getenv('DB_PORT', '5432'),
+        }
+
+    # Полнотекстовый поиск: GIN-индекс по content_tsv отбирает совпадения, ts_rank
+    # считается только для них, ts_headline - только для строк текущей страницы.
+    # content_tsv и запрос объединяют конфигурации russian и english, а ts_headline
+    # разбирает текст одной: берём russian, если её разбор текста совпадает с запросом,
+    # иначе english (например, "cafés" даёт лексему 'café' только в english)
+    SEARCH_MESSAGES_SQL = """
+        SELECT hit.id, hit.session_id, hit.session_name, hit.role, hit.created_at, hit.rank,
+               CASE WHEN to_tsvector('russian', hit.content) @@ hit.query
+                    THEN ts_headline('russian', hit.content, hit.query, """ + HEADLINE_OPTIONS + """)
+                    ELSE ts_headline('english', hit.content, hit.query, """ + HEADLINE_OPTIONS + """)
+               END AS snippet
+        FROM (
+            SELECT m.id, m.session_id, s.session_name, m.role, m.content, m.created_at,
+                   ts_rank(m.content_tsv, q.query) AS rank, q.query
+            FROM (SELECT websearch_to_tsquery('russian', %s) || websearch_to_tsquery('english', %s) AS query) q
+            JOIN chat_messages m ON m.content_tsv @@ q.query
+            JOIN chat_sessions s ON s.id = m.session_id
+            WHERE s.user_id = %s
+            ORDER BY rank DESC, m.created_at DESC
+            LIMIT %s OFFSET %s
+        ) hit
+        ORDER BY hit.rank DESC, hit.created_at DESC
+    """
+
+    def describe(self) -> Dict:
+        return self.connection_params
+
+    def search_params(self, query: str, user_id: int, limit: int, offset: int) -> Optional[tuple]:
+        # websearch_to_tsquery понимает "фразы", OR и -исключения
+        return (query, query, user_id, limit, offset)
+
+    def connect(self):
+        import psycopg2
+
+        # Пула нет - каждое обращение открывает новое соединение; метрики показывают цену этого
+        with DB_CONNECT_SECONDS.time():
+            conn = psycopg2.connect(**self.connection_params)
+        DB_CONNECTIONS_OPENED.inc()
+        DB_CONNECTIONS_ACTIVE.inc()
+        return conn
+
+    def release(self, conn):
+        conn.close()
+        DB_CONNECTIONS_ACTIVE.dec()
+
+    def execute_script(self, conn, script: str):
+        with conn.cursor() as cursor:
+            cursor.execute("SET client_encoding = 'UTF8'")
+            cursor.execute(script)
+
+    def reset_sequence(self, conn, table: str):
+        """Сдвиг последовательности SERIAL после вставки строк с явными id"""
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                f"COALESCE(MAX(id), 1), MAX(id) IS NOT NULL) FROM {table}"
+            )
+
+    def close(self):
+        pass
+
+
+# Время в том же виде, что CURRENT_TIMESTAMP у PostgreSQL (локальное, с долями секунды):
+# сообщения одного хода сортируются по created_at и не должны совпадать до секунды
+SQLITE_NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime')"
+
+_SKIPPED_STATEMENTS = re.compile(r"^\s*SET\s+client_encoding", re.IGNORECASE)
+
+
+@lru_cache(maxsize=512)
+def translate_sql(sql: str) -> Optional[str]:
+    """Перевод запроса из диалекта psycopg2 в SQLite (None - запрос не нужен).
+
+    Результат кэшируется, поэтому одинаковые запросы дают одинаковый текст
+    и SQLite повторно использует подготовленные выражения из своего кэша.
+    """
+    if _SKIPPED_STATEMENTS.match(sql):
+        return None
+    return sql.replace("%s", "?").replace("CURRENT_TIMESTAMP", SQLITE_NOW)
+
+
+def _adapt_param(value: Any) -> Any:
+    # psycopg2.extras.Json хранит исходный объект в .adapted
+    if hasattr(value, 'adapted'):
+        value = value.adapted
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def _dict_row(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_converter("TIMESTAMP", lambda value: datetime.fromisoformat(value.decode()))
+sqlite3.register_converter("JSON", lambda value: json.loads(value))
+sqlite3.register_converter("BOOLEAN", lambda value: bool(int(value)))
+
+
+class SQLiteCursor:
+    """Курсор с интерфейсом psycopg2 поверх sqlite3.Cursor"""
+
+    def __init__(self, raw: sqlite3.Cursor, dict_rows: bool = False):
+        self._raw = raw
+        if dict_rows:
+            self._raw.row_factory = _dict_row
+        self._buffer: Optional[List] = None
+
+    def execute(self, sql: str, params: Iterable = ()):
+        translated = translate_sql(sql)
+        if translated is None:
+            return self
+        self._raw.execute(translated, tuple(_adapt_param(p) for p in params))
+        # Строки RETURNING читаем сразу: иначе незавершённое выражение не даст сделать COMMIT
+        self._buffer = self._raw.fetchall() if "RETURNING" in translated else None
+        return self
+
+    def executemany(self, sql: str, seq_of_params: Iterable[Iterable]):
+        translated = translate_sql(sql)
+        if translated is not None:
+            self._raw.executemany(translated, ([_adapt_param(p) for p in params] for params in seq_of_params))
+            self._buffer = None
+        return self
+
+    def fetchone(self):
+        if self._buffer is not None:
+            return self._buffer.pop(0) if self._buffer else None
+        return self._raw.fetchone()
+
+    def fetchmany(self, size: Optional[int] = None):
+        size = size or self._raw.arraysize
+        if self._buffer is not None:
+            rows, self._buffer = self._buffer[:size], self._buffer[size:]
+            return rows
+        return self._raw.fetchmany(size)
+
+    def fetchall(self):
+        if self._buffer is not None:
+            rows, self._buffer = self._buffer, []
+            return rows
+        return self._raw.fetchall()
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+    # itersize именованного курсора psycopg2 соответствует arraysize
+    @property
+    def itersize(self) -> int:
+        return self._raw.arraysize
+
+    @itersize.setter
+    def itersize(self, value: int):
+        self._raw.arraysize = value
+
+    @property
+    def description(self):
+        return self._raw.description
+
+    @property
+    def rowcount(self) -> int:
+        return self._raw.rowcount
+
+    def close(self):
+        self._raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class SQLiteConnection:
+    """Соединение с интерфейсом psycopg2, которым пользуется DatabaseManager"""
+
+    def __init__(self, raw: sqlite3.Connection):
+        self.raw = raw
+
+    def cursor(self, name: Optional[str] = None, cursor_factory=None) -> SQLiteCursor:
+        # Серверные курсоры не нужны: sqlite3 и так читает результат построчно
+        return SQLiteCursor(self.raw.cursor(), dict_rows=cursor_factory is not None)
+
+    def set_client_encoding(self, encoding: str):
+        pass  # SQLite всегда хранит текст в UTF-8
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+
+class SQLiteBackend:
+    """Встроенная база SQLite: WAL, одно соединение на поток, кэш подготовленных выражений"""
+
+    name = "sqlite"
+    schema_file = "init_sqlite.sql"
+
+    def __init__(self, path: Optional[str] = None, busy_timeout: Optional[float] = None,
+                 cached_statements: int = 256):
+        self.path = path or os.getenv('SQLITE_PATH', 'data/rag_chatbot.db')
+        self.busy_timeout = busy_timeout if busy_timeout is not None else float(os.getenv('SQLITE_BUSY_TIMEOUT', '30'))
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    # Полнотекстовый поиск через FTS5 (таблица chat_messages_fts из init_sqlite.sql)
+    SEARCH_MESSAGES_SQL = """
+        SELECT m.id, m.session_id, s.session_name, m.role, m.created_at,
+               -bm25(chat_messages_fts) AS rank,
+               snippet(chat_messages_fts, 0, '**', '**', ' … ', 24) AS snippet
+        FROM chat_messages_fts
+        JOIN chat_messages m ON m.id = chat_messages_fts.rowid
+        JOIN chat_sessions s ON s.id = m.session_id
+        WHERE chat_messages_fts MATCH %s AND s.user_id = %s
+        ORDER BY bm25(chat_messages_fts), m.created_at DESC
+        LIMIT %s OFFSET %s
+    """
+
+    def describe(self) -> Dict:
+        return {'backend': self.name, 'path': self.path}
+
+    def search_params(self, query: str, user_id: int, limit: int, offset: int) -> Optional[tuple]:
+        # Слова запроса - префиксные термы FTS5 (спецсимволы синтаксиса MATCH не пропускаются)
+        terms = re.findall(r"\w+", query)
+        if not terms:
+            return None
+        return (" ".join(f'"{term}"*' for term in terms), user_id, limit, offset)
+
+    def _open(self) -> sqlite3.Connection:
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with DB_CONNECT_SECONDS.time():
+            raw = sqlite3.connect(
+                self.path, timeout=self.busy_timeout, detect_types=sqlite3.PARSE_DECLTYPES,
+                cached_statements=self.cached_statements,
+            )
+            raw.execute("PRAGMA journal_mode=WAL")
+            raw.execute("PRAGMA synchronous=NORMAL")
+            raw.execute("PRAGMA foreign_keys=ON")
+        DB_CONNECTIONS_OPENED.inc()
+        DB_CONNECTIONS_ACTIVE.inc()
+        with self._lock:
+            self._connections.append(raw)
+        return raw
+
+    def connect(self) -> SQLiteConnection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = SQLiteConnection(self._open())
+        return conn
+
+    def release(self, conn: SQLiteConnection):
+        # Соединение остаётся у потока; незакоммиченное отбрасываем, как при закрытии в PostgreSQL
+        if conn.raw.in_transaction:
+            conn.raw.rollback()
+
+    def execute_script(self, conn: SQLiteConnection, script: str):
+        conn.raw.executescript(script)
+
+    def reset_sequence(self, conn: SQLiteConnection, table: str):
+        pass  # AUTOINCREMENT сам учитывает явно вставленные id
+
+    def close(self):
+        """Закрытие соединений всех потоков (для утилит и тестов)"""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for raw in connections:
+            try:
+                raw.close()
+                DB_CONNECTIONS_ACTIVE.dec()
+            except sqlite3.ProgrammingError:
+                pass  # соединение другого потока закроется вместе с ним
+        self._local = threading.local()
+
+
+BACKENDS = {
+    PostgresBackend.name: PostgresBackend,
+    SQLiteBackend.name: SQLiteBackend,
+}
+
+
+def create_backend(name: Optional[str] = None, **kwargs):
+    """Бэкенд по имени (по умолчанию - из переменной окружения DB_BACKEND)"""
+    name = (name or os.getenv('DB_BACKEND', 'postgres')).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Неизвестный бэкенд БД: {name} (доступны: {', '.join(BACKENDS)})")
+    return BACKENDS[name](**kwargs)
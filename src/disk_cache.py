@@ -0,0 +1,145 @@
+# src/disk_cache.py
+import os
+import gzip
+import json
+import uuid
+import hashlib
+import threading
+import logging
+from typing import Iterable, Iterator, Optional
+
+from src.metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+
+def file_sha256(file_path: str, block_size: int = 1 << 20) -> str:
+    """SHA-256 содержимого файла (читается блоками, без загрузки в память)"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class _CacheWriter:
+    """Потоковая запись записи кэша: данные видны только после commit()"""
+
+    def __init__(self, cache, key: str):
+        self.cache = cache
+        self.key = key
+        os.makedirs(cache.directory, exist_ok=True)
+        self.tmp_path = f"{cache.entry_path(key)}.{uuid.uuid4().hex}.tmp"
+        self._file = gzip.open(self.tmp_path, 'wt', encoding='utf-8')
+
+    def write(self, record: dict):
+        self._file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')))
+        self._file.write('\n')
+
+    def commit(self):
+        self._file.close()
+        os.replace(self.tmp_path, self.cache.entry_path(self.key))
+        self.cache.evict()
+
+    def abort(self):
+        try:
+            self._file.close()
+        finally:
+            if os.path.exists(self.tmp_path):
+                os.unlink(self.tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+        return False
+
+
+class DiskCache:
+    """Ограниченный по размеру дисковый кэш записей (gzip JSONL) с вытеснением LRU"""
+
+    def __init__(self, directory: str, max_bytes: int, name: str = None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # Имя кэша в метриках (по умолчанию - имя папки)
+        self.name = name or os.path.basename(os.path.normpath(directory))
+        self._evict_lock = threading.Lock()
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        """Ключ записи из произвольных JSON-сериализуемых частей"""
+        raw = json.dumps(parts, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def entry_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.jsonl.gz")
+
+    def get(self, key: str) -> Optional[Iterator[dict]]:
+        """Итератор по записям или None, если ключа нет в кэше"""
+        path = self.entry_path(key)
+        try:
+            f = gzip.open(path, 'rt', encoding='utf-8')
+        except FileNotFoundError:
+            record_cache(self.name, hit=False)
+            return None
+        record_cache(self.name, hit=True)
+        # Обновляем время доступа для LRU-вытеснения
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        def records():
+            with f:
+                for line in f:
+                    yield json.loads(line)
+
+        return records()
+
+    def discard(self, key: str):
+        """Удаление записи (например, повреждённой); отсутствующая запись - не ошибка"""
+        try:
+            os.remove(self.entry_path(key))
+        except FileNotFoundError:
+            pass
+
+    def open_writer(self, key: str) -> _CacheWriter:
+        return _CacheWriter(self, key)
+
+    def put(self, key: str, records: Iterable[dict]):
+        with self.open_writer(key) as writer:
+            for record in records:
+                writer.write(record)
+
+    def evict(self):
+        """Удаляет давно не использованные записи, пока кэш не уложится в лимит"""
+        with self._evict_lock:
+            entries = []
+            total = 0
+            if not os.path.isdir(self.directory):
+                return
+            for name in os.listdir(self.directory):
+                if not name.endswith('.jsonl.gz'):
+                    continue
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.unlink(path)
+                    total -= size
+                    logger.info(f"Кэш: удалена запись {os.path.basename(path)}")
+                except FileNotFoundError:
+                    continue
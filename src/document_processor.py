@@ -9,11 +9,92 @@ from langchain_community.document_loaders import (
     UnstructuredHTMLLoader,  # Для HTML файлов
     UnstructuredMarkdownLoader  # Для Markdown файлов
 )
-from typing import List
+from typing import Iterator, List, Optional
+from src.disk_cache import DiskCache, file_sha256
+from src.fast_loaders import FastTextLoader, FastHTMLLoader, FastMarkdownLoader
+from config.settings import settings
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Версия формата записей кэша: увеличивается при изменении структуры чанков
+# (2 - чанки хранят start_index для склейки при сжатии контекста)
+CACHE_FORMAT_VERSION = 2
+
+# Кэш распарсенных документов и чанков по хэшу содержимого файла
+document_cache = DiskCache(settings.DOCUMENT_CACHE_DIR, settings.DOCUMENT_CACHE_MAX_MB * 1024 * 1024)
+
+def get_loader(file_path: str):
+    """Выбор лоадера по расширению файла.
+
+    TXT, HTML и Markdown по умолчанию загружаются быстрыми встроенными лоадерами;
+    Unstructured включается настройкой HIGH_FIDELITY_LOADERS.
+    """
+    if file_path.endswith(".pdf"):
+        return PyPDFLoader(file_path)
+    elif file_path.endswith(".txt"):
+        return FastTextLoader(file_path)
+    elif file_path.endswith(".docx"):
+        return Docx2txtLoader(file_path)
+    elif file_path.endswith(".html") or file_path.endswith(".htm"):
+        if settings.HIGH_FIDELITY_LOADERS:
+            return UnstructuredHTMLLoader(file_path)
+        return FastHTMLLoader(file_path)
+    elif file_path.endswith(".md"):
+        if settings.HIGH_FIDELITY_LOADERS:
+            return UnstructuredMarkdownLoader(file_path)
+        return FastMarkdownLoader(file_path)
+    else:
+        # fallback на TextLoader для неизвестных форматов
+        logger.warning(f"Неизвестный формат файла: {file_path}. Используется TextLoader.")
+        return TextLoader(file_path, encoding='utf-8')
+
+def _add_file_metadata(doc: Document, file_path: str) -> Document:
+    """Добавляет метаданные файла к документу"""
+    doc.metadata["source_file"] = os.path.basename(file_path)
+    doc.metadata["file_type"] = file_path.split('.')[-1].upper()
+    return doc
+
+def document_cache_key(file_path: str, loader_name: str, chunk_size: int, chunk_overlap: int) -> Optional[str]:
+    """Ключ кэша чанков файла: (SHA-256 файла, тип лоадера, chunk_size, chunk_overlap).
+
+    Кэш используется конвейером индексации (src/ingestion_pipeline.py).
+    При отключённом кэше файл не хэшируется и возвращается None.
+    """
+    if not settings.DOCUMENT_CACHE_ENABLED:
+        return None
+    return DiskCache.make_key(CACHE_FORMAT_VERSION, file_sha256(file_path), loader_name, chunk_size, chunk_overlap)
+
+def document_to_cache_record(doc: Document) -> dict:
+    return {"c": doc.page_content, "m": doc.metadata}
+
+def _record_to_document(record: dict, file_path: str) -> Document:
+    doc = Document(page_content=record["c"], metadata=record["m"])
+    # Путь загрузки (временный файл Gradio) меняется между загрузками
+    if "source" in doc.metadata:
+        doc.metadata["source"] = file_path
+    return _add_file_metadata(doc, file_path)
+
+def get_cached_documents(cache_key: str, file_path: str) -> Optional[Iterator[Document]]:
+    """Документы из кэша или None при промахе"""
+    if not settings.DOCUMENT_CACHE_ENABLED:
+        return None
+    records = document_cache.get(cache_key)
+    if records is None:
+        return None
+    return (_record_to_document(record, file_path) for record in records)
+
+def discard_cached_documents(cache_key: str):
+    """Удаление записи кэша (повреждённой или недочитанной)"""
+    if settings.DOCUMENT_CACHE_ENABLED:
+        document_cache.discard(cache_key)
+
+def open_document_cache_writer(cache_key: str):
+    """Потоковая запись документов в кэш (None, если кэш отключён)"""
+    if not settings.DOCUMENT_CACHE_ENABLED:
+        return None
+    return document_cache.open_writer(cache_key)
+
 def load_document(file_path: str) -> List:
     """Загрузка документа различных форматов"""
     try:
@@ -27,32 +108,26 @@ def load_document(file_path: str) -> List:
         logger.info(f"Попытка загрузить файл: {file_path}")
         
         # Определяем тип файла и используем соответствующий лоадер
-        if file_path.endswith(".pdf"):
-            loader = PyPDFLoader(file_path)
-        elif file_path.endswith(".txt"):
-            loader = TextLoader(file_path, encoding='utf-8')
-        elif file_path.endswith(".docx"):
-            loader = Docx2txtLoader(file_path)
-        elif file_path.endswith(".html") or file_path.endswith(".htm"):
-            loader = UnstructuredHTMLLoader(file_path)
-        elif file_path.endswith(".md"):
-            loader = UnstructuredMarkdownLoader(file_path)
-        else:
-            # fallback на TextLoader для неизвестных форматов
-            logger.warning(f"Неизвестный формат файла: {file_path}. Используется TextLoader.")
-            loader = TextLoader(file_path, encoding='utf-8')
+        loader = get_loader(file_path)
         
         documents = loader.load()    
         # Добавляем метаданные к каждому документу
         for doc in documents:
-            doc.metadata["source_file"] = os.path.basename(file_path)
-            doc.metadata["file_type"] = file_path.split('.')[-1].upper()
-            logger.info(f"Загружено {len(documents)} документов из {file_path}")
+            _add_file_metadata(doc, file_path)
+        logger.info(f"Загружено {len(documents)} документов из {file_path}")
         return documents
     except Exception as e:
         logger.error(f"Ошибка загрузки документа {file_path}: {e}")
         raise
 
+def iter_file_documents(file_path: str, loader=None) -> Iterator[Document]:
+    """Постраничная загрузка одного файла; ошибки пробрасываются вызывающему"""
+    logger.info(f"Потоковая загрузка документа: {file_path}")
+    if loader is None:
+        loader = get_loader(file_path)
+    for doc in loader.lazy_load():
+        yield _add_file_metadata(doc, file_path)
+
 def load_multiple_documents(file_paths: List[str]) -> List:
     """Загрузка нескольких документов"""
     all_documents = []
@@ -81,13 +156,22 @@ def load_multiple_documents(file_paths: List[str]) -> List:
     logger.info(f"Всего загружено документов: {len(all_documents)}")
     return all_documents
 
+def get_text_splitter(chunk_size: int = 1000, chunk_overlap: int = 200):
+    """Сплиттер, общий для пакетного и потокового разбиения.
+
+    start_index (смещение чанка в документе) нужен для склейки соседних чанков
+    при сжатии контекста (src/context_compression.py).
+    """
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        add_start_index=True
+    )
+
 def split_documents(documents: List, chunk_size: int = 1000, chunk_overlap: int = 200) -> List:
     """Разделение документов на чанки"""
     try:
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap
-        )
+        text_splitter = get_text_splitter(chunk_size, chunk_overlap)
         texts = text_splitter.split_documents(documents)
         logger.info(f"Разделено на {len(texts)} чанков")
         return texts
@@ -103,4 +187,46 @@ def create_document_from_text(text: str, source_name: str) -> Document:
             "source_file": source_name,
             "file_type": "MEDIA"
         }
-    )
\ No newline at end of file
+    )
+
+def format_timestamp(seconds: float) -> str:
+    """Секунды -> ЧЧ:ММ:СС"""
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+def create_documents_from_transcript(transcript: dict, source_name: str, max_chars: int = 1000) -> List[Document]:
+    """Создает документы из транскрипта с временными метками.
+
+    Соседние сегменты Whisper объединяются в документы длиной до max_chars,
+    каждый документ хранит в метаданных свой временной диапазон.
+    """
+    segments = transcript.get("segments") or []
+    if not segments:
+        return [create_document_from_text(transcript["text"], source_name)]
+
+    documents = []
+    group = []
+    length = 0
+
+    def flush():
+        start, end = group[0]["start"], group[-1]["end"]
+        documents.append(Document(
+            page_content=" ".join(segment["text"] for segment in group),
+            metadata={
+                "source_file": source_name,
+                "file_type": "MEDIA",
+                "start_time": start,
+                "end_time": end,
+                "time_range": f"{format_timestamp(start)}-{format_timestamp(end)}"
+            }
+        ))
+
+    for segment in segments:
+        if group and length + len(segment["text"]) + 1 > max_chars:
+            flush()
+            group, length = [], 0
+        group.append(segment)
+        length += len(segment["text"]) + 1
+    if group:
+        flush()
+    return documents
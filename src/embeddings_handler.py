@@ -1,19 +1,29 @@
 # src/embeddings_handler.py
 from langchain_openai import OpenAIEmbeddings
-from langchain_community.embeddings import HuggingFaceEmbeddings # Используется устаревший класс, но пусть пока работает
 from config.settings import settings
 import logging
-import torch
+import threading
 
 logger = logging.getLogger(__name__)
 
+# Embeddings создаются (и проверяются сетевым запросом) один раз на процесс
+_embeddings = None
+_embeddings_lock = threading.Lock()
+
 def get_embeddings():
-    """Получение embeddings модели с fallback на локальные"""
+    """Получение embeddings модели (инициализируется при первом обращении)"""
+    global _embeddings
+    with _embeddings_lock:
+        if _embeddings is None:
+            _embeddings = _create_embeddings()
+        return _embeddings
+
+def _create_embeddings():
+    """Создание embeddings модели с fallback на локальные"""
     try:
         # Сначала пробуем OpenAI embeddings через OpenRouter
-        # Исправлено: убран лишний пробел в URL
         embeddings = OpenAIEmbeddings(
-            base_url="https://openrouter.ai/api/v1", # Убран лишний пробел
+            base_url=settings.OPENROUTER_BASE_URL,
             api_key=settings.OPENROUTER_API_KEY,
             model="text-embedding-ada-002"
         )
@@ -30,6 +40,10 @@ def get_embeddings():
         logger.warning(f"Не удалось использовать OpenAI embeddings: {e}")
         # fallback на локальные embeddings
         try:
+            # Тяжёлые зависимости импортируются только при переходе на локальные embeddings
+            import torch
+            from langchain_community.embeddings import HuggingFaceEmbeddings # Используется устаревший класс, но пусть пока работает
+
             # Определяем устройство для PyTorch
             device = "cuda" if torch.cuda.is_available() else "cpu"
             if device == "cuda":
@@ -1,7 +1,11 @@
 # src/export_handler.py
 from datetime import datetime
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from itertools import islice
+from xml.sax.saxutils import escape
 from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Frame, PageTemplate
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib import colors
 from reportlab.pdfbase import pdfmetrics
@@ -9,153 +13,209 @@ from reportlab.pdfbase.ttfonts import TTFont
 import json
 import os
 import logging
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from config.settings import settings
 
 # Настройка логгера
 logger = logging.getLogger(__name__)
 
-def export_chat_to_pdf(chat_history, model_name, filename=None, export_dir=None):
-    """Экспорт истории чата в PDF с поддержкой кириллицы"""
+# Число flowable-элементов в одном пакете сборки PDF (порядка одной-двух страниц)
+PDF_BATCH_FLOWABLES = 50
+
+# Фоновый исполнитель для сборки PDF, чтобы не блокировать обработчик запроса;
+# PDF_EXPORT_WORKERS экспортов собираются одновременно
+_pdf_executor = ThreadPoolExecutor(max_workers=max(1, settings.PDF_EXPORT_WORKERS), thread_name_prefix="pdf-export")
+
+
+def pair_chat_history(messages: Iterable[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """История [(role, content), ...] -> пары (вопрос, ответ); вопрос без ответа - с пустым ответом"""
+    pairs = []
+    for role, content in messages:
+        if role == "user":
+            pairs.append((content, ""))
+        elif role == "assistant" and pairs and not pairs[-1][1]:
+            pairs[-1] = (pairs[-1][0], content)
+        # Ответ без вопроса (первый или повторный) пропускаем
+    return pairs
+
+
+@lru_cache(maxsize=None)
+def get_pdf_fonts() -> Tuple[str, str]:
+    """Регистрация шрифтов с кириллицей (один раз на процесс); возвращает (обычный, жирный)"""
+    # Регистрируем шрифты DejaVu (гарантированная поддержка кириллицы)
     try:
-        if not filename:
-            filename = f"chat_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+        # Путь к шрифтам в проекте
+        font_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'fonts')
+        font_path = os.path.join(font_dir, 'DejaVuSans.ttf')
+        font_bold_path = os.path.join(font_dir, 'DejaVuSans-Bold.ttf')
 
-        # Если указана директория экспорта и она существует
-        # Создаем полный путь к файлу
-        full_filepath = filename
-        if export_dir and os.path.exists(export_dir):
-            full_filepath = os.path.join(export_dir, filename)
+        if os.path.exists(font_path) and os.path.exists(font_bold_path):
+            pdfmetrics.registerFont(TTFont('DejaVu', font_path))
+            pdfmetrics.registerFont(TTFont('DejaVu-Bold', font_bold_path))
+            logger.info("Используются шрифты DejaVu")
+            return 'DejaVu', 'DejaVu-Bold'
+        # fallback на системные шрифты
+        raise FileNotFoundError("Шрифты DejaVu не найдены в проекте")
+    except Exception as e:
+        logger.warning(f"Не удалось загрузить шрифты DejaVu: {e}")
 
-        # Создаем PDF документ
-        doc = SimpleDocTemplate(full_filepath, pagesize=A4, 
-                               leftMargin=50, rightMargin=50, 
-                               topMargin=50, bottomMargin=50)
-        
-        # Регистрируем шрифты DejaVu (гарантированная поддержка кириллицы)
-        try:
-            # Путь к шрифтам в проекте
-            font_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'fonts')
-            font_path = os.path.join(font_dir, 'DejaVuSans.ttf')
-            font_bold_path = os.path.join(font_dir, 'DejaVuSans-Bold.ttf')
-            
-            if os.path.exists(font_path) and os.path.exists(font_bold_path):
-                pdfmetrics.registerFont(TTFont('DejaVu', font_path))
-                pdfmetrics.registerFont(TTFont('DejaVu-Bold', font_bold_path))
-                font_name = 'DejaVu'
-                font_bold_name = 'DejaVu-Bold'
-                logger.info("Используются шрифты DejaVu")
-            else:
-                # fallback на системные шрифты
-                raise FileNotFoundError("Шрифты DejaVu не найдены в проекте")
-        except Exception as e:
-            logger.warning(f"Не удалось загрузить шрифты DejaVu: {e}")
-            # Пробуем системные шрифты
-            try:
-                calibri_path = os.path.join("C:", "Windows", "Fonts", "calibri.ttf")
-                calibri_bold_path = os.path.join("C:", "Windows", "Fonts", "calibrib.ttf")
-                
-                if os.path.exists(calibri_path) and os.path.exists(calibri_bold_path):
-                    pdfmetrics.registerFont(TTFont('Calibri', calibri_path))
-                    pdfmetrics.registerFont(TTFont('Calibri-Bold', calibri_bold_path))
-                    font_name = 'Calibri'
-                    font_bold_name = 'Calibri-Bold'
-                else:
-                    # Если Calibri нет, пробуем Arial
-                    arial_path = os.path.join("C:", "Windows", "Fonts", "arial.ttf")
-                    arial_bold_path = os.path.join("C:", "Windows", "Fonts", "arialbd.ttf")
-                    
-                    if os.path.exists(arial_path) and os.path.exists(arial_bold_path):
-                        pdfmetrics.registerFont(TTFont('Arial', arial_path))
-                        pdfmetrics.registerFont(TTFont('Arial-Bold', arial_bold_path))
-                        font_name = 'Arial'
-                        font_bold_name = 'Arial-Bold'
-                    else:
-                        # Если системных шрифтов нет, используем встроенные (с ограничениями)
-                        font_name = 'Helvetica'
-                        font_bold_name = 'Helvetica-Bold'
-                        logger.warning("Системные шрифты не найдены. Используются встроенные шрифты (кириллица может отображаться некорректно).")
-            except Exception as e2:
-                logger.warning(f"Не удалось загрузить системные шрифты: {e2}")
-                font_name = 'Helvetica'
-                font_bold_name = 'Helvetica-Bold'
-        
-        # Создаем стили с поддержкой кириллицы
-        title_style = ParagraphStyle(
+    # Пробуем системные шрифты: Calibri, затем Arial
+    try:
+        for name, regular, bold in (("Calibri", "calibri.ttf", "calibrib.ttf"), ("Arial", "arial.ttf", "arialbd.ttf")):
+            regular_path = os.path.join("C:", "Windows", "Fonts", regular)
+            bold_path = os.path.join("C:", "Windows", "Fonts", bold)
+            if os.path.exists(regular_path) and os.path.exists(bold_path):
+                pdfmetrics.registerFont(TTFont(name, regular_path))
+                pdfmetrics.registerFont(TTFont(f'{name}-Bold', bold_path))
+                return name, f'{name}-Bold'
+        # Если системных шрифтов нет, используем встроенные (с ограничениями)
+        logger.warning("Системные шрифты не найдены. Используются встроенные шрифты (кириллица может отображаться некорректно).")
+    except Exception as e2:
+        logger.warning(f"Не удалось загрузить системные шрифты: {e2}")
+    return 'Helvetica', 'Helvetica-Bold'
+
+
+@lru_cache(maxsize=None)
+def get_pdf_styles() -> Dict[str, ParagraphStyle]:
+    """Стили документа с поддержкой кириллицы (создаются один раз)"""
+    font_name, font_bold_name = get_pdf_fonts()
+    return {
+        "title": ParagraphStyle(
             'CustomTitle',
             fontName=font_bold_name,
             fontSize=18,
             spaceAfter=30,
             alignment=1,  # Центрирование
             textColor=colors.black
-        )
-        
-        metadata_style = ParagraphStyle(
+        ),
+        "metadata": ParagraphStyle(
             'Metadata',
             fontName=font_name,
             fontSize=10,
             spaceAfter=20,
             textColor=colors.gray
-        )
-        
-        user_label_style = ParagraphStyle(
+        ),
+        "user_label": ParagraphStyle(
             'UserLabel',
             fontName=font_bold_name,
             fontSize=12,
             spaceAfter=6,
             textColor=colors.blue
-        )
-        
-        assistant_label_style = ParagraphStyle(
+        ),
+        "assistant_label": ParagraphStyle(
             'AssistantLabel',
             fontName=font_bold_name,
             fontSize=12,
             spaceAfter=6,
             textColor=colors.green
-        )
-        
-        message_style = ParagraphStyle(
+        ),
+        "message": ParagraphStyle(
             'Message',
             fontName=font_name,
             fontSize=11,
             spaceAfter=15,
             textColor=colors.black
-        )
-        
-        # Создаем содержимое
-        story = []
-        
-        # Заголовок
-        title = Paragraph("История чата RAG Chatbot", title_style)
-        story.append(title)
-        
-        # Метаданные
-        metadata_text = (
-            f"<b>Модель:</b> {model_name or 'Не выбрана'}<br/>"
-            f"<b>Дата экспорта:</b> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-        )
-        metadata = Paragraph(metadata_text, metadata_style)
-        story.append(metadata)
-        story.append(Spacer(1, 20))
-        
-        # Сообщения чата
-        for user_msg, ai_msg in chat_history:
-            # Сообщение пользователя
-            user_label = Paragraph("Пользователь:", user_label_style)
-            story.append(user_label)
-            user_message = Paragraph(user_msg.replace('\n', '<br/>'), message_style)
-            story.append(user_message)
-            
-            # Ответ ассистента
-            assistant_label = Paragraph("Ассистент:", assistant_label_style)
-            story.append(assistant_label)
-            assistant_message = Paragraph(ai_msg.replace('\n', '<br/>'), message_style)
-            story.append(assistant_message)
-            
-            # Разделитель между сообщениями
-            story.append(Spacer(1, 15))
-        
-        # Сохраняем PDF
-        doc.build(story)
-        logger.info(f"Чат экспортирован в PDF: {full_filepath}")
+        ),
+    }
+
+
+def _message_paragraph(text: str, style: ParagraphStyle) -> Paragraph:
+    # Экранируем разметку, чтобы '<' и '&' в сообщениях не ломали сборку
+    return Paragraph(escape(text or "").replace('\n', '<br/>'), style)
+
+
+def iter_chat_flowables(chat_history: Iterable, model_name) -> Iterator:
+    """Ленивая генерация содержимого PDF: заголовок, метаданные, пары (вопрос, ответ)"""
+    styles = get_pdf_styles()
+
+    # Заголовок
+    yield Paragraph("История чата RAG Chatbot", styles["title"])
+
+    # Метаданные
+    metadata_text = (
+        f"<b>Модель:</b> {escape(model_name or 'Не выбрана')}<br/>"
+        f"<b>Дата экспорта:</b> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+    )
+    yield Paragraph(metadata_text, styles["metadata"])
+    yield Spacer(1, 20)
+
+    # Сообщения чата
+    for user_msg, ai_msg in chat_history:
+        # Сообщение пользователя
+        yield Paragraph("Пользователь:", styles["user_label"])
+        yield _message_paragraph(user_msg, styles["message"])
+
+        # Ответ ассистента
+        yield Paragraph("Ассистент:", styles["assistant_label"])
+        yield _message_paragraph(ai_msg, styles["message"])
+
+        # Разделитель между сообщениями
+        yield Spacer(1, 15)
+
+
+class StreamingDocTemplate(SimpleDocTemplate):
+    """SimpleDocTemplate, собирающий документ пакетами из итератора.
+
+    В отличие от build(), не требует списка всех элементов сразу: в памяти
+    находится только текущий пакет из batch_size элементов.
+    """
+
+    def build_stream(self, flowables: Iterable, batch_size: int = PDF_BATCH_FLOWABLES):
+        self._calc()
+        frame = Frame(self.leftMargin, self.bottomMargin, self.width, self.height, id='normal')
+        self.addPageTemplates([
+            PageTemplate(id='First', frames=frame, pagesize=self.pagesize),
+            PageTemplate(id='Later', frames=frame, pagesize=self.pagesize),
+        ])
+        self._startBuild()
+        canv = self.canv
+        canv._doctemplate = self
+        try:
+            iterator = iter(flowables)
+            while True:
+                batch = list(islice(iterator, batch_size))
+                if not batch:
+                    break
+                # handle_flowable забирает элементы из начала списка (и дописывает туда
+                # продолжения разбитых по страницам абзацев)
+                while batch:
+                    self.clean_hanging()
+                    self.handle_flowable(batch)
+        finally:
+            del canv._doctemplate
+        self._endBuild()
+
+
+def render_chat_pdf(chat_history: Iterable, model_name, full_filepath: str) -> str:
+    """Сборка PDF истории чата; возвращает путь к файлу (исключение при ошибке)"""
+    # Создаем PDF документ
+    doc = StreamingDocTemplate(full_filepath, pagesize=A4,
+                               leftMargin=50, rightMargin=50,
+                               topMargin=50, bottomMargin=50)
+    doc.build_stream(iter_chat_flowables(chat_history, model_name))
+    logger.info(f"Чат экспортирован в PDF: {full_filepath}")
+    return full_filepath
+
+
+def submit_pdf_export(chat_history: Iterable, model_name, full_filepath: str) -> Future:
+    """Сборка PDF в фоновом потоке; Future возвращает путь к файлу"""
+    return _pdf_executor.submit(render_chat_pdf, chat_history, model_name, full_filepath)
+
+
+def export_chat_to_pdf(chat_history, model_name, filename=None, export_dir=None):
+    """Экспорт истории чата в PDF с поддержкой кириллицы"""
+    try:
+        if not filename:
+            filename = f"chat_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+
+        # Если указана директория экспорта и она существует
+        # Создаем полный путь к файлу
+        full_filepath = filename
+        if export_dir and os.path.exists(export_dir):
+            full_filepath = os.path.join(export_dir, filename)
+
+        render_chat_pdf(chat_history, model_name, full_filepath)
         return f"✅ Чат экспортирован в {full_filepath}"
     
     except Exception as e:
@@ -192,4 +252,83 @@ def export_chat_to_json(chat_history, model_name, filename=None, export_dir=None
     except Exception as e:
         error_msg = f"❌ Ошибка экспорта в JSON: {str(e)}"
         logger.error(error_msg)
-        return error_msg
\ No newline at end of file
+        return error_msg
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _message_record(row: Dict) -> Dict:
+    """Сообщение из строки БД в вид для экспорта"""
+    created_at = row.get("created_at")
+    return {
+        "role": row["role"],
+        "content": row["content"],
+        "created_at": created_at.isoformat() if created_at else None,
+    }
+
+
+def write_messages_json(rows: Iterable[Dict], f, header: Dict) -> int:
+    """Инкрементальная запись сообщений в JSON, сгруппированных по сессиям.
+
+    rows должны идти подряд по session_id; в памяти держится только
+    текущая строка. Возвращает число записанных сообщений.
+    """
+    f.write('{\n')
+    for key, value in header.items():
+        f.write(f'  {_dumps(key)}: {_dumps(value)},\n')
+    f.write('  "sessions": [')
+    current_session = None
+    count = 0
+    for row in rows:
+        if row["session_id"] != current_session:
+            if current_session is not None:
+                f.write('\n      ]\n    },')
+            current_session = row["session_id"]
+            f.write(f'\n    {{\n      "session_id": {_dumps(current_session)},\n'
+                    f'      "session_name": {_dumps(row["session_name"])},\n'
+                    f'      "messages": [\n        ')
+        else:
+            f.write(',\n        ')
+        f.write(_dumps(_message_record(row)))
+        count += 1
+    if current_session is not None:
+        f.write('\n      ]\n    }\n  ')
+    f.write(']\n}\n')
+    return count
+
+
+def write_messages_jsonl(rows: Iterable[Dict], f) -> int:
+    """Запись сообщений в JSONL: одна строка на сообщение, с данными сессии"""
+    count = 0
+    for row in rows:
+        record = {"session_id": row["session_id"], "session_name": row["session_name"]}
+        record.update(_message_record(row))
+        f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        count += 1
+    return count
+
+
+def export_messages_stream(rows: Iterable[Dict], filename: str, fmt: str = "json", header: Dict = None) -> int:
+    """Потоковый экспорт сообщений из БД в JSON/JSONL.
+
+    Файл пишется во временный и переименовывается по завершении, так что
+    прерванный экспорт не оставляет обрезанного файла. Возвращает число сообщений.
+    """
+    tmp_path = filename + ".tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            if fmt == "jsonl":
+                count = write_messages_jsonl(rows, f)
+            else:
+                header = dict(header or {})
+                header.setdefault("timestamp", datetime.now().isoformat())
+                count = write_messages_json(rows, f, header)
+        os.replace(tmp_path, filename)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    logger.info(f"Экспортировано сообщений: {count} -> {filename}")
+    return count
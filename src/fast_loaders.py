@@ -0,0 +1,146 @@
+# src/fast_loaders.py
+import re
+from html.parser import HTMLParser
+from typing import Iterator
+from langchain.docstore.document import Document
+from langchain_core.document_loaders import BaseLoader
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Кодировки, которые пробуем по очереди для текстовых файлов
+TEXT_ENCODINGS = ("utf-8", "utf-8-sig", "cp1251")
+
+
+def read_text_file(file_path: str) -> str:
+    """Чтение текстового файла с подбором кодировки"""
+    with open(file_path, 'rb') as f:
+        raw = f.read()
+    for encoding in TEXT_ENCODINGS:
+        try:
+            return raw.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    logger.warning(f"Не удалось определить кодировку {file_path}, недопустимые символы заменены")
+    return raw.decode('utf-8', errors='replace')
+
+
+def _normalize_whitespace(text: str) -> str:
+    """Схлопывает пробелы внутри строк и пустые строки подряд"""
+    lines = [re.sub(r'[ \t ]+', ' ', line).strip() for line in text.splitlines()]
+    text = '\n'.join(lines)
+    return re.sub(r'\n{3,}', '\n\n', text).strip()
+
+
+class _HTMLTextExtractor(HTMLParser):
+    """Извлечение видимого текста из HTML с сохранением границ блоков"""
+
+    SKIP_TAGS = {"script", "style", "noscript", "template", "svg", "head"}
+    BLOCK_TAGS = {
+        "p", "div", "br", "li", "ul", "ol", "tr", "table", "section", "article",
+        "header", "footer", "main", "aside", "nav", "blockquote", "pre", "hr",
+        "h1", "h2", "h3", "h4", "h5", "h6", "dt", "dd", "figcaption", "title",
+    }
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.title_parts = []
+        self._skip_depth = 0
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "title":
+            self._in_title = True
+        elif tag in self.SKIP_TAGS:
+            self._skip_depth += 1
+        if tag in self.BLOCK_TAGS:
+            self.parts.append('\n')
+        elif tag in ("td", "th"):
+            self.parts.append(' ')
+
+    def handle_endtag(self, tag):
+        if tag == "title":
+            self._in_title = False
+        elif tag in self.SKIP_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+        if tag in self.BLOCK_TAGS:
+            self.parts.append('\n')
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title_parts.append(data)
+        elif not self._skip_depth:
+            self.parts.append(data)
+
+
+def html_to_text(html: str):
+    """Возвращает (текст, заголовок) HTML-документа"""
+    parser = _HTMLTextExtractor()
+    parser.feed(html)
+    parser.close()
+    title = _normalize_whitespace(''.join(parser.title_parts))
+    return _normalize_whitespace(''.join(parser.parts)), title
+
+
+_MD_PATTERNS = [
+    (re.compile(r'^\s{0,3}(```|~~~).*$', re.MULTILINE), ''),          # ограждения блоков кода
+    (re.compile(r'<!--.*?-->', re.DOTALL), ''),                       # HTML-комментарии
+    (re.compile(r'!\[([^\]]*)\]\([^)]*\)'), r'\1'),                   # изображения -> alt
+    (re.compile(r'\[([^\]]+)\]\([^)]*\)'), r'\1'),                    # ссылки -> текст
+    (re.compile(r'^\s*\[[^\]]+\]:\s+\S+.*$', re.MULTILINE), ''),      # определения ссылок
+    (re.compile(r'<[^>\n]+>'), ''),                                   # встроенные HTML-теги
+    (re.compile(r'^\s{0,3}#{1,6}\s*', re.MULTILINE), ''),             # заголовки
+    (re.compile(r'^\s{0,3}>\s?', re.MULTILINE), ''),                  # цитаты
+    (re.compile(r'^\s*([-*_])(\s*\1){2,}\s*$', re.MULTILINE), ''),    # горизонтальные линии
+    (re.compile(r'^\s*[-*+]\s+', re.MULTILINE), '- '),                # маркеры списков
+    (re.compile(r'^\s*\|?\s*:?-{3,}:?\s*(\|\s*:?-{3,}:?\s*)*\|?\s*$', re.MULTILINE), ''),  # разделители таблиц
+    (re.compile(r'\|'), ' '),                                         # ячейки таблиц
+    (re.compile(r'(\*\*|__)(.+?)\1'), r'\2'),                         # жирный
+    (re.compile(r'(?<![\w*])([*_])(?!\s)(.+?)(?<!\s)\1(?![\w*])'), r'\2'),  # курсив
+    (re.compile(r'~~(.+?)~~'), r'\1'),                                # зачёркнутый
+    (re.compile(r'`([^`]+)`'), r'\1'),                                # встроенный код
+]
+
+
+def markdown_to_text(markdown_text: str) -> str:
+    """Лёгкое преобразование Markdown в простой текст"""
+    text = markdown_text
+    for pattern, replacement in _MD_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return _normalize_whitespace(text)
+
+
+class FastTextLoader(BaseLoader):
+    """Загрузчик TXT с подбором кодировки (utf-8 / cp1251)"""
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+
+    def lazy_load(self) -> Iterator[Document]:
+        yield Document(page_content=read_text_file(self.file_path), metadata={"source": self.file_path})
+
+
+class FastHTMLLoader(BaseLoader):
+    """Загрузчик HTML на stdlib html.parser (без стека unstructured)"""
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+
+    def lazy_load(self) -> Iterator[Document]:
+        text, title = html_to_text(read_text_file(self.file_path))
+        metadata = {"source": self.file_path}
+        if title:
+            metadata["title"] = title
+        yield Document(page_content=text, metadata=metadata)
+
+
+class FastMarkdownLoader(BaseLoader):
+    """Загрузчик Markdown с лёгким преобразованием в текст"""
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+
+    def lazy_load(self) -> Iterator[Document]:
+        text = markdown_to_text(read_text_file(self.file_path))
+        yield Document(page_content=text, metadata={"source": self.file_path})
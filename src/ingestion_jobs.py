@@ -0,0 +1,164 @@
+# src/ingestion_jobs.py
+import os
+import time
+import shutil
+import tempfile
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from src.database import db_manager
+from src.ingestion_pipeline import PipelineCancelled
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Стадии обработки, по которым ведётся прогресс
+STAGES = ("parsing", "transcription", "embedding", "indexing")
+
+
+class JobCancelled(PipelineCancelled):
+    """Задача индексации отменена пользователем"""
+
+
+class JobReporter:
+    """Передаёт прогресс задачи в БД и сообщает об отмене"""
+
+    def __init__(self, job_id: int, cancel_event: threading.Event, min_interval: float = 1.0):
+        self.job_id = job_id
+        self.cancel_event = cancel_event
+        self.min_interval = min_interval
+        self.progress = {stage: 0 for stage in STAGES}
+        self.stage = None
+        self._last_flush = 0.0
+        self._lock = threading.Lock()
+
+    def update(self, stage: str, count: int):
+        """Обновление счётчика стадии (запись в БД не чаще min_interval)"""
+        with self._lock:
+            self.stage = stage
+            self.progress[stage] = count
+            now = time.monotonic()
+            if now - self._last_flush < self.min_interval:
+                return
+            self._last_flush = now
+            progress = dict(self.progress)
+        try:
+            db_manager.update_ingestion_job(self.job_id, stage=stage, progress=progress)
+        except Exception as e:
+            logger.warning(f"Не удалось обновить прогресс задачи {self.job_id}: {e}")
+
+    def check_cancelled(self):
+        """Выбрасывает JobCancelled, если задача отменена"""
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+
+
+class IngestionJobManager:
+    """Очередь фоновых задач индексации с локальным пулом исполнителей.
+
+    runner(file_paths, reporter) выполняет саму обработку и возвращает
+    итоговое сообщение; отмена проверяется через reporter.cancel_event.
+    """
+
+    def __init__(self, runner: Callable, max_workers: int = settings.INGEST_WORKERS):
+        self.runner = runner
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest-job")
+        self._cancel_events: Dict[int, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, user_id: int, file_paths: List[str]) -> int:
+        """Постановка задачи в очередь; возвращает ID задачи.
+
+        Файлы копируются в собственный каталог задачи: временные файлы Gradio
+        удаляются, и задача, возобновлённая после перезапуска, их бы не нашла.
+        """
+        os.makedirs(settings.INGEST_UPLOAD_DIR, exist_ok=True)
+        job_dir = tempfile.mkdtemp(prefix="job-", dir=settings.INGEST_UPLOAD_DIR)
+        try:
+            stored_paths = [self._store_upload(path, job_dir, i) for i, path in enumerate(file_paths)]
+            job_id = db_manager.create_ingestion_job(user_id, stored_paths)
+        except Exception:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise
+        self._enqueue(job_id, stored_paths)
+        return job_id
+
+    @staticmethod
+    def _store_upload(path: str, job_dir: str, index: int) -> str:
+        """Копия загруженного файла в каталоге задачи (имя сохраняется для метаданных источника)"""
+        target = os.path.join(job_dir, os.path.basename(path))
+        if os.path.exists(target):
+            target = os.path.join(job_dir, f"{index}_{os.path.basename(path)}")
+        shutil.copyfile(path, target)
+        return target
+
+    @staticmethod
+    def _remove_uploads(file_paths: List[str]):
+        """Удаление каталога задачи с копиями файлов после её завершения"""
+        upload_root = os.path.abspath(settings.INGEST_UPLOAD_DIR)
+        for job_dir in {os.path.dirname(os.path.abspath(path)) for path in file_paths}:
+            if os.path.dirname(job_dir) == upload_root:
+                shutil.rmtree(job_dir, ignore_errors=True)
+
+    def _enqueue(self, job_id: int, file_paths: List[str]):
+        with self._lock:
+            self._cancel_events[job_id] = threading.Event()
+        self.executor.submit(self._execute, job_id, file_paths)
+
+    def cancel(self, job_id: int) -> bool:
+        """Запрос отмены задачи (выполняющейся или ожидающей в очереди)"""
+        if not db_manager.request_ingestion_job_cancel(job_id):
+            return False
+        with self._lock:
+            event = self._cancel_events.get(job_id)
+        if event:
+            event.set()
+        return True
+
+    def resume_unfinished(self) -> int:
+        """Повторная постановка задач, прерванных остановкой приложения"""
+        jobs = db_manager.get_unfinished_ingestion_jobs()
+        for job in jobs:
+            if job["cancel_requested"]:
+                db_manager.update_ingestion_job(job["id"], status="cancelled", finished_at=datetime.now())
+                self._remove_uploads(job["files"])
+                continue
+            db_manager.update_ingestion_job(job["id"], status="queued", message="Возобновлена после перезапуска")
+            self._enqueue(job["id"], job["files"])
+        if jobs:
+            logger.info(f"Возобновлено задач индексации: {len(jobs)}")
+        return len(jobs)
+
+    def _execute(self, job_id: int, file_paths: List[str]):
+        with self._lock:
+            cancel_event = self._cancel_events[job_id]
+        reporter = JobReporter(job_id, cancel_event)
+        try:
+            if cancel_event.is_set():
+                raise JobCancelled()
+            db_manager.update_ingestion_job(job_id, status="running", started_at=datetime.now())
+            message = self.runner(file_paths, reporter)
+            db_manager.update_ingestion_job(
+                job_id, status="completed", stage=None, progress=reporter.progress,
+                message=message, finished_at=datetime.now()
+            )
+            logger.info(f"Задача индексации {job_id} завершена: {message}")
+        except PipelineCancelled:
+            logger.info(f"Задача индексации {job_id} отменена")
+            self._finish(job_id, status="cancelled", progress=reporter.progress, message="Отменена пользователем")
+        except Exception as e:
+            logger.error(f"Задача индексации {job_id} завершилась с ошибкой: {e}", exc_info=True)
+            self._finish(job_id, status="failed", progress=reporter.progress, message=str(e))
+        finally:
+            with self._lock:
+                self._cancel_events.pop(job_id, None)
+            self._remove_uploads(file_paths)
+
+    def _finish(self, job_id: int, **fields):
+        try:
+            db_manager.update_ingestion_job(job_id, finished_at=datetime.now(), **fields)
+        except Exception as e:
+            logger.error(f"Не удалось сохранить итог задачи индексации {job_id}: {e}")
@@ -0,0 +1,276 @@
+# src/ingestion_pipeline.py
+import os
+import json
+import zlib
+import queue
+import threading
+import time
+import logging
+from typing import Callable, Iterable, Optional
+
+from langchain.docstore.document import Document
+from src.document_processor import (
+    create_document_from_text,
+    discard_cached_documents,
+    document_cache_key,
+    document_to_cache_record,
+    get_cached_documents,
+    get_loader,
+    get_text_splitter,
+    iter_file_documents,
+    open_document_cache_writer,
+)
+from src.embeddings_handler import get_embeddings
+from src.vector_store import embed_documents_batch, add_embedded_batch
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Маркер окончания потока данных между стадиями
+_DONE = object()
+
+# Виды элементов очереди между загрузкой и разбиением
+_DOC = "doc"          # документ (страница), требующий разбиения
+_CHUNK = "chunk"      # готовый чанк из кэша
+_FILE_END = "end"     # файл загружен полностью - можно зафиксировать запись кэша
+_FILE_FAILED = "failed"  # ошибка загрузки файла - запись кэша отбрасывается
+
+
+class PipelineCancelled(Exception):
+    """Обработка остановлена: отменена извне или из-за ошибки в одной из стадий"""
+
+
+def _put(q: queue.Queue, item, stop_event: threading.Event):
+    """Кладёт элемент в ограниченную очередь, не блокируясь навсегда при остановке"""
+    while not stop_event.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            continue
+    raise PipelineCancelled()
+
+
+def _get(q: queue.Queue, stop_event: threading.Event):
+    """Берёт элемент из очереди с учётом остановки конвейера"""
+    while not stop_event.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    raise PipelineCancelled()
+
+
+def _run_stage(name: str, target: Callable, errors: list, stop_event: threading.Event) -> threading.Thread:
+    """Запуск стадии конвейера в отдельном потоке"""
+    def runner():
+        try:
+            target()
+        except PipelineCancelled:
+            stop_event.set()
+        except Exception as e:
+            logger.error(f"Ошибка в стадии конвейера '{name}': {e}", exc_info=True)
+            errors.append(e)
+            stop_event.set()
+
+    thread = threading.Thread(target=runner, name=f"ingest-{name}", daemon=True)
+    thread.start()
+    return thread
+
+
+def run_ingestion_pipeline(
+    sources: Iterable,
+    chunk_size: int = settings.CHUNK_SIZE,
+    chunk_overlap: int = settings.CHUNK_OVERLAP,
+    batch_size: int = settings.INGEST_BATCH_SIZE,
+    queue_size: int = settings.INGEST_QUEUE_SIZE,
+    on_publish: Optional[Callable] = None,
+    publish_seconds: float = settings.INGEST_PUBLISH_SECONDS,
+    publish_batches: int = settings.INGEST_PUBLISH_BATCHES,
+    embeddings=None,
+    progress: Optional[Callable] = None,
+    cancel_event: Optional[threading.Event] = None,
+):
+    """Потоковая индексация: загрузка -> разбиение -> embeddings -> индекс.
+
+    Стадии связаны ограниченными очередями, поэтому в памяти одновременно
+    находится лишь несколько пакетов чанков, независимо от объёма загрузки.
+    Чанки добавляются в новое хранилище, которое видно только вызывающему.
+    С on_publish каждые publish_seconds секунд или publish_batches пакетов
+    вызывается on_publish(vectorstore) с чанками, проиндексированными после
+    предыдущего вызова, и дальше чанки собираются в новое хранилище - так
+    документы становятся доступны для поиска постепенно. Переданное хранилище
+    конвейер больше не изменяет.
+
+    progress(stage, count) сообщает счётчики стадий 'parsing' (документов),
+    'embedding' и 'indexing' (чанков). Установка cancel_event останавливает
+    все стадии, после чего выбрасывается PipelineCancelled.
+
+    Возвращает (vectorstore, total_chunks): vectorstore - ещё не опубликованные
+    чанки (None, если таких нет).
+    """
+    if embeddings is None:
+        embeddings = get_embeddings()
+
+    stop_event = cancel_event if cancel_event is not None else threading.Event()
+    errors = []
+    counters = {"parsing": 0, "embedding": 0, "indexing": 0}
+
+    def report(stage, count):
+        counters[stage] += count
+        if progress:
+            progress(stage, counters[stage])
+    docs_queue = queue.Queue(maxsize=queue_size * batch_size)
+    chunks_queue = queue.Queue(maxsize=queue_size)
+    vectors_queue = queue.Queue(maxsize=queue_size)
+
+    def load_file(file_path):
+        loader = get_loader(file_path)
+        cache_key = document_cache_key(file_path, type(loader).__name__, chunk_size, chunk_overlap)
+        cached = get_cached_documents(cache_key, file_path)
+        if cached is not None:
+            # Запись читается целиком до отправки чанков: повреждённая (обрезанная)
+            # запись не должна оставить в индексе часть файла
+            try:
+                chunks = list(cached)
+            except (OSError, EOFError, zlib.error, json.JSONDecodeError, KeyError) as e:
+                logger.warning(f"Повреждённая запись кэша для {file_path} удалена, файл будет разобран заново: {e}")
+                discard_cached_documents(cache_key)
+                chunks = None
+            if chunks is not None:
+                # Неизменённый файл: пропускаем и парсинг, и разбиение
+                logger.info(f"Чанки для {file_path} взяты из кэша")
+                for chunk in chunks:
+                    _put(docs_queue, (_CHUNK, chunk, None), stop_event)
+                report("parsing", 1)
+                return
+        try:
+            for doc in iter_file_documents(file_path, loader):
+                _put(docs_queue, (_DOC, doc, cache_key), stop_event)
+                report("parsing", 1)
+        except PipelineCancelled:
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка при загрузке файла {file_path}: {e}", exc_info=True)
+            _put(docs_queue, (_FILE_FAILED, None, cache_key), stop_event)
+            return
+        _put(docs_queue, (_FILE_END, None, cache_key), stop_event)
+
+    def load_stage():
+        for source in sources:
+            if isinstance(source, Document):
+                # Готовый документ (например, фрагмент транскрипта с временными метками)
+                _put(docs_queue, (_DOC, source, None), stop_event)
+                report("parsing", 1)
+                continue
+            if isinstance(source, tuple) and len(source) == 2:
+                # Кортеж (текст, имя_файла) от обработки медиа
+                text, source_name = source
+                _put(docs_queue, (_DOC, create_document_from_text(text, source_name), None), stop_event)
+                report("parsing", 1)
+                continue
+            file_path = os.path.normpath(source)
+            if not os.path.exists(file_path):
+                logger.error(f"Файл не найден: {file_path}")
+                continue
+            load_file(file_path)
+        _put(docs_queue, _DONE, stop_event)
+
+    def split_stage():
+        text_splitter = get_text_splitter(chunk_size, chunk_overlap)
+        cache_writers = {}
+        batch = []
+        try:
+            while True:
+                item = _get(docs_queue, stop_event)
+                if item is _DONE:
+                    break
+                kind, doc, cache_key = item
+                if kind == _CHUNK:
+                    chunks = [doc]
+                elif kind == _DOC:
+                    chunks = text_splitter.split_documents([doc])
+                    if cache_key:
+                        if cache_key not in cache_writers:
+                            cache_writers[cache_key] = open_document_cache_writer(cache_key)
+                        writer = cache_writers[cache_key]
+                        if writer is not None:
+                            for chunk in chunks:
+                                writer.write(document_to_cache_record(chunk))
+                else:
+                    writer = cache_writers.pop(cache_key, None)
+                    if writer is not None:
+                        if kind == _FILE_END:
+                            writer.commit()
+                        else:
+                            writer.abort()
+                    continue
+
+                for chunk in chunks:
+                    batch.append(chunk)
+                    if len(batch) >= batch_size:
+                        _put(chunks_queue, batch, stop_event)
+                        batch = []
+        finally:
+            # Незавершённые записи кэша (остановка конвейера) отбрасываются
+            for writer in cache_writers.values():
+                if writer is not None:
+                    writer.abort()
+        if batch:
+            _put(chunks_queue, batch, stop_event)
+        _put(chunks_queue, _DONE, stop_event)
+
+    def embed_stage():
+        while True:
+            batch = _get(chunks_queue, stop_event)
+            if batch is _DONE:
+                break
+            vectors = embed_documents_batch(batch, embeddings)
+            report("embedding", len(batch))
+            _put(vectors_queue, (batch, vectors), stop_event)
+        _put(vectors_queue, _DONE, stop_event)
+
+    threads = [
+        _run_stage("load", load_stage, errors, stop_event),
+        _run_stage("split", split_stage, errors, stop_event),
+        _run_stage("embed", embed_stage, errors, stop_event),
+    ]
+
+    # Стадия индексации выполняется в вызывающем потоке
+    vectorstore = None
+    total_chunks = 0
+    cancelled = False
+    pending_batches = 0
+    published_at = time.monotonic()
+    try:
+        while True:
+            item = _get(vectors_queue, stop_event)
+            if item is _DONE:
+                break
+            batch, vectors = item
+            vectorstore = add_embedded_batch(vectorstore, batch, vectors, embeddings)
+            total_chunks += len(batch)
+            pending_batches += 1
+            report("indexing", len(batch))
+            logger.info(f"Проиндексировано чанков: {total_chunks}")
+            if on_publish and ((publish_batches and pending_batches >= publish_batches)
+                               or (publish_seconds and time.monotonic() - published_at >= publish_seconds)):
+                on_publish(vectorstore)
+                vectorstore = None
+                pending_batches = 0
+                published_at = time.monotonic()
+    except PipelineCancelled:
+        cancelled = True
+    except Exception:
+        stop_event.set()
+        raise
+    finally:
+        for thread in threads:
+            thread.join()
+
+    if errors:
+        raise errors[0]
+    if cancelled:
+        logger.info("Индексация отменена")
+        raise PipelineCancelled()
+    return vectorstore, total_chunks
@@ -1,26 +1,110 @@
 # src/llm_handler.py
 from langchain_openai import ChatOpenAI
 from config.settings import settings
+from typing import Dict, Iterable, Optional
+import httpx
 import logging
+import threading
 
 logger = logging.getLogger(__name__)
 
+# Общий пул HTTP-соединений для всех моделей: keep-alive сохраняет TLS-сессии
+# с OpenRouter между запросами, переключениями моделей и пользователями
+_http_client: Optional[httpx.Client] = None
+_http_async_client: Optional[httpx.AsyncClient] = None
+# Реестр клиентов LLM: {имя модели: ChatOpenAI}
+_llm_registry: Dict[str, ChatOpenAI] = {}
+_lock = threading.Lock()
+
+
+def _http_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY,
+    )
+
+
+def _http_timeout() -> httpx.Timeout:
+    return httpx.Timeout(settings.LLM_READ_TIMEOUT, connect=settings.LLM_CONNECT_TIMEOUT)
+
+
+def get_http_client() -> httpx.Client:
+    """Общий синхронный HTTP-клиент (создаётся при первом обращении)"""
+    global _http_client
+    with _lock:
+        if _http_client is None:
+            _http_client = httpx.Client(limits=_http_limits(), timeout=_http_timeout())
+        return _http_client
+
+
+def get_http_async_client() -> httpx.AsyncClient:
+    """Общий асинхронный HTTP-клиент (для astream/ainvoke)"""
+    global _http_async_client
+    with _lock:
+        if _http_async_client is None:
+            _http_async_client = httpx.AsyncClient(limits=_http_limits(), timeout=_http_timeout())
+        return _http_async_client
+
+
 def get_llm(model_name: str = None):
-    """Получение LLM модели через OpenRouter"""
+    """Получение LLM модели через OpenRouter.
+
+    Экземпляры кэшируются по имени модели и разделяют общий пул соединений,
+    поэтому повторный вызов и переключение модели ничего не стоят.
+    """
     if model_name is None:
         model_name = settings.DEFAULT_MODEL
 
-    llm = ChatOpenAI(
-        base_url="https://openrouter.ai/api/v1",
-        api_key=settings.OPENROUTER_API_KEY,
-        model=model_name,
-        temperature=settings.LLM_TEMPERATURE,
-        max_tokens=settings.LLM_MAX_TOKENS
-    )
+    llm = _llm_registry.get(model_name)
+    if llm is not None:
+        return llm
 
-    logger.info(f"LLM модель {model_name} инициализирована")
+    http_client = get_http_client()
+    http_async_client = get_http_async_client()
+    with _lock:
+        llm = _llm_registry.get(model_name)
+        if llm is None:
+            llm = ChatOpenAI(
+                base_url=settings.OPENROUTER_BASE_URL,
+                api_key=settings.OPENROUTER_API_KEY,
+                model=model_name,
+                temperature=settings.LLM_TEMPERATURE,
+                max_tokens=settings.LLM_MAX_TOKENS,
+                http_client=http_client,
+                http_async_client=http_async_client,
+            )
+            _llm_registry[model_name] = llm
+            logger.info(f"LLM модель {model_name} инициализирована")
     return llm
 
+
+def prewarm_llm_clients(model_names: Iterable[str] = None) -> int:
+    """Создание клиентов моделей и установка соединения с OpenRouter заранее.
+
+    Один лёгкий запрос к /models открывает TLS-соединение, которое остаётся
+    в пуле, так что первый вопрос пользователя не платит за handshake.
+    Возвращает число подготовленных моделей.
+    """
+    if not settings.OPENROUTER_API_KEY:
+        logger.warning("OPENROUTER_API_KEY не задан - прогрев клиентов LLM пропущен")
+        return 0
+    if model_names is None:
+        model_names = get_available_models().values()
+    model_names = list(model_names)
+    for model_name in model_names:
+        get_llm(model_name)
+    try:
+        response = get_http_client().get(
+            f"{settings.OPENROUTER_BASE_URL}/models",
+            headers={"Authorization": f"Bearer {settings.OPENROUTER_API_KEY}"},
+        )
+        logger.info(f"Соединение с OpenRouter установлено (HTTP {response.status_code})")
+    except httpx.HTTPError as e:
+        logger.warning(f"Не удалось прогреть соединение с OpenRouter: {e}")
+    return len(model_names)
+
+
 def get_available_models():
     """Получение списка доступных моделей"""
-    return settings.AVAILABLE_MODELS
\ No newline at end of file
+    return settings.AVAILABLE_MODELS
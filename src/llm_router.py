@@ -0,0 +1,207 @@
+# src/llm_router.py
+import math
+import time
+import threading
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Dict, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatResult
+
+from src.llm_handler import get_llm, get_available_models
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyTracker:
+    """Скользящая статистика задержек и состояние моделей.
+
+    Модель выводится из ротации на LLM_ROUTER_COOLDOWN секунд после
+    LLM_ROUTER_MAX_FAILURES ошибок подряд или если её p95 превышает
+    LLM_ROUTER_SLOW_P95.
+    """
+
+    MIN_SAMPLES = 5
+
+    def __init__(self, window: int, max_failures: int, cooldown: float, slow_p95: float):
+        self.window = window
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self.slow_p95 = slow_p95
+        self._latencies: Dict[str, deque] = {}
+        self._failures: Dict[str, int] = {}
+        self._cooldown_until: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def record(self, model: str, latency: float):
+        """Успешный ответ модели за latency секунд"""
+        with self._lock:
+            samples = self._latencies.setdefault(model, deque(maxlen=self.window))
+            samples.append(latency)
+            self._failures[model] = 0
+            if len(samples) >= self.MIN_SAMPLES and self._percentile(samples, 95) > self.slow_p95:
+                logger.warning(f"Модель {model} медленная (p95 > {self.slow_p95} с), выведена из ротации")
+                self._cooldown_until[model] = time.monotonic() + self.cooldown
+                # После паузы статистика набирается заново
+                samples.clear()
+
+    def record_failure(self, model: str):
+        """Ошибка запроса к модели"""
+        with self._lock:
+            self._failures[model] = self._failures.get(model, 0) + 1
+            if self._failures[model] >= self.max_failures:
+                logger.warning(f"Модель {model}: {self._failures[model]} ошибок подряд, выведена из ротации")
+                self._cooldown_until[model] = time.monotonic() + self.cooldown
+                self._failures[model] = 0
+
+    def is_healthy(self, model: str) -> bool:
+        with self._lock:
+            return time.monotonic() >= self._cooldown_until.get(model, 0.0)
+
+    @staticmethod
+    def _percentile(samples, q: float) -> float:
+        # Метод ближайшего ранга
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+    def percentile(self, model: str, q: float) -> Optional[float]:
+        """q-й перцентиль задержки модели (None, если замеров нет)"""
+        with self._lock:
+            samples = self._latencies.get(model)
+            return self._percentile(samples, q) if samples else None
+
+    def stats(self) -> Dict[str, Dict]:
+        """Сводка по моделям: число замеров, p50, p95, доступность"""
+        with self._lock:
+            models = set(self._latencies) | set(self._cooldown_until)
+        return {
+            model: {
+                "samples": len(self._latencies.get(model, ())),
+                "p50": self.percentile(model, 50),
+                "p95": self.percentile(model, 95),
+                "healthy": self.is_healthy(model),
+            }
+            for model in sorted(models)
+        }
+
+
+# Статистика общая для всех маршрутизаторов процесса
+latency_tracker = LatencyTracker(
+    window=settings.LLM_ROUTER_WINDOW,
+    max_failures=settings.LLM_ROUTER_MAX_FAILURES,
+    cooldown=settings.LLM_ROUTER_COOLDOWN,
+    slow_p95=settings.LLM_ROUTER_SLOW_P95,
+)
+
+# Потоки для параллельных (хеджированных) запросов
+_hedge_executor = ThreadPoolExecutor(max_workers=settings.LLM_ROUTER_MAX_WORKERS, thread_name_prefix="llm-hedge")
+
+
+def _by_p50(model: str):
+    # Модели без замеров - после измеренных, в исходном порядке
+    p50 = latency_tracker.percentile(model, 50)
+    return (p50 is None, p50 or 0.0)
+
+
+class HedgedChatModel(BaseChatModel):
+    """Чат-модель, маршрутизирующая запросы между моделями OpenRouter.
+
+    Запрос уходит в основную модель (или в самую быструю доступную, если
+    основная выведена из ротации). Если ответа нет через hedge_delay секунд,
+    параллельно отправляется запрос в следующую модель; берётся первый
+    успешный ответ. При ошибке сразу пробуется следующая модель.
+    """
+
+    primary_model: str
+    fallback_models: List[str] = []
+    hedge_delay: float = 5.0
+    max_hedges: int = 1
+
+    @property
+    def _llm_type(self) -> str:
+        return "hedged-router"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"primary_model": self.primary_model, "fallback_models": self.fallback_models}
+
+    def candidate_models(self) -> List[str]:
+        """Порядок опроса моделей: доступные, основная первой, остальные по p50"""
+        models = [self.primary_model] + [m for m in self.fallback_models if m != self.primary_model]
+        healthy = [m for m in models if latency_tracker.is_healthy(m)]
+        if not healthy:
+            # Все модели на паузе - пробуем в исходном порядке
+            return models
+        if healthy[0] == self.primary_model:
+            return [self.primary_model] + sorted(healthy[1:], key=_by_p50)
+        return sorted(healthy, key=_by_p50)
+
+    @staticmethod
+    def _call_model(model: str, messages: List[BaseMessage], stop: Optional[List[str]], **kwargs) -> ChatResult:
+        start = time.monotonic()
+        try:
+            result = get_llm(model)._generate(messages, stop=stop, **kwargs)
+        except Exception:
+            latency_tracker.record_failure(model)
+            raise
+        latency_tracker.record(model, time.monotonic() - start)
+        result.llm_output = dict(result.llm_output or {}, routed_model=model)
+        return result
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        candidates = iter(self.candidate_models())
+        pending = {}
+        hedges = 0
+        errors = []
+
+        def launch() -> bool:
+            model = next(candidates, None)
+            if model is None:
+                return False
+            future = _hedge_executor.submit(self._call_model, model, messages, stop, **kwargs)
+            pending[future] = model
+            return True
+
+        launch()
+        while pending:
+            done, _ = wait(pending, timeout=self.hedge_delay, return_when=FIRST_COMPLETED)
+            if not done:
+                # Ответа нет дольше hedge_delay - дублируем запрос в следующую модель
+                if hedges < self.max_hedges and launch():
+                    hedges += 1
+                    logger.info(f"Хеджированный запрос: {list(pending.values())}")
+                continue
+            for future in done:
+                model = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.warning(f"Модель {model} вернула ошибку: {e}")
+                    errors.append((model, e))
+                    continue
+                if pending:
+                    # Опоздавшие запросы дорабатывают в фоне и пополняют статистику
+                    logger.info(f"Ответ получен от {model}, отменено ожидание: {list(pending.values())}")
+                return result
+            if not pending:
+                launch()
+        model, error = errors[-1] if errors else (self.primary_model, RuntimeError("Нет доступных моделей"))
+        raise RuntimeError(f"Ни одна модель не ответила (последняя ошибка {model}: {error})") from error
+
+
+def get_routed_llm(model_name: str = None) -> HedgedChatModel:
+    """Маршрутизатор с основной моделью model_name и резервными из настроек"""
+    primary = model_name or settings.DEFAULT_MODEL
+    fallbacks = settings.LLM_FALLBACK_MODELS or list(get_available_models().values())
+    return HedgedChatModel(
+        primary_model=primary,
+        fallback_models=[m for m in fallbacks if m != primary],
+        hedge_delay=settings.LLM_HEDGE_DELAY,
+        max_hedges=settings.LLM_MAX_HEDGES,
+    )
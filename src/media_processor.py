@@ -0,0 +1,384 @@
+# src/media_processor.py
+import os
+import shutil
+import tempfile
+import threading
+import subprocess
+import logging
+from src.disk_cache import DiskCache, file_sha256
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Whisper работает с моно-аудио 16 кГц
+SAMPLE_RATE = 16000
+
+AUDIO_EXTENSIONS = ['.mp3', '.wav']
+VIDEO_EXTENSIONS = ['.mp4', '.mov']
+
+# Транскрипты по хэшу содержимого: повторная загрузка записи не запускает Whisper
+transcript_cache = DiskCache(settings.TRANSCRIPT_CACHE_DIR, settings.TRANSCRIPT_CACHE_MAX_MB * 1024 * 1024)
+
+# Модели Whisper загружаются один раз при первом обращении: {(размер, устройство, int8): модель}
+_whisper_models = {}
+_whisper_lock = threading.Lock()
+
+
+def get_torch_device():
+    """Устройство PyTorch (torch импортируется только при первом обращении)"""
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def whisper_model_tag(model_size: str = None, quantize: bool = None) -> str:
+    """Идентификатор конфигурации модели, например 'base' или 'small-int8'"""
+    model_size = model_size or settings.WHISPER_MODEL_SIZE
+    if quantize is None:
+        quantize = settings.WHISPER_CPU_QUANTIZE and get_torch_device() == "cpu"
+    return f"{model_size}-int8" if quantize else model_size
+
+
+def quantize_whisper_model(model):
+    """Динамическая int8-квантизация линейных слоёв Whisper для CPU.
+
+    whisper.model.Linear - подкласс nn.Linear, который quantize_dynamic
+    не распознаёт; на CPU в fp32 он эквивалентен nn.Linear, поэтому класс
+    таких слоёв заменяется перед квантизацией.
+    """
+    import torch
+    import whisper.model
+
+    for module in model.modules():
+        if isinstance(module, whisper.model.Linear):
+            module.__class__ = torch.nn.Linear
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def get_whisper_model(model_size: str = None, quantize: bool = None):
+    """Ленивая загрузка модели Whisper (один раз на процесс для каждой конфигурации).
+
+    На CPU при WHISPER_CPU_QUANTIZE модель квантизуется в int8,
+    число потоков задаётся WHISPER_NUM_THREADS.
+    """
+    model_size = model_size or settings.WHISPER_MODEL_SIZE
+    # Определение устройства (GPU или CPU)
+    device = get_torch_device()
+    if device != "cpu":
+        quantize = False
+    elif quantize is None:
+        quantize = settings.WHISPER_CPU_QUANTIZE
+
+    key = (model_size, device, quantize)
+    with _whisper_lock:
+        if key not in _whisper_models:
+            import torch
+            import whisper
+            if device == "cpu" and settings.WHISPER_NUM_THREADS:
+                torch.set_num_threads(settings.WHISPER_NUM_THREADS)
+            logger.info(f"Whisper: загрузка модели {whisper_model_tag(model_size, quantize)}, устройство: {device}")
+            model = whisper.load_model(model_size, device=device)
+            if quantize:
+                model = quantize_whisper_model(model)
+            _whisper_models[key] = model
+        return _whisper_models[key]
+
+
+def load_audio_pcm(media_path: str, sample_rate: int = SAMPLE_RATE):
+    """Декодирование аудиодорожки файла в 16 кГц моно PCM через pipe ffmpeg.
+
+    Работает одинаково для аудио и видео: ffmpeg читает исходный файл по пути
+    и отдаёт сырые сэмплы в stdout, без промежуточных файлов и перекодирования в MP3.
+    Возвращает NumPy массив float32 в диапазоне [-1, 1].
+    """
+    import numpy as np
+
+    cmd = [
+        settings.FFMPEG_BINARY, "-nostdin", "-hide_banner", "-loglevel", "error",
+        "-i", media_path,
+        "-vn",  # видеопоток не декодируется
+        "-f", "s16le", "-acodec", "pcm_s16le",
+        "-ac", "1", "-ar", str(sample_rate),
+        "-"
+    ]
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    # communicate() читает stdout и stderr одновременно: ffmpeg не зависнет,
+    # заполнив буфер stderr, пока мы ждём конца stdout
+    pcm, stderr = process.communicate()
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg завершился с кодом {process.returncode}: {stderr.decode('utf-8', errors='ignore').strip()}")
+
+    # Хвостовой нечётный байт (обрыв потока) отбрасывается
+    usable = len(pcm) - len(pcm) % 2
+    audio = np.frombuffer(memoryview(pcm)[:usable], dtype=np.int16).astype(np.float32)
+    audio /= 32768.0
+    return audio
+
+
+def _whisper_options():
+    # fp16 на CPU не поддерживается - явно отключаем, чтобы не было предупреждений
+    options = {"fp16": get_torch_device() != "cpu"}
+    if settings.WHISPER_LANGUAGE:
+        options["language"] = settings.WHISPER_LANGUAGE
+    return options
+
+
+def _result_to_segments(result, offset: float = 0.0):
+    """Сегменты результата Whisper со сдвигом времени"""
+    return [
+        {
+            "start": round(offset + segment["start"], 2),
+            "end": round(offset + segment["end"], 2),
+            "text": segment["text"].strip(),
+        }
+        for segment in result.get("segments", [])
+        if segment["text"].strip()
+    ]
+
+
+def _transcript_from_segments(segments):
+    return {"text": " ".join(segment["text"] for segment in segments), "segments": segments}
+
+
+def transcribe_audio(audio):
+    """Преобразует аудио (путь или массив PCM 16 кГц) в текст с помощью Whisper.
+
+    Возвращает словарь {"text": ..., "segments": [{"start", "end", "text"}, ...]}
+    или None при ошибке.
+    """
+    try:
+        if not isinstance(audio, str) and _use_long_media_mode(audio):
+            return transcribe_long_audio(audio)
+        model = get_whisper_model()
+        result = model.transcribe(audio, **_whisper_options())
+        segments = _result_to_segments(result)
+        if not segments and result.get("text", "").strip():
+            return {"text": result["text"].strip(), "segments": []}
+        return _transcript_from_segments(segments)
+    except Exception as e:
+        logger.error(f"Ошибка при преобразовании аудио: {str(e)}")
+        return None
+
+
+def _use_long_media_mode(audio) -> bool:
+    """Длинные записи на CPU транскрибируются по сегментам в нескольких процессах"""
+    if len(audio) < settings.LONG_MEDIA_MIN_SECONDS * SAMPLE_RATE:
+        return False
+    return _transcribe_workers() > 1 and get_torch_device() == "cpu"
+
+
+def _transcribe_workers() -> int:
+    return settings.TRANSCRIBE_WORKERS or max(1, (os.cpu_count() or 1) // 2)
+
+
+def split_on_silence(audio, sample_rate: int = SAMPLE_RATE,
+                     max_segment_seconds: float = None, min_silence_ms: int = None,
+                     frame_ms: int = 30):
+    """Разбиение аудио на сегменты по паузам (энергетический VAD на NumPy).
+
+    Энергия считается по кадрам frame_ms; кадр считается тишиной, если его
+    уровень (дБ) ниже порога, выведенного из шумового фона записи. Разрезы
+    ставятся в середине пауз не короче min_silence_ms так, чтобы сегменты
+    не превышали max_segment_seconds. Возвращает список (начало, конец) в сэмплах;
+    сегменты из одной тишины отбрасываются.
+    """
+    import numpy as np
+
+    if max_segment_seconds is None:
+        max_segment_seconds = settings.LONG_MEDIA_SEGMENT_SECONDS
+    if min_silence_ms is None:
+        min_silence_ms = settings.LONG_MEDIA_MIN_SILENCE_MS
+
+    frame = int(sample_rate * frame_ms / 1000)
+    n_frames = len(audio) // frame
+    if n_frames == 0:
+        return [(0, len(audio))] if len(audio) else []
+
+    frames = audio[:n_frames * frame].reshape(n_frames, frame)
+    energy_db = 10 * np.log10(np.mean(frames.astype(np.float64) ** 2, axis=1) + 1e-10)
+    # Порог: шумовой фон (10-й перцентиль) + запас, но не выше уровня речи
+    noise_floor = np.percentile(energy_db, 10)
+    speech_level = np.percentile(energy_db, 90)
+    threshold = min(noise_floor + 10.0, (noise_floor + speech_level) / 2)
+    silent = energy_db < threshold
+
+    # Середины достаточно длинных пауз - кандидаты на разрез (в кадрах)
+    min_silence_frames = max(1, int(min_silence_ms / frame_ms))
+    padded = np.concatenate(([False], silent, [False])).astype(np.int8)
+    edges = np.diff(padded)
+    run_starts = np.where(edges == 1)[0]
+    run_ends = np.where(edges == -1)[0]
+    long_runs = (run_ends - run_starts) >= min_silence_frames
+    cut_candidates = ((run_starts[long_runs] + run_ends[long_runs]) // 2).tolist()
+
+    max_frames = max(1, int(max_segment_seconds * 1000 / frame_ms))
+    cuts = []
+    segment_start = 0
+    last_candidate = None
+    for candidate in cut_candidates + [n_frames]:
+        while candidate - segment_start > max_frames:
+            # Разрез по последней паузе внутри окна, иначе - принудительный
+            cut = last_candidate if last_candidate and last_candidate > segment_start else segment_start + max_frames
+            cuts.append(cut)
+            segment_start = cut
+            last_candidate = None
+        last_candidate = candidate
+    cuts.append(n_frames)
+
+    segments = []
+    start = 0
+    for cut in cuts:
+        if cut <= start:
+            continue
+        if not silent[start:cut].all():
+            end_sample = len(audio) if cut == n_frames else cut * frame
+            segments.append((start * frame, end_sample))
+        start = cut
+    return segments
+
+
+def _init_transcribe_worker(num_threads: int):
+    """Инициализация процесса-исполнителя: ограничение потоков и загрузка модели"""
+    import torch
+    get_whisper_model()
+    # Потоки делятся между процессами пула (после загрузки, т.к. она учитывает WHISPER_NUM_THREADS)
+    torch.set_num_threads(num_threads)
+
+
+def _transcribe_segment(audio_segment, offset: float):
+    """Транскрибация одного сегмента в процессе-исполнителе"""
+    model = get_whisper_model()
+    result = model.transcribe(audio_segment, **_whisper_options())
+    return _result_to_segments(result, offset)
+
+
+_transcribe_pool = None
+_transcribe_pool_lock = threading.Lock()
+
+
+def _get_transcribe_pool():
+    """Пул процессов для параллельной транскрибации (создаётся один раз)"""
+    global _transcribe_pool
+    with _transcribe_pool_lock:
+        if _transcribe_pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            workers = _transcribe_workers()
+            threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+            _transcribe_pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_transcribe_worker,
+                initargs=(threads_per_worker,)
+            )
+            logger.info(f"Пул транскрибации: {workers} процессов по {threads_per_worker} потоков")
+        return _transcribe_pool
+
+
+def transcribe_long_audio(audio, sample_rate: int = SAMPLE_RATE):
+    """Транскрибация длинной записи: разбиение по паузам и параллельная обработка сегментов.
+
+    Тексты сегментов склеиваются по порядку с абсолютными временными метками.
+    """
+    ranges = split_on_silence(audio, sample_rate)
+    logger.info(f"Длинная запись {len(audio) / sample_rate:.0f} с разбита на {len(ranges)} сегментов")
+    pool = _get_transcribe_pool()
+    futures = [
+        pool.submit(_transcribe_segment, audio[start:end], start / sample_rate)
+        for start, end in ranges
+    ]
+    segments = []
+    for future in futures:
+        segments.extend(future.result())
+    return _transcript_from_segments(segments)
+
+
+def transcript_cache_key(media_path: str) -> str:
+    """Ключ кэша транскрипта: (хэш файла, модель Whisper, язык)"""
+    return DiskCache.make_key("transcript", file_sha256(media_path), whisper_model_tag(), settings.WHISPER_LANGUAGE or "auto")
+
+
+def get_cached_transcript(cache_key: str):
+    """Транскрипт из кэша или None при промахе"""
+    if not settings.TRANSCRIPT_CACHE_ENABLED:
+        return None
+    try:
+        records = transcript_cache.get(cache_key)
+        return next(records, None) if records is not None else None
+    except Exception as e:
+        logger.warning(f"Не удалось прочитать транскрипт из кэша: {e}")
+        return None
+
+
+def cache_transcript(cache_key: str, transcript: dict):
+    """Сохранение транскрипта (текст и сегменты) в кэш"""
+    if not settings.TRANSCRIPT_CACHE_ENABLED:
+        return
+    try:
+        transcript_cache.put(cache_key, [transcript])
+    except Exception as e:
+        logger.warning(f"Не удалось сохранить транскрипт в кэш: {e}")
+
+
+def _resolve_media_path(file_obj):
+    """Путь к загруженному файлу без копирования.
+
+    Gradio и фоновые задачи передают путь (str/NamedString или объект с .name).
+    Возвращает (путь, временный_файл_для_удаления_или_None).
+    """
+    file_name = getattr(file_obj, 'name', file_obj)
+    if isinstance(file_name, str) and os.path.exists(file_name):
+        return file_name, None
+
+    # Файлоподобный объект без пути на диске: единственный случай, когда нужна копия
+    if hasattr(file_obj, 'read'):
+        logger.info("Файл не найден на диске, копирование содержимого во временный файл")
+        suffix = os.path.splitext(str(file_name))[1]
+        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_file:
+            file_obj.seek(0)
+            shutil.copyfileobj(file_obj, tmp_file)
+            return tmp_file.name, tmp_file.name
+
+    raise FileNotFoundError(f"Медиа файл не найден: {file_name}")
+
+
+def process_media_file(file_obj):
+    """Обрабатывает медиа файл и возвращает транскрипт {"text", "segments"} или None"""
+    file_name = getattr(file_obj, 'name', file_obj)
+    temp_path = None
+    try:
+        logger.info(f"Начало обработки медиа файла: {file_name}")
+        media_path, temp_path = _resolve_media_path(file_obj)
+
+        file_extension = os.path.splitext(str(file_name))[1].lower()
+        logger.info(f"Расширение файла: {file_extension}")
+
+        if file_extension not in AUDIO_EXTENSIONS + VIDEO_EXTENSIONS:
+            logger.warning(f"Неподдерживаемый формат медиа файла: {file_extension}")
+            return None
+
+        cache_key = transcript_cache_key(media_path)
+        transcript = get_cached_transcript(cache_key)
+        if transcript is not None:
+            logger.info(f"Транскрипт {file_name} взят из кэша")
+            return transcript
+
+        # Аудио и видео декодируются одинаково: ffmpeg -> PCM -> Whisper
+        audio = load_audio_pcm(media_path)
+        logger.info(f"Аудио декодировано: {len(audio) / SAMPLE_RATE:.1f} с")
+        transcript = transcribe_audio(audio)
+        if transcript and transcript["text"]:
+            logger.info(f"Медиа файл успешно транскрибирован, длина текста: {len(transcript['text'])}")
+            cache_transcript(cache_key, transcript)
+            return transcript
+        logger.warning("Транскрибирование не дало результата")
+        return None
+    except Exception as e:
+        logger.error(f"Ошибка при обработке медиа файла {file_name}: {str(e)}", exc_info=True)
+        return None
+    finally:
+        if temp_path and os.path.exists(temp_path):
+            try:
+                os.unlink(temp_path)
+                logger.info(f"Удален временный файл: {temp_path}")
+            except Exception as e:
+                logger.warning(f"Не удалось удалить временный файл: {e}")
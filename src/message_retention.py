@@ -0,0 +1,307 @@
+# src/message_retention.py
+import os
+import re
+import gzip
+import json
+import time
+import threading
+import logging
+from datetime import date, datetime
+from typing import Dict, Iterator, List, Optional
+
+from src.database import db_manager
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+PARTITION_RE = re.compile(r"^chat_messages_(\d{4})_(\d{2})$")
+DEFAULT_PARTITION = "chat_messages_default"
+
+# Обычный DETACH PARTITION берёт блокировку ACCESS EXCLUSIVE на chat_messages: ожидая её,
+# он задерживает и запись новых сообщений, поэтому ждёт не дольше DETACH_LOCK_TIMEOUT_MS
+# и повторяется DETACH_ATTEMPTS раз
+DETACH_LOCK_TIMEOUT_MS = 2000
+DETACH_ATTEMPTS = 5
+
+# Строки архива: сообщение вместе с данными сессии (сессия может быть удалена позже)
+ARCHIVE_SELECT = (
+    "SELECT m.id, m.session_id, s.session_name, s.user_id, m.role, m.content, m.created_at "
+    "FROM {table} m LEFT JOIN chat_sessions s ON s.id = m.session_id "
+)
+
+
+def shift_month(day: date, months: int) -> date:
+    """Первое число месяца, отстоящего от day на months"""
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def is_partitioned() -> bool:
+    """chat_messages секционирована (только PostgreSQL)"""
+    if db_manager.backend.name != "postgres":
+        return False
+    with db_manager.get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+                "WHERE c.relname = 'chat_messages' AND c.relnamespace = current_schema()::regnamespace"
+            )
+            return cursor.fetchone() is not None
+
+
+def ensure_partitions(months_ahead: Optional[int] = None, from_month: Optional[date] = None) -> int:
+    """Создание недостающих месячных секций; возвращает число созданных"""
+    if not is_partitioned():
+        return 0
+    with db_manager.get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT ensure_chat_messages_partitions(%s, %s)",
+                (from_month or date.today(), settings.MESSAGE_PARTITIONS_AHEAD if months_ahead is None else months_ahead)
+            )
+            created = cursor.fetchone()[0]
+        conn.commit()
+    if created:
+        logger.info(f"Создано секций chat_messages: {created}")
+    return created
+
+
+def list_partitions() -> List[Dict]:
+    """Месячные секции (в том числе отсоединённые, но ещё не удалённые) с оценкой числа строк"""
+    if db_manager.backend.name != "postgres":
+        return []
+    with db_manager.get_connection() as conn:
+        with conn.cursor() as cursor:
+            # reltuples - оценка по статистике: не требует чтения секций
+            cursor.execute(
+                "SELECT c.relname, GREATEST(c.reltuples, 0)::bigint, pg_total_relation_size(c.oid), "
+                "i.inhparent IS NOT NULL "
+                "FROM pg_class c LEFT JOIN pg_inherits i ON i.inhrelid = c.oid "
+                "WHERE c.relkind = 'r' AND c.relnamespace = current_schema()::regnamespace "
+                "AND c.relname ~ '^chat_messages_[0-9]{4}_[0-9]{2}$' ORDER BY c.relname"
+            )
+            rows = cursor.fetchall()
+    partitions = []
+    for name, estimated_rows, size_bytes, attached in rows:
+        match = PARTITION_RE.match(name)
+        partitions.append({
+            "name": name,
+            "month": date(int(match.group(1)), int(match.group(2)), 1),
+            "estimated_rows": estimated_rows,
+            "size_bytes": size_bytes,
+            "attached": attached,
+        })
+    return partitions
+
+
+def _iter_rows(query: str, params: tuple, fetch_size: int) -> Iterator[Dict]:
+    from psycopg2.extras import RealDictCursor
+
+    with db_manager.get_connection() as conn:
+        with conn.cursor(name="archive_messages", cursor_factory=RealDictCursor) as cursor:
+            cursor.itersize = fetch_size
+            cursor.execute(query, params)
+            for row in cursor:
+                yield row
+
+
+def write_archive(rows, path: str) -> int:
+    """Запись строк в gzip JSONL (через временный файл); возвращает число строк"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + ".tmp"
+    count = 0
+    try:
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            for row in rows:
+                record = dict(row)
+                if record.get("created_at"):
+                    record["created_at"] = record["created_at"].isoformat()
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                count += 1
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return count
+
+
+def _archive_path(archive_dir: str, month: date) -> str:
+    path = os.path.join(archive_dir, f"chat_messages_{month:%Y_%m}.jsonl.gz")
+    if os.path.exists(path):
+        # Повторная архивация того же месяца (например, поздние строки) не перезаписывает архив
+        path = os.path.join(archive_dir, f"chat_messages_{month:%Y_%m}_{datetime.now():%Y%m%d%H%M%S}.jsonl.gz")
+    return path
+
+
+def _can_detach_concurrently(cursor) -> bool:
+    """DETACH ... CONCURRENTLY: PostgreSQL 14+ и нет секции по умолчанию"""
+    if cursor.connection.server_version < 140000:
+        return False
+    cursor.execute("SELECT partdefid = 0 FROM pg_partitioned_table WHERE partrelid = 'chat_messages'::regclass")
+    return cursor.fetchone()[0]
+
+
+def detach_partition(name: str):
+    """Отсоединение секции от chat_messages без долгой блокировки записи.
+
+    На PostgreSQL 14+ без секции по умолчанию - DETACH PARTITION CONCURRENTLY
+    (вне транзакции; прерванное ранее отсоединение завершается FINALIZE).
+    Иначе - обычный DETACH с коротким lock_timeout и повторами.
+    """
+    with db_manager.get_connection() as conn:
+        with conn.cursor() as cursor:
+            concurrently = _can_detach_concurrently(cursor)
+        conn.rollback()
+        if concurrently:
+            # CONCURRENTLY нельзя выполнять в блоке транзакции
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT inhdetachpending FROM pg_inherits WHERE inhrelid = %s::regclass", (f'"{name}"',))
+                row = cursor.fetchone()
+                mode = "FINALIZE" if row and row[0] else "CONCURRENTLY"
+                cursor.execute(f'ALTER TABLE chat_messages DETACH PARTITION "{name}" {mode}')
+            return
+
+    import psycopg2
+
+    for attempt in range(1, DETACH_ATTEMPTS + 1):
+        try:
+            with db_manager.get_connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(f"SET LOCAL lock_timeout = {DETACH_LOCK_TIMEOUT_MS}")
+                    cursor.execute(f'ALTER TABLE chat_messages DETACH PARTITION "{name}"')
+                conn.commit()
+            return
+        except psycopg2.errors.LockNotAvailable:
+            if attempt == DETACH_ATTEMPTS:
+                raise
+            logger.warning(f"Секция {name}: chat_messages занята, повтор отсоединения ({attempt}/{DETACH_ATTEMPTS})")
+            time.sleep(attempt)
+
+
+def archive_partition(partition: Dict, archive_dir: str) -> int:
+    """Отсоединение секции, выгрузка в архив и удаление; возвращает число строк.
+
+    Если выгрузка не удалась, секция остаётся отсоединённой и будет
+    заархивирована при следующем запуске - данные не теряются.
+    """
+    name = partition["name"]
+    if partition["attached"]:
+        detach_partition(name)
+        logger.info(f"Секция {name} отсоединена")
+
+    path = _archive_path(archive_dir, partition["month"])
+    count = write_archive(
+        _iter_rows(ARCHIVE_SELECT.format(table=f'"{name}"') + "ORDER BY m.created_at, m.id", (),
+                   settings.EXPORT_FETCH_SIZE),
+        path
+    )
+    with db_manager.get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM "{name}"')
+            total = cursor.fetchone()[0]
+            if total != count:
+                raise RuntimeError(f"В архиве {count} строк из {total}, секция {name} не удалена")
+            cursor.execute(f'DROP TABLE "{name}"')
+        conn.commit()
+    if count == 0:
+        # Пустая секция: архив не нужен
+        os.remove(path)
+        logger.info(f"Пустая секция {name} удалена")
+        return 0
+    logger.info(f"Секция {name} заархивирована в {path} ({count} строк) и удалена")
+    return count
+
+
+def archive_month_range(month: date, archive_dir: str, table: str = "chat_messages") -> int:
+    """Архивация месяца построчно: несекционированная таблица (SQLite или PostgreSQL
+    до миграции) или строки секции по умолчанию, для месяца которых нет своей секции"""
+    start, end = datetime.combine(month, datetime.min.time()), datetime.combine(shift_month(month, 1), datetime.min.time())
+    condition = "WHERE m.created_at >= %s AND m.created_at < %s "
+    path = _archive_path(archive_dir, month)
+    count = write_archive(
+        _iter_rows(ARCHIVE_SELECT.format(table=table) + condition + "ORDER BY m.created_at, m.id",
+                   (start, end), settings.EXPORT_FETCH_SIZE),
+        path
+    )
+    if count == 0:
+        os.remove(path)
+        return 0
+    with db_manager.get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {table} WHERE created_at >= %s AND created_at < %s", (start, end))
+        conn.commit()
+    logger.info(f"Сообщения за {month:%Y-%m} заархивированы в {path} ({count} строк) и удалены")
+    return count
+
+
+def _oldest_message_month(table: str = "chat_messages") -> Optional[date]:
+    with db_manager.get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"SELECT MIN(created_at) FROM {table}")
+            oldest = cursor.fetchone()[0]
+    if oldest is None:
+        return None
+    if isinstance(oldest, str):  # SQLite: агрегат возвращает текст
+        oldest = datetime.fromisoformat(oldest)
+    return date(oldest.year, oldest.month, 1)
+
+
+def run_retention(keep_months: Optional[int] = None, archive_dir: Optional[str] = None) -> Dict:
+    """Одна итерация: секции вперёд, архивация месяцев старше keep_months"""
+    keep_months = settings.MESSAGE_RETENTION_MONTHS if keep_months is None else keep_months
+    archive_dir = archive_dir or settings.MESSAGE_ARCHIVE_DIR
+    summary = {"partitions_created": ensure_partitions(), "archived": {}}
+    if keep_months <= 0:
+        return summary
+
+    # Хранятся текущий месяц и keep_months - 1 предыдущих
+    cutoff = shift_month(date.today(), -(keep_months - 1))
+    if is_partitioned():
+        for partition in list_partitions():
+            if partition["month"] < cutoff:
+                summary["archived"][partition["name"]] = archive_partition(partition, archive_dir)
+        # Старые строки без своей секции (например, с датой раньше первой секции)
+        # лежат в секции по умолчанию и архивируются построчно
+        table = DEFAULT_PARTITION
+    else:
+        table = "chat_messages"
+    month = _oldest_message_month(table)
+    while month is not None and month < cutoff:
+        count = archive_month_range(month, archive_dir, table)
+        if count:
+            key = f"{month:%Y_%m}" if table == "chat_messages" else f"{table}_{month:%Y_%m}"
+            summary["archived"][key] = count
+        month = shift_month(month, 1)
+    return summary
+
+
+_retention_thread = None
+_retention_stop = threading.Event()
+
+
+def start_retention_scheduler(interval_hours: Optional[float] = None):
+    """Фоновый поток, периодически выполняющий run_retention"""
+    global _retention_thread
+    if _retention_thread is not None:
+        return _retention_thread
+    interval = (interval_hours or settings.MESSAGE_RETENTION_INTERVAL_HOURS) * 3600
+
+    def loop():
+        while not _retention_stop.is_set():
+            try:
+                summary = run_retention()
+                if summary["archived"]:
+                    logger.info(f"Архивация сообщений: {summary['archived']}")
+            except Exception as e:
+                logger.error(f"Ошибка архивации сообщений: {e}", exc_info=True)
+            _retention_stop.wait(interval)
+
+    _retention_thread = threading.Thread(target=loop, name="message-retention", daemon=True)
+    _retention_thread.start()
+    return _retention_thread
+
+
+def stop_retention_scheduler():
+    _retention_stop.set()
@@ -0,0 +1,189 @@
+# src/metrics.py
+import os
+import time
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from prometheus_client import Counter, Gauge, Histogram, make_asgi_app
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин (секунды): от миллисекунд (поиск FAISS) до минут (генерация)
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+# Стадии ответа: condense, embed_query, vector_search, context_compression, generation, save_message, chat_total
+STAGE_LATENCY = Histogram(
+    "rag_stage_duration_seconds", "Длительность стадий обработки вопроса",
+    ["stage"], buckets=LATENCY_BUCKETS,
+)
+STAGE_ERRORS = Counter("rag_stage_errors_total", "Ошибки по стадиям", ["stage"])
+LLM_TOKENS = Counter(
+    "rag_llm_tokens_total", "Токены, израсходованные на вызовы LLM",
+    ["model", "stage", "kind"],  # kind: prompt | completion | cached (часть prompt из кэша провайдера)
+)
+CACHE_REQUESTS = Counter(
+    "rag_cache_requests_total", "Обращения к кэшам",
+    ["cache", "result"],  # result: hit | miss
+)
+DB_CONNECTIONS_OPENED = Counter("rag_db_connections_opened_total", "Открыто соединений с БД")
+DB_CONNECTIONS_ACTIVE = Gauge(
+    "rag_db_connections_active", "Открытые в данный момент соединения с БД",
+    multiprocess_mode="livesum",  # сумма по живым процессам (serve.py)
+)
+DB_CONNECT_SECONDS = Histogram(
+    "rag_db_connect_duration_seconds", "Время установки соединения с БД", buckets=LATENCY_BUCKETS,
+)
+
+
+@contextmanager
+def track_stage(stage: str):
+    """Замер длительности стадии (ошибки считаются отдельно)"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.labels(stage).inc()
+        raise
+    finally:
+        STAGE_LATENCY.labels(stage).observe(time.perf_counter() - start)
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def extract_token_usage(response) -> Dict[str, Any]:
+    """Токены вызова LLM: prompt, completion, cached (прочитано из кэша префикса) и модель"""
+    llm_output = response.llm_output or {}
+    usage = llm_output.get("token_usage") or {}
+    prompt_tokens = usage.get("prompt_tokens")
+    completion_tokens = usage.get("completion_tokens")
+    cached_tokens = (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+    if not usage and response.generations and response.generations[0]:
+        # Потоковый ответ: usage приходит в метаданных сообщения
+        message = getattr(response.generations[0][0], "message", None)
+        usage_metadata = getattr(message, "usage_metadata", None) or {}
+        prompt_tokens = usage_metadata.get("input_tokens")
+        completion_tokens = usage_metadata.get("output_tokens")
+        cached_tokens = (usage_metadata.get("input_token_details") or {}).get("cache_read")
+    return {
+        "model": llm_output.get("routed_model") or llm_output.get("model_name") or "unknown",
+        "prompt": prompt_tokens or 0,
+        "completion": completion_tokens or 0,
+        "cached": cached_tokens or 0,
+    }
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """Замер вызовов LLM внутри RAG-цепочки с разделением на стадии.
+
+    Стадия определяется по предкам вызова: LLM под StuffDocumentsChain -
+    генерация ответа, остальные вызовы внутри ConversationalRetrievalChain -
+    перефразирование вопроса (condense).
+    """
+
+    GENERATION_CHAINS = {"StuffDocumentsChain"}
+
+    def __init__(self):
+        self._runs: Dict[UUID, tuple] = {}  # run_id -> (имя, parent_run_id)
+        self._llm_started: Dict[UUID, tuple] = {}  # run_id -> (стадия, время старта)
+        self._lock = threading.Lock()
+
+    def _stage_for(self, parent_run_id: Optional[UUID]) -> str:
+        run_id = parent_run_id
+        while run_id is not None:
+            name, parent = self._runs.get(run_id, (None, None))
+            if name in self.GENERATION_CHAINS:
+                return "generation"
+            run_id = parent
+        return "condense" if parent_run_id in self._runs else "llm"
+
+    def on_chain_start(self, serialized, inputs, *, run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs: Any):
+        name = kwargs.get("name") or ((serialized or {}).get("id") or [None])[-1]
+        with self._lock:
+            self._runs[run_id] = (name, parent_run_id)
+
+    def _chain_finished(self, run_id: UUID):
+        with self._lock:
+            self._runs.pop(run_id, None)
+
+    def on_chain_end(self, outputs, *, run_id: UUID, **kwargs: Any):
+        self._chain_finished(run_id)
+
+    def on_chain_error(self, error, *, run_id: UUID, **kwargs: Any):
+        self._chain_finished(run_id)
+
+    def _llm_start(self, run_id: UUID, parent_run_id: Optional[UUID]):
+        with self._lock:
+            self._llm_started[run_id] = (self._stage_for(parent_run_id), time.perf_counter())
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs: Any):
+        self._llm_start(run_id, parent_run_id)
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs: Any):
+        self._llm_start(run_id, parent_run_id)
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs: Any):
+        with self._lock:
+            stage, start = self._llm_started.pop(run_id, ("llm", None))
+        if start is not None:
+            STAGE_LATENCY.labels(stage).observe(time.perf_counter() - start)
+        llm_output = response.llm_output or {}
+        # Объединённый запрос не тратил токены - их уже учёл первый участник
+        if llm_output.get("coalesced"):
+            return
+        usage = extract_token_usage(response)
+        for kind in ("prompt", "completion", "cached"):
+            if usage[kind]:
+                LLM_TOKENS.labels(usage["model"], stage, kind).inc(usage[kind])
+
+    def on_llm_error(self, error, *, run_id: UUID, **kwargs: Any):
+        with self._lock:
+            stage, start = self._llm_started.pop(run_id, ("llm", None))
+        STAGE_ERRORS.labels(stage).inc()
+
+
+class TurnUsageCallback(BaseCallbackHandler):
+    """Сумма токенов за один ход чата (создаётся на каждый вызов цепочки)"""
+
+    def __init__(self):
+        self.prompt = 0
+        self.completion = 0
+        self.cached = 0
+        self.calls = 0
+
+    def on_llm_end(self, response, **kwargs: Any):
+        if (response.llm_output or {}).get("coalesced"):
+            return
+        usage = extract_token_usage(response)
+        self.prompt += usage["prompt"]
+        self.completion += usage["completion"]
+        self.cached += usage["cached"]
+        self.calls += 1
+
+    def summary(self) -> str:
+        share = self.cached / self.prompt if self.prompt else 0.0
+        return (f"🧮 Токены за ход: промпт {self.prompt} (из кэша {self.cached}, {share:.0%}), "
+                f"ответ {self.completion}, вызовов LLM: {self.calls}")
+
+
+# Общий обработчик для всех вызовов цепочки (состояние - по run_id)
+metrics_callback = MetricsCallbackHandler()
+
+
+def create_metrics_app():
+    """ASGI-приложение Prometheus для монтирования рядом с Gradio (/metrics).
+
+    С PROMETHEUS_MULTIPROC_DIR (его задаёт serve.py) метрики собираются со всех
+    процессов-исполнителей, а не только с процесса Gradio.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import CollectorRegistry, multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return make_asgi_app(registry)
+    return make_asgi_app()
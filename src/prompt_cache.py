@@ -0,0 +1,82 @@
+# src/prompt_cache.py
+import logging
+from typing import Any, List, Optional, Sequence
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from langchain_core.prompts import ChatPromptTemplate
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Маркер кэширования префикса (Anthropic и Gemini через OpenRouter)
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def supports_cache_control(model_name: Optional[str]) -> bool:
+    """Нужны ли явные маркеры cache_control (OpenAI, DeepSeek и др. кэшируют префикс сами)"""
+    if not settings.PROMPT_CACHE_ENABLED or not model_name:
+        return False
+    return any(model_name.startswith(prefix) for prefix in settings.PROMPT_CACHE_MODEL_PREFIXES)
+
+
+def history_to_messages(chat_history: Sequence) -> List[BaseMessage]:
+    """История [(вопрос, ответ), ...] -> сообщения чата.
+
+    Используется как get_chat_history у ConversationalRetrievalChain: старые ходы
+    не меняются между вызовами, поэтому образуют побайтно одинаковый префикс запроса.
+    Ходы без ответа (текущий вопрос, оборванный ход) пропускаются: вопрос хода
+    промпт добавляет сам, а два сообщения пользователя подряд сдвинули бы префикс.
+    """
+    messages = []
+    for turn in chat_history:
+        if isinstance(turn, BaseMessage):
+            messages.append(turn)
+            continue
+        question, answer = turn
+        if not answer:
+            continue
+        messages.append(HumanMessage(content=question))
+        messages.append(AIMessage(content=answer))
+    return messages
+
+
+def _with_cache_control(message: BaseMessage) -> BaseMessage:
+    content = message.content
+    if isinstance(content, str):
+        content = [{"type": "text", "text": content, "cache_control": CACHE_CONTROL}]
+    else:
+        content = [dict(part) for part in content]
+        if content and isinstance(content[-1], dict):
+            content[-1]["cache_control"] = CACHE_CONTROL
+    return message.model_copy(update={"content": content})
+
+
+def mark_cache_breakpoints(messages: List[BaseMessage]) -> List[BaseMessage]:
+    """Точки кэширования: конец системного сообщения и последнее сообщение истории.
+
+    Всё, что после них (контекст и вопрос текущего хода - последнее сообщение),
+    каждый раз новое; ответ прошлого хода на следующем ходе становится частью префикса.
+    """
+    breakpoints = set()
+    for index, message in enumerate(messages):
+        if isinstance(message, SystemMessage):
+            breakpoints.add(index)
+            break
+    if len(messages) > 2:
+        breakpoints.add(len(messages) - 2)
+    return [_with_cache_control(m) if i in breakpoints else m for i, m in enumerate(messages)]
+
+
+class CachedPrefixChatPromptTemplate(ChatPromptTemplate):
+    """ChatPromptTemplate, расставляющий маркеры cache_control для провайдеров, которым они нужны"""
+
+    cache_control: bool = False
+
+    def format_messages(self, **kwargs: Any) -> List[BaseMessage]:
+        messages = super().format_messages(**kwargs)
+        return mark_cache_breakpoints(messages) if self.cache_control else messages
+
+    async def aformat_messages(self, **kwargs: Any) -> List[BaseMessage]:
+        messages = await super().aformat_messages(**kwargs)
+        return mark_cache_breakpoints(messages) if self.cache_control else messages
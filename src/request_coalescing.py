@@ -0,0 +1,189 @@
+# src/request_coalescing.py
+import json
+import hashlib
+import threading
+import logging
+from typing import Any, Dict, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+
+from src.metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    """Один выполняющийся запрос к LLM и его ожидающие участники"""
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.chunks: List[ChatGenerationChunk] = []
+        self.result: Optional[ChatResult] = None
+        self.error: Optional[BaseException] = None
+        self.done = False
+
+    def add_chunk(self, chunk: ChatGenerationChunk):
+        with self.cond:
+            self.chunks.append(chunk)
+            self.cond.notify_all()
+
+    def finish(self, result: ChatResult = None, error: BaseException = None):
+        with self.cond:
+            self.result = result
+            self.error = error
+            self.done = True
+            self.cond.notify_all()
+
+    def wait(self) -> ChatResult:
+        with self.cond:
+            self.cond.wait_for(lambda: self.done)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def iter_chunks(self) -> Iterator[ChatGenerationChunk]:
+        """Все чанки с начала ответа, по мере их поступления"""
+        index = 0
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: len(self.chunks) > index or self.done)
+                new_chunks = self.chunks[index:]
+                done = self.done
+            for chunk in new_chunks:
+                yield chunk
+            index += len(new_chunks)
+            if done and index >= len(self.chunks):
+                break
+        if self.error is not None:
+            raise self.error
+
+
+# Выполняющиеся запросы: {ключ: _Flight}
+_flights: Dict[str, _Flight] = {}
+_flights_lock = threading.Lock()
+# Счётчики: запросов, реально ушедших в LLM, и присоединившихся к уже идущим
+_stats = {"leaders": 0, "coalesced": 0}
+
+
+def _join_flight(key: str):
+    """Возвращает (flight, True) для первого запроса с ключом и (flight, False) для остальных"""
+    with _flights_lock:
+        flight = _flights.get(key)
+        if flight is not None:
+            _stats["coalesced"] += 1
+            record_cache("llm_singleflight", hit=True)
+            return flight, False
+        flight = _Flight()
+        _flights[key] = flight
+        _stats["leaders"] += 1
+        record_cache("llm_singleflight", hit=False)
+        return flight, True
+
+
+def _leave_flight(key: str, flight: _Flight):
+    with _flights_lock:
+        if _flights.get(key) is flight:
+            del _flights[key]
+
+
+def get_coalescing_stats() -> Dict[str, int]:
+    """Число запросов к LLM и число объединённых с ними одинаковых запросов"""
+    with _flights_lock:
+        return dict(_stats, in_flight=len(_flights))
+
+
+def _copy_chunk(chunk: ChatGenerationChunk) -> ChatGenerationChunk:
+    # Каждый получатель получает свою копию: LangChain дописывает id и метаданные в сообщение
+    return chunk.model_copy(update={"message": chunk.message.model_copy()})
+
+
+class CoalescingChatModel(BaseChatModel):
+    """Single-flight обёртка над чат-моделью.
+
+    Одновременные запросы с одинаковыми моделью, параметрами и итоговым
+    промптом выполняются одним вызовом LLM; остальные участники получают тот же
+    результат (в режиме streaming - те же чанки по мере поступления).
+    Итоговый промпт - системные сообщения и последнее сообщение (в RAG-цепочке:
+    найденный контекст и вопрос после перефразирования); прежние ходы диалога
+    в ключ не входят, поэтому одинаковые вопросы разных пользователей с разной
+    историей объединяются. Запросы, пришедшие после завершения вызова,
+    выполняются заново.
+    """
+
+    llm: BaseChatModel
+    streaming: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return f"coalescing-{self.llm._llm_type}"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return self.llm._identifying_params
+
+    def _flight_key(self, mode: str, messages: List[BaseMessage], stop: Optional[List[str]], kwargs: Dict) -> str:
+        # История диалога между системными сообщениями и последним сообщением не учитывается
+        prompt = [message for message in messages[:-1] if message.type == "system"] + messages[-1:]
+        payload = [
+            mode,
+            self.llm._llm_type,
+            self.llm._identifying_params,
+            [(message.type, message.content) for message in prompt],
+            stop,
+            kwargs,
+        ]
+        raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        key = self._flight_key("generate", messages, stop, kwargs)
+        flight, leader = _join_flight(key)
+        if not leader:
+            logger.info("Запрос объединён с уже выполняющимся")
+            result = flight.wait().model_copy(deep=True)
+            # Токены этого ответа уже учтены у первого участника
+            result.llm_output = dict(result.llm_output or {}, coalesced=True)
+            return result
+        try:
+            result = self.llm._generate(messages, stop=stop, **kwargs)
+        except BaseException as e:
+            flight.finish(error=e)
+            raise
+        else:
+            flight.finish(result=result.model_copy(deep=True))
+            return result
+        finally:
+            _leave_flight(key, flight)
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        key = self._flight_key("stream", messages, stop, kwargs)
+        flight, leader = _join_flight(key)
+        if leader:
+            # Поток читает ответ LLM независимо от получателей: если первый
+            # клиент отключится, остальные всё равно дочитают ответ
+            threading.Thread(
+                target=self._produce, args=(key, flight, messages, stop, kwargs),
+                name="llm-singleflight", daemon=True
+            ).start()
+        else:
+            logger.info("Потоковый запрос объединён с уже выполняющимся")
+        for chunk in flight.iter_chunks():
+            chunk = _copy_chunk(chunk)
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    def _produce(self, key: str, flight: _Flight, messages, stop, kwargs):
+        try:
+            for chunk in self.llm._stream(messages, stop=stop, **kwargs):
+                flight.add_chunk(chunk)
+        except BaseException as e:
+            flight.finish(error=e)
+        else:
+            flight.finish()
+        finally:
+            _leave_flight(key, flight)
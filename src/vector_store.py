@@ -1,7 +1,17 @@
+from datetime import datetime
+from typing import Callable, Iterable, List, Set
 from langchain_community.vectorstores import FAISS
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
 from src.embeddings_handler import get_embeddings
+from src.metrics import track_stage
 from config.settings import settings
 import os
+import pickle
+import threading
+import shutil
+import tempfile
 import logging
 
 logger = logging.getLogger(__name__)
@@ -17,27 +27,277 @@ def create_vectorstore(documents):
         logger.error(f"Ошибка создания векторного хранилища: {e}")
         raise
 
-def save_vectorstore(vectorstore, path: str = None):
-    """Сохранение векторного хранилища"""
+def embed_documents_batch(documents, embeddings):
+    """Вычисление embeddings для пакета чанков"""
+    texts = [doc.page_content for doc in documents]
+    return embeddings.embed_documents(texts)
+
+def add_embedded_batch(vectorstore, documents, vectors, embeddings):
+    """Добавление пакета уже векторизованных чанков в хранилище.
+
+    Если хранилище ещё не создано, оно создаётся из первого пакета.
+    """
+    text_embeddings = list(zip([doc.page_content for doc in documents], vectors))
+    metadatas = [doc.metadata for doc in documents]
+    if vectorstore is None:
+        return FAISS.from_embeddings(text_embeddings, embeddings, metadatas=metadatas)
+    vectorstore.add_embeddings(text_embeddings, metadatas=metadatas)
+    return vectorstore
+
+INDEX_FILES = ("index.faiss", "index.pkl")
+
+# Версионированное хранилище: каждое сохранение - неизменяемый каталог
+# versions/<версия>, файл CURRENT содержит имя действующей версии.
+# Без CURRENT читается прежний формат (index.faiss и index.pkl прямо в каталоге)
+VERSIONS_DIR = "versions"
+CURRENT_FILE = "CURRENT"
+
+def _fsync_path(path: str):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def current_version(path: str = None):
+    """Имя действующей версии (None - версий нет, прежний формат или пусто)"""
+    if path is None:
+        path = settings.VECTOR_STORE_PATH
+    try:
+        with open(os.path.join(path, CURRENT_FILE), 'r', encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def list_versions(path: str = None) -> List[str]:
+    """Сохранённые версии, от старых к новым"""
+    if path is None:
+        path = settings.VECTOR_STORE_PATH
+    versions_path = os.path.join(path, VERSIONS_DIR)
+    if not os.path.isdir(versions_path):
+        return []
+    return sorted(name for name in os.listdir(versions_path) if not name.startswith('.'))
+
+def resolve_index_dir(path: str = None) -> str:
+    """Каталог с файлами действующей версии"""
+    if path is None:
+        path = settings.VECTOR_STORE_PATH
+    version = current_version(path)
+    return os.path.join(path, VERSIONS_DIR, version) if version else path
+
+def set_current_version(version: str, path: str = None):
+    """Атомарное переключение CURRENT на версию (запись во временный файл и rename)"""
+    if path is None:
+        path = settings.VECTOR_STORE_PATH
+    if not os.path.isdir(os.path.join(path, VERSIONS_DIR, version)):
+        raise ValueError(f"Версия индекса не найдена: {version}")
+    tmp_file = os.path.join(path, f".{CURRENT_FILE}.tmp")
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        f.write(version + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, os.path.join(path, CURRENT_FILE))
+    _fsync_path(path)
+
+def prune_versions(path: str = None, keep: int = None) -> List[str]:
+    """Удаление старых версий сверх keep (VECTOR_STORE_KEEP_VERSIONS) и файлов прежнего формата.
+
+    Действующая версия не удаляется никогда. Процессы, ещё читающие удалённую
+    версию через mmap, продолжают работать: файлы исчезают после их закрытия.
+    """
+    if path is None:
+        path = settings.VECTOR_STORE_PATH
+    keep = max(1, settings.VECTOR_STORE_KEEP_VERSIONS if keep is None else keep)
+    current = current_version(path)
+    removed = []
+    for version in list_versions(path)[:-keep]:
+        if version != current:
+            shutil.rmtree(os.path.join(path, VERSIONS_DIR, version), ignore_errors=True)
+            removed.append(version)
+    if current:
+        for name in INDEX_FILES:
+            legacy_file = os.path.join(path, name)
+            if os.path.exists(legacy_file):
+                os.remove(legacy_file)
+    return removed
+
+def save_vectorstore(vectorstore, path: str = None) -> str:
+    """Сохранение векторного хранилища новой версией; возвращает имя версии.
+
+    Файлы пишутся во временный каталог, сбрасываются на диск и каталог
+    переименовывается в versions/<версия>; затем атомарно переключается CURRENT.
+    Сбой на любом шаге оставляет действующей прежнюю версию.
+    """
     if path is None:
         path = settings.VECTOR_STORE_PATH
     try:
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        vectorstore.save_local(path)
-        logger.info(f"Векторное хранилище сохранено в {path}")
+        versions_path = os.path.join(path, VERSIONS_DIR)
+        os.makedirs(versions_path, exist_ok=True)
+        version = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        tmp_path = tempfile.mkdtemp(prefix=f".saving-{version}-", dir=versions_path)
+        try:
+            vectorstore.save_local(tmp_path)
+            for name in INDEX_FILES:
+                _fsync_path(os.path.join(tmp_path, name))
+            os.rename(tmp_path, os.path.join(versions_path, version))
+            _fsync_path(versions_path)
+        except BaseException:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+        set_current_version(version, path)
+        removed = prune_versions(path)
+        logger.info(f"Векторное хранилище сохранено в {path}, версия {version}"
+                    f"{f' (удалены старые: {len(removed)})' if removed else ''}")
+        return version
     except Exception as e:
         logger.error(f"Ошибка сохранения векторного хранилища: {e}")
         raise
 
-def load_vectorstore(path: str = None):
-    """Загрузка векторного хранилища"""
+def index_signature(path: str = None):
+    """Признак действующей версии: по нему процессы замечают новое сохранение"""
     if path is None:
         path = settings.VECTOR_STORE_PATH
+    version = current_version(path)
+    if version:
+        return version
+    try:
+        # Прежний формат: время изменения файлов
+        return tuple(os.stat(os.path.join(path, name)).st_mtime_ns for name in INDEX_FILES)
+    except FileNotFoundError:
+        return None
+
+def _load_mmap(path: str, embeddings) -> FAISS:
+    """Загрузка с index.faiss, отображённым в память только для чтения.
+
+    Векторы не копируются в память процесса: страницы файла общие для всех
+    процессов через кэш ОС. В такой индекс нельзя добавлять векторы -
+    индексация дополняет копию, загруженную в память (commit_vectorstore).
+    """
+    import faiss
+
+    # IO_FLAG_MMAP_IFC (faiss >= 1.10) отображает и плоские индексы, IO_FLAG_MMAP - только списки IVF
+    flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+    index = faiss.read_index(os.path.join(path, "index.faiss"), flags)
+    with open(os.path.join(path, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    return FAISS(embeddings, index, docstore, index_to_docstore_id)
+
+def _load_index_dir(index_dir: str, embeddings, mmap: bool) -> FAISS:
+    if mmap:
+        return _load_mmap(index_dir, embeddings)
+    return FAISS.load_local(index_dir, embeddings, allow_dangerous_deserialization=True)
+
+def load_vectorstore(path: str = None, mmap: bool = None):
+    """Загрузка действующей версии векторного хранилища (mmap - по умолчанию VECTOR_STORE_MMAP)"""
+    if path is None:
+        path = settings.VECTOR_STORE_PATH
+    if mmap is None:
+        mmap = settings.VECTOR_STORE_MMAP
     try:
         embeddings = get_embeddings()
-        vectorstore = FAISS.load_local(path, embeddings, allow_dangerous_deserialization=True)
-        logger.info(f"Векторное хранилище загружено из {path}")
+        index_dir = resolve_index_dir(path)
+        try:
+            vectorstore = _load_index_dir(index_dir, embeddings, mmap)
+        except (FileNotFoundError, RuntimeError):
+            # Версию могли удалить между чтением CURRENT и открытием файлов - читаем новую
+            if resolve_index_dir(path) == index_dir:
+                raise
+            index_dir = resolve_index_dir(path)
+            vectorstore = _load_index_dir(index_dir, embeddings, mmap)
+        logger.info(f"Векторное хранилище загружено из {index_dir}{' (mmap)' if mmap else ''}")
         return vectorstore
     except Exception as e:
         logger.error(f"Ошибка загрузки векторного хранилища: {e}")
-        raise
\ No newline at end of file
+        raise
+
+def vectorstore_sources(vectorstore) -> Set[str]:
+    """Файлы (metadata["source_file"]), чанки которых есть в хранилище"""
+    return {doc.metadata.get("source_file") for doc in vectorstore.docstore._dict.values()} - {None}
+
+def remove_sources(vectorstore, sources: Iterable[str]) -> int:
+    """Удаление из хранилища всех чанков указанных файлов; возвращает число удалённых"""
+    sources = set(sources)
+    ids = [doc_id for doc_id, doc in vectorstore.docstore._dict.items()
+           if doc.metadata.get("source_file") in sources]
+    if ids:
+        vectorstore.delete(ids)
+    return len(ids)
+
+def commit_vectorstore(new_vectorstore, path: str = None, replace_sources: Iterable[str] = ()):
+    """Добавление нового хранилища к действующей версии и сохранение результата новой версией.
+
+    Действующая версия читается с диска в память (не mmap) и дополняется,
+    опубликованные объекты хранилища не изменяются. Чанки файлов из
+    replace_sources (имена source_file) перед добавлением удаляются из
+    действующей версии: повторно загруженный файл заменяет свою прежнюю копию.
+    Возвращает (хранилище, версия); при ошибке действующей остаётся прежняя
+    версия. Вызывающий отвечает за то, чтобы коммиты выполнялись по одному.
+    """
+    if path is None:
+        path = settings.VECTOR_STORE_PATH
+    merged = new_vectorstore
+    if index_signature(path) is not None:
+        merged = load_vectorstore(path, mmap=False)
+        removed = remove_sources(merged, replace_sources)
+        if removed:
+            logger.info(f"Удалены прежние чанки повторно загруженных файлов: {removed}")
+        merged.merge_from(new_vectorstore)
+    version = save_vectorstore(merged, path)
+    return merged, version
+
+_watcher_thread = None
+_watcher_stop = threading.Event()
+
+def start_index_watcher(on_change: Callable[[FAISS], None], interval: float = None, path: str = None):
+    """Фоновая проверка CURRENT: новая версия загружается и передаётся в on_change.
+
+    Подменяется ссылка на хранилище целиком, поэтому запросы, уже начатые со
+    старым хранилищем, дорабатывают с ним; перезапуск не нужен.
+    """
+    global _watcher_thread
+    if _watcher_thread is not None:
+        return _watcher_thread
+    interval = interval or settings.VECTOR_STORE_POLL_SECONDS
+
+    def loop():
+        loaded = index_signature(path)
+        while not _watcher_stop.wait(interval):
+            signature = index_signature(path)
+            if signature is None or signature == loaded:
+                continue
+            try:
+                on_change(load_vectorstore(path))
+                loaded = signature
+                logger.info(f"Индекс переключён на версию {signature}")
+            except Exception as e:
+                # Следующая проверка попробует снова
+                logger.error(f"Не удалось переключиться на новую версию индекса: {e}")
+
+    _watcher_thread = threading.Thread(target=loop, name="index-watcher", daemon=True)
+    _watcher_thread.start()
+    return _watcher_thread
+
+def stop_index_watcher():
+    _watcher_stop.set()
+
+class TimedRetriever(BaseRetriever):
+    """Ретривер FAISS с раздельным замером векторизации запроса и поиска.
+
+    При use_mmr из fetch_k ближайших кандидатов отбираются k разнообразных (MMR).
+    """
+
+    vectorstore: FAISS
+    k: int = 4
+    use_mmr: bool = False
+    fetch_k: int = 20
+    lambda_mult: float = 0.5
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        with track_stage("embed_query"):
+            embedding = self.vectorstore.embeddings.embed_query(query)
+        with track_stage("vector_search"):
+            if self.use_mmr:
+                return self.vectorstore.max_marginal_relevance_search_by_vector(
+                    embedding, k=self.k, fetch_k=self.fetch_k, lambda_mult=self.lambda_mult
+                )
+            return self.vectorstore.similarity_search_by_vector(embedding, k=self.k)
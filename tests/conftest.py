@@ -0,0 +1,28 @@
+# tests/conftest.py
+import pytest
+
+from benchmarks.stub_openai_server import StubConfig, start_stub_server
+from src import llm_handler
+from config.settings import settings
+
+
+@pytest.fixture
+def stub_llm(monkeypatch, request):
+    """Заглушка OpenAI API (benchmarks/stub_openai_server.py), на которую направлены клиенты LLM.
+
+    Параметры StubConfig передаются маркером: @pytest.mark.stub(latency={...}, fail={...}).
+    """
+    marker = request.node.get_closest_marker("stub")
+    config = StubConfig(**(marker.kwargs if marker else {}))
+    server, base_url = start_stub_server(config)
+    monkeypatch.setattr(settings, "OPENROUTER_BASE_URL", base_url)
+    monkeypatch.setattr(settings, "OPENROUTER_API_KEY", "stub-key")
+    # Клиенты кэшируются по имени модели - тест получает новые, направленные на заглушку
+    monkeypatch.setattr(llm_handler, "_llm_registry", {})
+    yield config
+    server.shutdown()
+    server.server_close()
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "stub(**kwargs): параметры StubConfig для фикстуры stub_llm")
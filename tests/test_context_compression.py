@@ -0,0 +1,69 @@
+# tests/test_context_compression.py
+import pytest
+from langchain_core.documents import Document
+
+from src import context_compression
+from src.context_compression import (APPROX_CHARS_PER_TOKEN, MIN_TAIL_TOKENS, drop_near_duplicates,
+                                     merge_adjacent_chunks, trim_to_token_budget)
+
+TEXT = "".join(f"Предложение номер {i} о документах. " for i in range(40))
+
+
+def _chunk(start, length, source="a.txt", **metadata):
+    return Document(page_content=TEXT[start:start + length],
+                    metadata={"source": source, "start_index": start, **metadata})
+
+
+def test_merge_overlapping_and_touching_chunks():
+    # Ранги: 0 - [100, 200), 1 - [0, 120) перекрывается, 2 - [200, 260) стык
+    merged = merge_adjacent_chunks([_chunk(100, 100), _chunk(0, 120), _chunk(200, 60)])
+    assert len(merged) == 1
+    assert merged[0].page_content == TEXT[0:260]
+    assert merged[0].metadata["merged_chunks"] == 3
+
+
+def test_merge_keeps_separate_sources_and_rank_order():
+    docs = [_chunk(500, 50, source="b.txt"), _chunk(0, 50), _chunk(300, 50),
+            Document(page_content="транскрипт", metadata={"source_file": "a.mp3"})]
+    merged = merge_adjacent_chunks(docs)
+    assert [d.page_content for d in merged] == [TEXT[500:550], TEXT[0:50], TEXT[300:350], "транскрипт"]
+    assert all("merged_chunks" not in d.metadata for d in merged)
+
+
+def test_merge_contained_chunk_adds_nothing():
+    merged = merge_adjacent_chunks([_chunk(0, 200), _chunk(50, 50)])
+    assert [d.page_content for d in merged] == [TEXT[0:200]]
+
+
+def test_drop_near_duplicates_keeps_more_relevant():
+    text = "одинаковый фрагмент текста из двух разных файлов про отчёт за год"
+    docs = [Document(page_content=text, metadata={"source": "a"}),
+            Document(page_content=text + " и ещё", metadata={"source": "b"}),
+            Document(page_content="совсем другой текст о погоде и море", metadata={"source": "c"})]
+    kept = drop_near_duplicates(docs, threshold=0.8)
+    assert [d.metadata["source"] for d in kept] == ["a", "c"]
+
+
+@pytest.fixture
+def char_tokens(monkeypatch):
+    # Детерминированный подсчёт токенов без словаря tiktoken
+    monkeypatch.setattr(context_compression, "get_token_encoder", lambda *args: None)
+
+
+def test_trim_to_token_budget_truncates_tail(char_tokens):
+    budget = 200
+    first = Document(page_content="а" * (100 * APPROX_CHARS_PER_TOKEN))
+    second = Document(page_content="б" * (300 * APPROX_CHARS_PER_TOKEN), metadata={"source": "b"})
+    result = trim_to_token_budget([first, second], budget)
+    assert result[0] is first
+    assert len(result[1].page_content) == 100 * APPROX_CHARS_PER_TOKEN
+    assert result[1].metadata == {"source": "b", "truncated": True}
+
+
+def test_trim_to_token_budget_drops_short_tail(char_tokens):
+    budget = 100 + MIN_TAIL_TOKENS - 1
+    docs = [Document(page_content="а" * (100 * APPROX_CHARS_PER_TOKEN)),
+            Document(page_content="б" * (300 * APPROX_CHARS_PER_TOKEN)),
+            Document(page_content="в")]
+    # После фрагмента, не поместившегося целиком, следующие не добавляются
+    assert trim_to_token_budget(docs, budget) == docs[:1]
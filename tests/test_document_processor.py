@@ -0,0 +1,27 @@
+# tests/test_document_processor.py
+from src import document_processor
+from src.document_processor import document_cache_key
+from config.settings import settings
+
+
+def _fail_sha256(path):
+    raise AssertionError("файл не должен хэшироваться")
+
+
+def test_cache_key_skips_hashing_when_cache_disabled(monkeypatch, tmp_path):
+    path = tmp_path / "doc.txt"
+    path.write_text("текст", encoding="utf-8")
+    monkeypatch.setattr(settings, "DOCUMENT_CACHE_ENABLED", False)
+    monkeypatch.setattr(document_processor, "file_sha256", _fail_sha256)
+    assert document_cache_key(str(path), "FastTextLoader", 1000, 200) is None
+
+
+def test_cache_key_depends_on_content_and_split_params(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "DOCUMENT_CACHE_ENABLED", True)
+    path = tmp_path / "doc.txt"
+    path.write_text("текст", encoding="utf-8")
+    key = document_cache_key(str(path), "FastTextLoader", 1000, 200)
+    assert key == document_cache_key(str(path), "FastTextLoader", 1000, 200)
+    assert key != document_cache_key(str(path), "FastTextLoader", 500, 200)
+    path.write_text("другой текст", encoding="utf-8")
+    assert key != document_cache_key(str(path), "FastTextLoader", 1000, 200)
@@ -0,0 +1,27 @@
+# tests/test_export_handler.py
+from reportlab.platypus import Paragraph
+
+from src.export_handler import iter_chat_flowables, pair_chat_history, render_chat_pdf
+
+
+def test_pair_chat_history_pairs_roles():
+    messages = [("assistant", "приветствие"), ("user", "q1"), ("assistant", "a1"),
+                ("user", "q2"), ("user", "q3"), ("assistant", "a3"), ("assistant", "лишний")]
+
+    assert pair_chat_history(messages) == [("q1", "a1"), ("q2", ""), ("q3", "a3")]
+
+
+def test_flowables_label_question_and_answer():
+    texts = [f.getPlainText() for f in iter_chat_flowables(pair_chat_history([("user", "q"), ("assistant", "a")]), "m")
+             if isinstance(f, Paragraph)]
+
+    assert texts[-4:] == ["Пользователь:", "q", "Ассистент:", "a"]
+
+
+def test_render_chat_pdf(tmp_path):
+    path = str(tmp_path / "chat.pdf")
+    pairs = [(f"вопрос {i} <b>", f"ответ {i}\nстрока") for i in range(200)]
+
+    assert render_chat_pdf(pairs, "m", path) == path
+    with open(path, 'rb') as f:
+        assert f.read(5) == b"%PDF-"
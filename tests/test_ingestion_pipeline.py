@@ -0,0 +1,57 @@
+# tests/test_ingestion_pipeline.py
+import gzip
+
+from langchain.docstore.document import Document
+from langchain_community.embeddings import FakeEmbeddings
+
+from config.settings import settings
+from src import document_processor
+from src.disk_cache import DiskCache
+from src.ingestion_pipeline import run_ingestion_pipeline
+
+
+def _documents(count):
+    return [Document(page_content=f"документ {i}", metadata={"source": f"doc{i}.txt"}) for i in range(count)]
+
+
+def test_publishes_every_n_batches():
+    published = []
+    remainder, total = run_ingestion_pipeline(
+        _documents(10), batch_size=2, on_publish=published.append,
+        publish_seconds=0, publish_batches=2, embeddings=FakeEmbeddings(size=8))
+
+    assert total == 10
+    # Каждая порция - только новые чанки, в отдельном хранилище
+    assert [store.index.ntotal for store in published] == [4, 4]
+    assert len({id(store) for store in published}) == 2
+    assert remainder.index.ntotal == 2
+
+
+def test_without_on_publish_returns_everything():
+    vectorstore, total = run_ingestion_pipeline(
+        _documents(5), batch_size=2, publish_batches=1, embeddings=FakeEmbeddings(size=8))
+
+    assert total == 5 and vectorstore.index.ntotal == 5
+
+
+def test_corrupt_cache_entry_is_reparsed(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DOCUMENT_CACHE_ENABLED", True)
+    cache = DiskCache(str(tmp_path / "cache"), 1 << 20)
+    monkeypatch.setattr(document_processor, "document_cache", cache)
+    path = tmp_path / "doc.txt"
+    path.write_text("строка текста\n" * 500, encoding="utf-8")
+
+    def run():
+        return run_ingestion_pipeline([str(path)], chunk_size=200, chunk_overlap=0, batch_size=4,
+                                      embeddings=FakeEmbeddings(size=8))
+
+    _, total = run()
+    [entry] = list((tmp_path / "cache").glob("*.jsonl.gz"))
+    data = entry.read_bytes()
+    entry.write_bytes(data[:len(data) // 2])
+
+    # Обрезанная запись не обрывает задачу и не добавляет часть чанков дважды
+    vectorstore, total_after = run()
+    assert total_after == total and vectorstore.index.ntotal == total
+    # Запись перезаписана при повторном разборе
+    assert gzip.decompress(entry.read_bytes()) == gzip.decompress(data)
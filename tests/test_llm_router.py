@@ -0,0 +1,72 @@
+# tests/test_llm_router.py
+import time
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from src import llm_router
+from src.llm_handler import get_llm
+from src.llm_router import HedgedChatModel, LatencyTracker
+
+PRIMARY = "stub/primary"
+FALLBACK = "stub/fallback"
+
+
+@pytest.fixture
+def tracker(monkeypatch):
+    tracker = LatencyTracker(window=50, max_failures=1, cooldown=60, slow_p95=1.0)
+    monkeypatch.setattr(llm_router, "latency_tracker", tracker)
+    return tracker
+
+
+def _router(hedge_delay=0.2):
+    # Клиенты создаются заранее: первое создание ChatOpenAI дольше hedge_delay
+    get_llm(PRIMARY)
+    get_llm(FALLBACK)
+    return HedgedChatModel(primary_model=PRIMARY, fallback_models=[FALLBACK], hedge_delay=hedge_delay, max_hedges=1)
+
+
+def _routed_model(result):
+    return result.llm_output["routed_model"]
+
+
+@pytest.mark.stub(latency={PRIMARY: (0.02, 0.0, 0.0), FALLBACK: (0.02, 0.0, 0.0)})
+def test_fast_primary_is_not_hedged(stub_llm, tracker):
+    result = _router()._generate([HumanMessage(content="вопрос")])
+    assert _routed_model(result) == PRIMARY
+    assert stub_llm.requests == 1
+
+
+@pytest.mark.stub(latency={PRIMARY: (1.5, 0.0, 0.0), FALLBACK: (0.02, 0.0, 0.0)})
+def test_slow_primary_is_hedged_to_fallback(stub_llm, tracker):
+    started = time.monotonic()
+    result = _router(hedge_delay=0.2)._generate([HumanMessage(content="вопрос")])
+    elapsed = time.monotonic() - started
+    assert _routed_model(result) == FALLBACK
+    # Ответ резервной модели не ждёт основную
+    assert elapsed < 1.0
+    assert stub_llm.requests == 2
+
+
+@pytest.mark.stub(fail={PRIMARY: 1.0}, latency={FALLBACK: (0.02, 0.0, 0.0)})
+def test_failing_primary_goes_to_cooldown(stub_llm, tracker):
+    # Без хеджирования: резервная модель вызывается после ошибки основной
+    result = _router(hedge_delay=30)._generate([HumanMessage(content="вопрос")])
+    assert _routed_model(result) == FALLBACK
+    assert not tracker.is_healthy(PRIMARY)
+    # Пока основная модель на паузе, запросы сразу идут в резервную
+    assert _router().candidate_models() == [FALLBACK]
+
+
+def test_slow_p95_puts_model_on_cooldown(tracker):
+    for _ in range(LatencyTracker.MIN_SAMPLES):
+        tracker.record(PRIMARY, 2.0)
+    assert not tracker.is_healthy(PRIMARY)
+    assert tracker.percentile(PRIMARY, 95) is None  # статистика набирается заново
+
+
+def test_all_models_on_cooldown_keep_original_order(tracker):
+    tracker.record_failure(PRIMARY)
+    tracker.record_failure(FALLBACK)
+    router = HedgedChatModel(primary_model=PRIMARY, fallback_models=[FALLBACK])
+    assert router.candidate_models() == [PRIMARY, FALLBACK]
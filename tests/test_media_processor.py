@@ -0,0 +1,78 @@
+# tests/test_media_processor.py
+import os
+import sys
+
+import numpy as np
+import pytest
+
+from config.settings import settings
+from src.media_processor import SAMPLE_RATE, load_audio_pcm, split_on_silence
+
+
+def _tone(seconds):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (0.5 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+
+def _silence(seconds, seed=0):
+    rng = np.random.default_rng(seed)
+    return (0.0005 * rng.standard_normal(int(seconds * SAMPLE_RATE))).astype(np.float32)
+
+
+def _seconds(segments):
+    return [(start / SAMPLE_RATE, end / SAMPLE_RATE) for start, end in segments]
+
+
+def test_cuts_inside_pauses():
+    audio = np.concatenate([_tone(3), _silence(1), _tone(3), _silence(1, seed=1), _tone(3)])
+    segments = _seconds(split_on_silence(audio, max_segment_seconds=5, min_silence_ms=300))
+    assert len(segments) == 3
+    assert segments[0][0] == 0 and segments[-1][1] == len(audio) / SAMPLE_RATE
+    # Разрезы - внутри пауз, сегменты идут подряд
+    for (_, end), (start, _) in zip(segments, segments[1:]):
+        assert end == start
+    assert 3 <= segments[0][1] <= 4 and 7 <= segments[1][1] <= 8
+
+
+def test_long_speech_without_pauses_is_split_by_max_length():
+    audio = _tone(12)
+    segments = _seconds(split_on_silence(audio, max_segment_seconds=5, min_silence_ms=300))
+    assert sum(end - start for start, end in segments) == 12
+    assert all(end - start <= 5 + 1e-9 for start, end in segments)
+
+
+def test_silent_segments_are_dropped():
+    audio = np.concatenate([_silence(6), _silence(1, seed=1), _tone(2), _silence(6, seed=2)])
+    segments = _seconds(split_on_silence(audio, max_segment_seconds=4, min_silence_ms=300))
+    # Остались только сегменты с тоном (7-9 с), и тон покрыт ими целиком
+    assert segments
+    assert all(start < 9 and end > 7 for start, end in segments)
+    assert segments[0][0] <= 7 and segments[-1][1] >= 9
+
+
+def test_short_and_empty_audio():
+    assert split_on_silence(np.zeros(0, dtype=np.float32)) == []
+    assert split_on_silence(np.ones(100, dtype=np.float32)) == [(0, 100)]
+
+
+def _fake_ffmpeg(tmp_path, body):
+    script = tmp_path / "ffmpeg"
+    script.write_text(f"#!{sys.executable}\nimport sys\n{body}\n")
+    os.chmod(script, 0o755)
+    return str(script)
+
+
+def test_load_audio_pcm_drains_stderr(tmp_path, monkeypatch):
+    # Предупреждений больше буфера pipe: чтение одного stdout повисло бы
+    monkeypatch.setattr(settings, "FFMPEG_BINARY", _fake_ffmpeg(tmp_path, (
+        "sys.stderr.write('warning\\n' * 100000); sys.stderr.flush()\n"
+        "sys.stdout.buffer.write(b'\\x00\\x40' * 3 + b'\\x01')"
+    )))
+    audio = load_audio_pcm("input.mp4")
+    assert audio.dtype == np.float32 and audio.tolist() == [0.5, 0.5, 0.5]
+
+
+def test_load_audio_pcm_reports_ffmpeg_error(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "FFMPEG_BINARY", _fake_ffmpeg(tmp_path, "sys.stderr.write('broken input'); sys.exit(1)"))
+    with pytest.raises(RuntimeError, match="broken input"):
+        load_audio_pcm("input.mp4")
@@ -0,0 +1,116 @@
+# tests/test_message_retention.py
+"""Секции chat_messages на настоящем PostgreSQL.
+
+Тесты пересоздают схему public, поэтому запускаются только на отдельной
+тестовой базе: TEST_DB_NAME=rag_chatbot_test (остальные параметры - DB_HOST,
+DB_PORT, DB_USER, DB_PASSWORD, как у приложения).
+"""
+import gzip
+import json
+import os
+from datetime import date, datetime
+
+import pytest
+
+from src import message_retention
+from src.database import DatabaseManager
+from src.db_backends import PostgresBackend
+from src.message_retention import DEFAULT_PARTITION, ensure_partitions, run_retention, shift_month
+
+pytestmark = pytest.mark.skipif(not os.getenv("TEST_DB_NAME"), reason="TEST_DB_NAME не задана")
+
+
+@pytest.fixture
+def db(monkeypatch):
+    backend = PostgresBackend()
+    backend.connection_params["database"] = os.environ["TEST_DB_NAME"]
+    manager = DatabaseManager(backend)
+    with manager.get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("DROP SCHEMA public CASCADE")
+            cursor.execute("CREATE SCHEMA public")
+        conn.commit()
+    manager.initialize_database()
+    monkeypatch.setattr(message_retention, "db_manager", manager)
+    return manager
+
+
+def _execute(db, query, params=()):
+    with db.get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(query, params)
+            rows = cursor.fetchall() if cursor.description else None
+        conn.commit()
+    return rows
+
+
+def _insert_message(db, created_at):
+    if not _execute(db, "SELECT id FROM chat_sessions"):
+        _execute(db, "INSERT INTO users (username, password_hash) VALUES ('u', 'x')")
+        _execute(db, "INSERT INTO chat_sessions (user_id, session_name) VALUES (1, 's')")
+    _execute(db, "INSERT INTO chat_messages (session_id, role, content, created_at) VALUES (1, 'user', 'text', %s)",
+             (created_at,))
+
+
+def _partition_of_messages(db):
+    return [row[0] for row in _execute(db, "SELECT tableoid::regclass::text FROM chat_messages")]
+
+
+def test_new_partition_takes_rows_from_default(db):
+    month = shift_month(date.today(), -24)
+    _insert_message(db, datetime(month.year, month.month, 10))
+    assert _partition_of_messages(db) == [DEFAULT_PARTITION]
+
+    assert ensure_partitions(0, from_month=month) > 0
+    assert _partition_of_messages(db) == [f"chat_messages_{month:%Y_%m}"]
+
+
+def test_retention_archives_old_rows_of_default_partition(db, tmp_path):
+    month = shift_month(date.today(), -24)
+    _insert_message(db, datetime(month.year, month.month, 10))
+    _insert_message(db, datetime.now())
+
+    summary = run_retention(keep_months=12, archive_dir=str(tmp_path))
+
+    assert summary["archived"] == {f"{DEFAULT_PARTITION}_{month:%Y_%m}": 1}
+    assert _execute(db, f"SELECT COUNT(*) FROM {DEFAULT_PARTITION}")[0][0] == 0
+    assert _execute(db, "SELECT COUNT(*) FROM chat_messages")[0][0] == 1
+    with gzip.open(tmp_path / f"chat_messages_{month:%Y_%m}.jsonl.gz", 'rt', encoding='utf-8') as f:
+        records = [json.loads(line) for line in f]
+    assert [r["content"] for r in records] == ["text"]
+
+
+def _attached(db, name):
+    return bool(_execute(db, "SELECT 1 FROM pg_inherits WHERE inhrelid = %s::regclass", (name,)))
+
+
+def test_detach_concurrently_without_default_partition(db):
+    month = shift_month(date.today(), -24)
+    ensure_partitions(0, from_month=month)
+    _execute(db, f"DROP TABLE {DEFAULT_PARTITION}")
+    name = f"chat_messages_{month:%Y_%m}"
+
+    message_retention.detach_partition(name)
+
+    assert not _attached(db, name)
+
+
+def test_detach_gives_up_while_chat_messages_is_busy(db, monkeypatch):
+    month = shift_month(date.today(), -24)
+    ensure_partitions(0, from_month=month)
+    name = f"chat_messages_{month:%Y_%m}"
+    monkeypatch.setattr(message_retention, "DETACH_LOCK_TIMEOUT_MS", 100)
+    monkeypatch.setattr(message_retention, "DETACH_ATTEMPTS", 1)
+    import psycopg2
+
+    # Открытая транзакция с записью в chat_messages держит ROW EXCLUSIVE
+    with db.get_connection() as busy:
+        with busy.cursor() as cursor:
+            cursor.execute("LOCK TABLE chat_messages IN ROW EXCLUSIVE MODE")
+            with pytest.raises(psycopg2.errors.LockNotAvailable):
+                message_retention.detach_partition(name)
+        busy.rollback()
+
+    assert _attached(db, name)
+    message_retention.detach_partition(name)
+    assert not _attached(db, name)
@@ -0,0 +1,38 @@
+# tests/test_message_search.py
+"""Полнотекстовый поиск по сообщениям на настоящем PostgreSQL (TEST_DB_NAME, как в test_message_retention)"""
+import os
+
+import pytest
+
+from src.database import DatabaseManager
+from src.db_backends import PostgresBackend
+
+pytestmark = pytest.mark.skipif(not os.getenv("TEST_DB_NAME"), reason="TEST_DB_NAME не задана")
+
+
+@pytest.fixture
+def db():
+    backend = PostgresBackend()
+    backend.connection_params["database"] = os.environ["TEST_DB_NAME"]
+    manager = DatabaseManager(backend)
+    with manager.get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("DROP SCHEMA public CASCADE")
+            cursor.execute("CREATE SCHEMA public")
+        conn.commit()
+    manager.initialize_database()
+    return manager
+
+
+@pytest.mark.parametrize("content, query, highlighted", [
+    ("Запуски серверов прошли успешно", "запуск", "**Запуски**"),
+    ("Two cafés nearby", "café", "**cafés**"),
+])
+def test_snippet_highlights_match_of_either_config(db, content, query, highlighted):
+    assert db.register_user("u", "password")
+    user_id = db.get_user_id("u")
+    db.save_message(db.create_session(user_id, "s"), "user", content)
+
+    [hit] = db.search_messages(user_id, query)
+
+    assert highlighted in hit["snippet"]
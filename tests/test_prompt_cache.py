@@ -0,0 +1,85 @@
+# tests/test_prompt_cache.py
+import json
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.prompts import MessagesPlaceholder
+
+from src.llm_handler import get_llm
+from src.prompt_cache import CachedPrefixChatPromptTemplate, history_to_messages, mark_cache_breakpoints
+
+
+def _answer_prompt():
+    return CachedPrefixChatPromptTemplate(
+        messages=[
+            ("system", "Инструкции"),
+            MessagesPlaceholder("chat_history"),
+            ("human", "Контекст:\n{context}\n\nВопрос: {question}"),
+        ],
+        cache_control=True,
+    )
+
+
+def _marked(messages):
+    return [i for i, m in enumerate(messages)
+            if isinstance(m.content, list) and "cache_control" in m.content[-1]]
+
+
+def test_history_skips_unanswered_turns():
+    messages = history_to_messages([("q1", "a1"), ("q2", "")])
+    assert [type(m) for m in messages] == [HumanMessage, AIMessage]
+    assert [m.content for m in messages] == ["q1", "a1"]
+
+
+def test_breakpoints_on_system_and_last_history_message():
+    history = history_to_messages([("q1", "a1"), ("q2", "a2"), ("q3", "")])
+    messages = _answer_prompt().format_messages(chat_history=history, context="ctx", question="q3")
+    assert [type(m) for m in messages] == [SystemMessage, HumanMessage, AIMessage, HumanMessage, AIMessage, HumanMessage]
+    assert _marked(messages) == [0, 4]
+    assert messages[4].content[0]["text"] == "a2"
+    # Вопрос текущего хода один раз и без маркера
+    assert sum("q3" in (m.content if isinstance(m.content, str) else "") for m in messages) == 1
+
+
+def test_prefix_is_reused_on_next_turn():
+    first = _answer_prompt().format_messages(
+        chat_history=history_to_messages([("q1", "a1")]), context="c1", question="q2")
+    second = _answer_prompt().format_messages(
+        chat_history=history_to_messages([("q1", "a1"), ("q2", "a2")]), context="c2", question="q3")
+    # Помеченный префикс первого хода - неизменное начало второго
+    assert [m.type for m in first[:3]] == [m.type for m in second[:3]]
+    assert [m.content[0]["text"] if isinstance(m.content, list) else m.content for m in first[:3]] == \
+        [m.content[0]["text"] if isinstance(m.content, list) else m.content for m in second[:3]]
+
+
+def test_no_history_marks_only_system():
+    messages = mark_cache_breakpoints([SystemMessage(content="s"), HumanMessage(content="q")])
+    assert _marked(messages) == [0]
+
+
+def _send(history, question, model="anthropic/claude-sonnet-4"):
+    messages = _answer_prompt().format_messages(chat_history=history_to_messages(history), context="ctx", question=question)
+    return get_llm(model).invoke(messages)
+
+
+def test_cache_control_payload_shape(stub_llm, tmp_path):
+    stub_llm.dump_dir = str(tmp_path)
+    _send([("q1", "a1")], "q2")
+
+    [dump] = sorted(tmp_path.glob("*chat_completions.json"))
+    payload = json.loads(dump.read_text(encoding="utf-8"))
+    messages = payload["messages"]
+    assert [m["role"] for m in messages] == ["system", "user", "assistant", "user"]
+    # Помеченные сообщения - список частей с cache_control на последней
+    for index in (0, 2):
+        assert messages[index]["content"] == [
+            {"type": "text", "text": messages[index]["content"][0]["text"], "cache_control": {"type": "ephemeral"}}
+        ]
+    assert messages[2]["content"][0]["text"] == "a1"
+    # Вопрос текущего хода - обычная строка без маркера
+    assert isinstance(messages[1]["content"], str) and isinstance(messages[3]["content"], str)
+
+
+def test_next_turn_reads_cached_prefix(stub_llm):
+    _send([("q1", "a1")], "q2")
+    reply = _send([("q1", "a1"), ("q2", "a2")], "q3")
+    assert reply.usage_metadata["input_token_details"]["cache_read"] > 0
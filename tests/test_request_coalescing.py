@@ -0,0 +1,63 @@
+# tests/test_request_coalescing.py
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from src.request_coalescing import CoalescingChatModel
+
+
+class SlowChatModel(BaseChatModel):
+    """Отвечает через delay секунд и считает вызовы"""
+
+    delay: float = 0.3
+    calls: int = 0
+    lock: object = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "slow-test"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=f"ответ на: {messages[-1].content}"))])
+
+
+def _prompt(history, question):
+    return [SystemMessage(content="инструкции"), *history, HumanMessage(content=f"Контекст: ...\n\nВопрос: {question}")]
+
+
+def _ask_concurrently(model, prompts):
+    barrier = threading.Barrier(len(prompts))
+
+    def ask(prompt):
+        barrier.wait()
+        return model.invoke(prompt).content
+
+    with ThreadPoolExecutor(len(prompts)) as pool:
+        return list(pool.map(ask, prompts))
+
+
+def test_same_question_with_different_history_shares_one_call():
+    llm = SlowChatModel(lock=threading.Lock())
+    model = CoalescingChatModel(llm=llm)
+    histories = [[], [HumanMessage(content="привет"), AIMessage(content="здравствуйте")]]
+
+    answers = _ask_concurrently(model, [_prompt(history, "что такое RAG?") for history in histories])
+
+    assert llm.calls == 1
+    assert answers[0] == answers[1]
+
+
+def test_different_questions_are_not_coalesced():
+    llm = SlowChatModel(lock=threading.Lock())
+    model = CoalescingChatModel(llm=llm)
+
+    _ask_concurrently(model, [_prompt([], "первый"), _prompt([], "второй")])
+
+    assert llm.calls == 2
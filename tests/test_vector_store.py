@@ -0,0 +1,27 @@
+# tests/test_vector_store.py
+from langchain.docstore.document import Document
+from langchain_community.embeddings import FakeEmbeddings
+from langchain_community.vectorstores import FAISS
+
+from src import vector_store
+from src.vector_store import commit_vectorstore
+
+
+def _store(embeddings, source_file, texts):
+    return FAISS.from_documents(
+        [Document(page_content=text, metadata={"source_file": source_file}) for text in texts], embeddings)
+
+
+def test_commit_replaces_chunks_of_reuploaded_file(tmp_path, monkeypatch):
+    embeddings = FakeEmbeddings(size=8)
+    monkeypatch.setattr(vector_store, "get_embeddings", lambda: embeddings)
+    path = str(tmp_path / "index")
+
+    commit_vectorstore(_store(embeddings, "a.txt", ["a1", "a2"]), path)
+    commit_vectorstore(_store(embeddings, "b.txt", ["b1"]), path)
+    merged, _ = commit_vectorstore(_store(embeddings, "a.txt", ["a1", "a2"]), path, replace_sources={"a.txt"})
+
+    contents = sorted(doc.page_content for doc in merged.docstore._dict.values())
+    assert contents == ["a1", "a2", "b1"]
+    assert merged.index.ntotal == 3
+    assert sorted(doc.page_content for doc in merged.similarity_search("a1", k=3)) == ["a1", "a2", "b1"]
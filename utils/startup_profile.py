@@ -0,0 +1,52 @@
+# utils/startup_profile.py
+import os
+import sys
+import time
+import threading
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class StartupProfiler:
+    """Замер времени импортов и шагов инициализации при старте приложения"""
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.started_at = time.perf_counter()
+        self.steps = []  # [(название, секунды, поток)]
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def step(self, name: str):
+        """Контекстный менеджер, замеряющий длительность шага"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self.enabled:
+                elapsed = time.perf_counter() - start
+                with self._lock:
+                    self.steps.append((name, elapsed, threading.current_thread().name))
+
+    def report(self, title: str = "Профиль запуска") -> str:
+        """Таблица шагов по убыванию длительности; выводится в лог и возвращается строкой"""
+        if not self.enabled:
+            return ""
+        total = time.perf_counter() - self.started_at
+        with self._lock:
+            steps = sorted(self.steps, key=lambda s: s[1], reverse=True)
+        lines = [f"{title}: {total:.3f} с с момента запуска"]
+        for name, elapsed, thread_name in steps:
+            lines.append(f"  {elapsed * 1000:9.1f} мс  {name}  [{thread_name}]")
+        report = '\n'.join(lines)
+        logger.info(report)
+        print(report)
+        return report
+
+
+# Включается переменной окружения STARTUP_PROFILE=true или флагом --profile-startup
+startup_profiler = StartupProfiler(
+    enabled=os.getenv("STARTUP_PROFILE", "false").lower() == "true" or "--profile-startup" in sys.argv
+)